@@ -2,6 +2,7 @@
 
 
 import argparse
+import sys
 from pathlib import Path
 
 from infomentor.runner import InfoMentorFetcher
@@ -12,6 +13,14 @@ from infomentor.config import Config
 def cmd_fetch(args):
     try:
         fetcher = InfoMentorFetcher()
+        if args.profile:
+            from infomentor.profiling import CycleProfiler
+
+            fetcher.profiler = CycleProfiler(
+                args.profile_dir or fetcher.config.profile_dir,
+                args.profile,
+                cycles=args.profile_cycles or None,
+            )
         if args.once:
             fetcher.fetch_and_process()
         else:
@@ -31,6 +40,82 @@ def cmd_auth(args):
     manager.run_interactive_login()
 
 
+def cmd_llm_standin(args):
+    from infomentor.standins import LLMStandIn
+
+    server = LLMStandIn(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_429_rate=args.error_429,
+        error_503_rate=args.error_503,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nInterrupted by user.")
+
+
+def cmd_hub_standin(args):
+    from infomentor.standins import HubStandIn
+
+    server = HubStandIn(
+        host=args.host,
+        port=args.port,
+        pupils=args.pupils,
+        news_per_pupil=args.news,
+        notifications_per_pupil=args.notifications,
+        attendance_per_pupil=args.attendance,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    if args.token_file:
+        server.write_token_file(args.token_file)
+        print(f"Wrote stand-in tokens to {args.token_file}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nInterrupted by user.")
+
+
+def cmd_bench(args):
+    from infomentor import bench
+
+    ok = bench.run(
+        selected=args.only,
+        quick=args.quick,
+        history_file=args.history,
+        threshold=args.threshold,
+        save=not args.no_save,
+    )
+    if not ok:
+        sys.exit(1)
+
+
+def cmd_migrate_storage(args):
+    from infomentor.storage import StorageManager
+
+    config = Config()
+    storage = StorageManager(config.output_dir, config.files_dir)
+    storage.migrate_layout(dry_run=args.dry_run)
+
+
+def cmd_compact_storage(args):
+    from infomentor.storage import StorageManager
+
+    config = Config()
+    storage = StorageManager(config.output_dir, config.files_dir)
+    storage.compact(
+        older_than_days=args.older_than if args.older_than is not None else config.archive_after_days,
+        dry_run=args.dry_run,
+    )
+
+
 def main():
     parser = argparse.ArgumentParser(description="InfoMentor News Tools")
     subparsers = parser.add_subparsers(dest="command", help="Command to run")
@@ -45,12 +130,108 @@ def main():
         default=60 * 60 * 12,
         help="Interval in seconds (default: 12 hours)",
     )
+    fetch_parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="cpu",
+        choices=["cpu", "memory", "all"],
+        help="Profile fetch cycles: cpu (cProfile + sampled stacks), memory (tracemalloc diffs) or all",
+    )
+    fetch_parser.add_argument(
+        "--profile-cycles",
+        type=int,
+        default=1,
+        help="Number of cycles to profile, 0 = all (default: 1)",
+    )
+    fetch_parser.add_argument(
+        "--profile-dir", default=None, help="Output directory for profiles (default: profiles)"
+    )
     fetch_parser.set_defaults(func=cmd_fetch)
 
     # Auth command
     auth_parser = subparsers.add_parser("auth", help="Interactive login to InfoMentor")
     auth_parser.set_defaults(func=cmd_auth)
 
+    # LLM stand-in server command
+    standin_parser = subparsers.add_parser(
+        "llm-standin",
+        help="Run a local stand-in for the Perplexity and Gemini APIs",
+    )
+    standin_parser.add_argument("--host", default="127.0.0.1", help="Bind address")
+    standin_parser.add_argument("--port", type=int, default=8089, help="Port (default: 8089)")
+    standin_parser.add_argument("--latency", type=float, default=0.0, help="Base response latency in seconds")
+    standin_parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency in seconds")
+    standin_parser.add_argument("--error-429", type=float, default=0.0, help="Fraction of requests answered with 429")
+    standin_parser.add_argument("--error-503", type=float, default=0.0, help="Fraction of requests answered with 503")
+    standin_parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429")
+    standin_parser.add_argument("--seed", type=int, default=None, help="Random seed for repeatable error injection")
+    standin_parser.set_defaults(func=cmd_llm_standin)
+
+    # Hub stand-in server command
+    hub_parser = subparsers.add_parser(
+        "hub-standin",
+        help="Run a local stand-in for the InfoMentor hub with synthetic data",
+    )
+    hub_parser.add_argument("--host", default="127.0.0.1", help="Bind address")
+    hub_parser.add_argument("--port", type=int, default=8090, help="Port (default: 8090)")
+    hub_parser.add_argument("--pupils", type=int, default=2, help="Number of pupils")
+    hub_parser.add_argument("--news", type=int, default=20, help="News items per pupil")
+    hub_parser.add_argument("--notifications", type=int, default=20, help="Notifications per pupil")
+    hub_parser.add_argument("--attendance", type=int, default=50, help="Attendance rows per pupil")
+    hub_parser.add_argument("--latency", type=float, default=0.0, help="Base response latency in seconds")
+    hub_parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency in seconds")
+    hub_parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    hub_parser.add_argument("--seed", type=int, default=0, help="Random seed for the synthetic data")
+    hub_parser.add_argument("--token-file", default=None, help="Write a token file for the stand-in to this path")
+    hub_parser.set_defaults(func=cmd_hub_standin)
+
+    # Storage migration command
+    migrate_parser = subparsers.add_parser(
+        "migrate-storage",
+        help="Move flat news/ files into the sharded layout (safe while fetching)",
+    )
+    migrate_parser.add_argument("--dry-run", action="store_true", help="Only count the files to move")
+    migrate_parser.set_defaults(func=cmd_migrate_storage)
+
+    # Storage compaction command
+    compact_parser = subparsers.add_parser(
+        "compact-storage",
+        help="Archive old news items and notifications into compressed packs",
+    )
+    compact_parser.add_argument(
+        "--older-than",
+        type=int,
+        default=None,
+        help="Archive items saved more than this many days ago (default: ARCHIVE_AFTER_DAYS or 90)",
+    )
+    compact_parser.add_argument("--dry-run", action="store_true", help="Only count the files to archive")
+    compact_parser.set_defaults(func=cmd_compact_storage)
+
+    # Benchmark command
+    bench_parser = subparsers.add_parser(
+        "bench", help="Run the benchmark suite and check for regressions"
+    )
+    bench_parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=["storage", "schedule", "pupils", "notifiers", "cycle"],
+        help="Only run these benchmark groups",
+    )
+    bench_parser.add_argument("--quick", action="store_true", help="Use smaller inputs (skips 100k files)")
+    bench_parser.add_argument(
+        "--history",
+        default="bench_history.json",
+        help="JSON file results are appended to (default: bench_history.json)",
+    )
+    bench_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Fail when a metric is this fraction slower than its baseline (default: 0.25)",
+    )
+    bench_parser.add_argument("--no-save", action="store_true", help="Do not append results to the history")
+    bench_parser.set_defaults(func=cmd_bench)
+
     args = parser.parse_args()
     args.func(args)
 
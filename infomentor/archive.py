@@ -0,0 +1,129 @@
+import json
+import os
+import zlib
+from pathlib import Path
+
+# Start a new pack file once the current one grows past this size
+MAX_PACK_BYTES = 64 * 1024 * 1024
+
+
+class PackArchive:
+    """
+    Append-only compressed packs for one type and pupil (e.g. news/news/<pupil>/packs/).
+
+    Each record is a header line "<id> <length>\\n" followed by the
+    zlib-compressed JSON payload, so packs can be read sequentially and the
+    index rebuilt from them. `index.json` maps an ID to (pack number, offset,
+    length) for random access. Records are only ever appended; a newer record
+    for the same ID supersedes the older one through the index.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.index_file = directory / "index.json"
+        # id (str) -> [pack number, offset, length]; reloaded when index.json changes
+        self.index = None
+        self.index_mtime = None
+
+    def pack_path(self, number):
+        return self.directory / f"{number:05d}.pack"
+
+    def pack_numbers(self):
+        try:
+            return sorted(int(path.stem) for path in self.directory.glob("*.pack"))
+        except ValueError:
+            return []
+
+    def load_index(self):
+        """The current index, reread only when index.json was replaced"""
+        try:
+            mtime = self.index_file.stat().st_mtime_ns
+        except OSError:
+            # No index (yet); rebuild it if packs exist without one
+            if self.index is None:
+                self.index = self.rebuild_index() if self.directory.exists() else {}
+            return self.index
+        if mtime != self.index_mtime:
+            try:
+                with open(self.index_file, "r") as f:
+                    self.index = json.load(f)
+                self.index_mtime = mtime
+            except (OSError, ValueError):
+                print(f"    ⚠ Unreadable pack index {self.index_file}, rebuilding")
+                self.index = self.rebuild_index()
+        return self.index
+
+    def ids(self):
+        """Archived IDs, as ints where they are numeric"""
+        return {int(key) if key.isdigit() else key for key in self.load_index()}
+
+    def __contains__(self, entity_id):
+        return str(entity_id) in self.load_index()
+
+    def read(self, entity_id):
+        """The archived payload for an ID, or None"""
+        entry = self.load_index().get(str(entity_id))
+        if entry is None:
+            return None
+        number, offset, length = entry
+        with open(self.pack_path(number), "rb") as f:
+            f.seek(offset)
+            return json.loads(zlib.decompress(f.read(length)))
+
+    def append(self, records):
+        """Append (id, payload) pairs and publish them in the index; returns bytes written"""
+        if not records:
+            return 0
+        index = dict(self.load_index())
+        self.directory.mkdir(parents=True, exist_ok=True)
+        numbers = self.pack_numbers()
+        number = numbers[-1] if numbers else 0
+        if numbers and self.pack_path(number).stat().st_size >= MAX_PACK_BYTES:
+            number += 1
+
+        written = 0
+        with open(self.pack_path(number), "ab") as f:
+            f.seek(0, os.SEEK_END)
+            for entity_id, payload in records:
+                blob = zlib.compress(
+                    json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 9
+                )
+                header = f"{entity_id} {len(blob)}\n".encode("utf-8")
+                f.write(header)
+                index[str(entity_id)] = [number, f.tell(), len(blob)]
+                f.write(blob)
+                written += len(header) + len(blob)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Readers only see the new records once the index is swapped in
+        tmp = self.index_file.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(index, f, separators=(",", ":"))
+        os.replace(tmp, self.index_file)
+        self.index = index
+        self.index_mtime = self.index_file.stat().st_mtime_ns
+        return written
+
+    def rebuild_index(self):
+        """Recover the index by reading the pack headers; a torn last record is ignored"""
+        index = {}
+        for number in self.pack_numbers():
+            path = self.pack_path(number)
+            size = path.stat().st_size
+            with open(path, "rb") as f:
+                while True:
+                    header = f.readline()
+                    if not header:
+                        break
+                    try:
+                        entity_id, length = header.decode("utf-8").split()
+                        length = int(length)
+                    except ValueError:
+                        break
+                    offset = f.tell()
+                    if offset + length > size:
+                        break
+                    index[entity_id] = [number, offset, length]
+                    f.seek(length, os.SEEK_CUR)
+        return index
@@ -1,18 +1,40 @@
 import json
+from datetime import datetime, timedelta
+
 import requests
 
+from .debounce import ChangeDebouncer
+from .models import AttendanceRecord
+from .tracing import tracer
+
 
 class AttendanceFetcher:
-    def __init__(self, session: requests.Session, storage_manager, notifier):
+    def __init__(
+        self,
+        session: requests.Session,
+        storage_manager,
+        notifier,
+        debouncer=None,
+        lookback_days=14,
+        range_request=False,
+    ):
         self.session = session
         self.storage_manager = storage_manager
         self.notifier = notifier
+        # Holds new records back until they stop flapping (no-op without a settle window)
+        self.debouncer = debouncer or ChangeDebouncer()
+        # Records dated more than this before the newest one are no longer compared
+        self.lookback_days = lookback_days
+        # Ask the hub for records since the watermark only
+        self.range_request = range_request
+        # pupil_id -> {"keys": {record key: date}, "watermark": "YYYY-MM-DD" or None}
+        self.index = {}
         self.web_base_url = None
         self.pupil_name = None
         self.pupil_id = None
 
-    def fetch_attendance(self):
-        """Fetch attendance from InfoMentor web endpoint"""
+    def fetch_attendance(self, since=None):
+        """Fetch attendance from InfoMentor web endpoint (optionally from `since` on)"""
         print("\n[Attendance] Fetching attendance...")
 
         if not self.web_base_url:
@@ -40,6 +62,12 @@ class AttendanceFetcher:
         # The endpoint might expect some parameters in the POST body, 
         # but often InfoMentor's 'List' endpoints can take an empty object for defaults.
         data = {}
+        if since:
+            # Same date format as the calendar endpoint; older rows are filtered locally anyway
+            data = {
+                "startDate": since.strftime("%Y/%m/%d"),
+                "endDate": datetime.now().strftime("%Y/%m/%d"),
+            }
 
         try:
             response = self.session.post(
@@ -57,52 +85,114 @@ class AttendanceFetcher:
                     else:
                         attendance_list = []
                         
+                    attendance_list = AttendanceRecord.parse_list(attendance_list, keep_raw=True)
                     print(f"  ✓ Successfully fetched {len(attendance_list)} attendance records")
                     return attendance_list
                 except json.JSONDecodeError:
                     print("  ✗ ERROR: Invalid JSON in attendance response")
+                    tracer.fail("invalid JSON")
                     return []
             else:
                 print(
                     f"  ✗ ERROR: Attendance endpoint returned status {response.status_code}"
                 )
+                tracer.fail(f"status {response.status_code}")
                 return []
         except Exception as e:
             print(f"  ✗ ERROR: Error fetching attendance: {e}")
+            tracer.fail(e)
             return []
 
+    def record_date(self, record):
+        try:
+            return datetime.strptime((record.date or "")[:10], "%Y-%m-%d").date()
+        except ValueError:
+            return None
+
+    def is_recent(self, day, watermark):
+        # Records without a parseable date are always compared
+        return watermark is None or day is None or day.isoformat() >= watermark
+
+    def load_index(self):
+        """Keys of stored records at or after the watermark, read once per pupil"""
+        index = self.index.get(self.pupil_id)
+        if index is None:
+            if not self.storage_manager.has_attendance(pupil_id=self.pupil_id):
+                return None
+            watermark = self.storage_manager.get_attendance_watermark(pupil_id=self.pupil_id)
+            keys = {}
+            for record in self.storage_manager.iter_attendance(pupil_id=self.pupil_id):
+                day = self.record_date(record)
+                if self.is_recent(day, watermark):
+                    keys[record.key] = day
+            index = self.index[self.pupil_id] = {"keys": keys, "watermark": watermark}
+        return index
+
+    def add_to_index(self, index, records):
+        """Record new keys and move the watermark up to the lookback window"""
+        for record in records:
+            index["keys"][record.key] = self.record_date(record)
+
+        dates = [day for day in index["keys"].values() if day]
+        if not dates:
+            return
+        # Future-dated rows (planned absences) must not push the window past today
+        newest = min(max(dates), datetime.now().date())
+        watermark = (newest - timedelta(days=self.lookback_days)).isoformat()
+        if index["watermark"] is None or watermark > index["watermark"]:
+            index["watermark"] = watermark
+            index["keys"] = {
+                key: day for key, day in index["keys"].items() if self.is_recent(day, watermark)
+            }
+            self.storage_manager.set_attendance_watermark(watermark, pupil_id=self.pupil_id)
+
     def process_attendance(self):
         """Fetch, save, and notify about new attendance records"""
-        current_attendance = self.fetch_attendance()
-        if not current_attendance:
-            # If it's an empty list, it might just be no records, 
-            # but we only process if we actually got a response.
-            if current_attendance == []:
-                # Save empty list if it's the first time
-                previous_attendance = self.storage_manager.load_attendance(pupil_id=self.pupil_id)
-                if previous_attendance is None:
-                     self.storage_manager.save_attendance([], pupil_id=self.pupil_id)
-            return
+        with tracer.span("attendance.load_state"):
+            index = self.load_index()
+
+        since = None
+        if self.range_request and index and index["watermark"]:
+            since = datetime.strptime(index["watermark"], "%Y-%m-%d")
+        with tracer.span("attendance.fetch") as span:
+            current_attendance = self.fetch_attendance(since=since)
+            span.add("items", len(current_attendance))
 
-        previous_attendance = self.storage_manager.load_attendance(pupil_id=self.pupil_id)
-        
-        if previous_attendance is None:
-            # First time fetching attendance for this pupil
+        if index is None:
+            # First time fetching attendance for this pupil (an empty log marks the baseline)
             print(f"  → First run for {self.pupil_name}, saving baseline.")
-            self.storage_manager.save_attendance(current_attendance, pupil_id=self.pupil_id)
+            with tracer.span("attendance.persist"):
+                if self.storage_manager.append_attendance(current_attendance, pupil_id=self.pupil_id):
+                    index = self.index[self.pupil_id] = {"keys": {}, "watermark": None}
+                    self.add_to_index(index, current_attendance)
+            return
+        if not current_attendance:
             return
 
-        # Find new records
-        # Use a combination of fields as a unique key since InfoMentor items don't always have IDs
-        def get_record_key(r):
-            return f"{r.get('dateString')}_{r.get('lessonName')}_{r.get('registrationTypeName')}_{r.get('startTime')}"
-
-        previous_keys = {get_record_key(r) for r in previous_attendance}
-        new_records = [r for r in current_attendance if get_record_key(r) not in previous_keys]
+        # Find new records by their combined key, comparing only the recent window
+        with tracer.span("attendance.diff") as span:
+            keys, watermark = index["keys"], index["watermark"]
+            new_records = []
+            for record in current_attendance:
+                if record.key in keys:
+                    continue
+                if not self.is_recent(self.record_date(record), watermark):
+                    span.add("skipped")
+                    continue
+                new_records.append(record)
+            # A row edited again before settling replaces its earlier key
+            ready = self.debouncer.settle(
+                ("attendance", self.pupil_id), {r.key: "added" for r in new_records}
+            )
+            new_records = [r for r in new_records if r.key in ready]
+            span.add("items", len(new_records))
 
         if new_records:
             print(f"  → Found {len(new_records)} new attendance records")
             self.notifier.send_attendance_update(new_records, pupil_name=self.pupil_name)
-            self.storage_manager.save_attendance(current_attendance, pupil_id=self.pupil_id)
-        else:
+            # Records still settling are not stored, so they are detected again
+            with tracer.span("attendance.persist"):
+                if self.storage_manager.append_attendance(new_records, pupil_id=self.pupil_id):
+                    self.add_to_index(index, new_records)
+        elif not self.debouncer.has_pending(("attendance", self.pupil_id)):
             print("  → No new attendance records")
@@ -1,14 +1,25 @@
+import html
 import json
 import os
 import re
+import tempfile
+import threading
 import time
 import urllib.parse
+from contextlib import contextmanager
 from urllib.parse import urlparse
 
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, fall back to in-process locking only
+    fcntl = None
+
 import requests
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options as ChromeOptions
 
+from .tracing import tracer
+
 # Constants
 CLIENT_ID = "notificationapp"
 CLIENT_SECRET = "NONE"
@@ -17,6 +28,65 @@ SCOPE = "IM2-API-NOTIFICATION"
 DEVICE_PLATFORM = "Android"
 DEFAULT_AUTH_BASE_URL = "https://api.infomentor.se"
 DEFAULT_API_BASE_URL = "https://api.infomentor.se"
+SSO_MAX_HOPS = 10
+# Refresh credentials this many seconds before they expire
+DEFAULT_REFRESH_MARGIN = 600
+
+_FORM_RE = re.compile(r"<form\b([^>]*)>(.*?)</form>", re.IGNORECASE | re.DOTALL)
+_INPUT_RE = re.compile(r"<input\b([^>]*)>", re.IGNORECASE)
+_ATTR_RE = re.compile(r"""([\w-]+)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+_META_REFRESH_RE = re.compile(
+    r"""<meta[^>]+http-equiv\s*=\s*["']?refresh["']?[^>]*content\s*=\s*["'][^"']*?url\s*=\s*([^"'>]+)""",
+    re.IGNORECASE,
+)
+_JS_REDIRECT_RE = re.compile(
+    r"""(?:window\.|document\.)?location(?:\.href)?\s*=\s*["']([^"']+)["']|location\.(?:replace|assign)\(\s*["']([^"']+)["']\s*\)"""
+)
+
+
+def _parse_attrs(tag_body):
+    return {
+        m.group(1).lower(): html.unescape(m.group(2) if m.group(2) is not None else m.group(3))
+        for m in _ATTR_RE.finditer(tag_body)
+    }
+
+
+def extract_form_post(page, base_url):
+    """Extract an auto-submitting form (e.g. SAML/OIDC form_post) from an SSO page"""
+    match = _FORM_RE.search(page)
+    if not match:
+        return None
+
+    form_attrs = _parse_attrs(match.group(1))
+    data = {}
+    for input_match in _INPUT_RE.finditer(match.group(2)):
+        attrs = _parse_attrs(input_match.group(1))
+        if attrs.get("name"):
+            data[attrs["name"]] = attrs.get("value", "")
+
+    # A visible login form is not something we can complete without a user
+    if not data or any(k.lower() in ("password", "username") for k in data):
+        return None
+
+    action = urllib.parse.urljoin(base_url, form_attrs.get("action", ""))
+    method = form_attrs.get("method", "get").upper()
+    if method == "GET":
+        action = f"{action}{'&' if '?' in action else '?'}{urllib.parse.urlencode(data)}"
+        return "GET", action, None
+    return "POST", action, data
+
+
+def extract_script_redirect(page, base_url):
+    """Extract a meta refresh or JavaScript location redirect from an SSO page"""
+    match = _META_REFRESH_RE.search(page) or _JS_REDIRECT_RE.search(page)
+    if not match:
+        return None
+    target = next(g for g in match.groups() if g)
+    return "GET", urllib.parse.urljoin(base_url, html.unescape(target.strip())), None
+
+
+# Extractors are tried in order; each returns (method, url, data) or None
+DEFAULT_SSO_EXTRACTORS = [extract_form_post, extract_script_redirect]
 
 
 class TokenManager:
@@ -24,10 +94,31 @@ class TokenManager:
         self.token_file = token_file
         self.auth_base_url = auth_base_url
         self.token_data = self.load_tokens() or {}
+        # Single-flight guard so concurrent callers never refresh twice
+        self._refresh_lock = threading.Lock()
+        # True after the token endpoint rejected the refresh token (4xx), until a refresh succeeds
+        self.refresh_rejected = False
 
         if self.token_data.get("auth_base_url"):
             self.auth_base_url = self.token_data.get("auth_base_url")
 
+    @contextmanager
+    def file_lock(self):
+        """
+        Exclusive advisory lock shared by every process using this token file
+        (e.g. `cli.py auth` while the daemon runs, or several workers).
+        """
+        if fcntl is None:
+            yield
+            return
+
+        with open(f"{self.token_file}.lock", "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
     def load_tokens(self):
         """Load tokens from file"""
         try:
@@ -41,11 +132,48 @@ class TokenManager:
             print(f"✗ ERROR: Error loading tokens: {e}")
             return None
 
+    def reload_if_newer(self):
+        """Adopt the token file contents if another process wrote a newer version"""
+        data = self.load_tokens()
+        if data and data.get("version", 0) > self.token_data.get("version", 0):
+            self.token_data = data
+            return True
+        return False
+
     def save_tokens(self):
         """Save updated tokens to file"""
+        with self.file_lock():
+            self._write_tokens()
+
+    def _write_tokens(self):
+        """Write tokens atomically; the caller must hold the file lock"""
         try:
-            with open(self.token_file, "w") as f:
-                json.dump(self.token_data, f, indent=4)
+            on_disk = self.load_tokens() or {}
+            self.token_data["version"] = (
+                max(on_disk.get("version", 0), self.token_data.get("version", 0)) + 1
+            )
+
+            directory = os.path.dirname(os.path.abspath(self.token_file))
+            fd, tmp_path = tempfile.mkstemp(
+                dir=directory, prefix=".tokens-", suffix=".tmp"
+            )
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(self.token_data, f, indent=4)
+                    f.flush()
+                    os.fsync(f.fileno())
+                try:
+                    os.replace(tmp_path, self.token_file)
+                except OSError:
+                    # A single-file bind mount (see docker-compose.yml) cannot be
+                    # renamed over; write in place, still protected by the lock
+                    with open(self.token_file, "w") as f:
+                        json.dump(self.token_data, f, indent=4)
+                        f.flush()
+                        os.fsync(f.fileno())
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
             print("✓ Tokens saved successfully")
         except Exception as e:
             print(f"✗ ERROR: Error saving tokens: {e}")
@@ -58,21 +186,39 @@ class TokenManager:
         """Get refresh token"""
         return self.token_data.get("tokens", {}).get("refresh_token")
 
-    def is_token_expired(self):
-        """Check if access token is expired"""
+    def seconds_until_expiry(self):
+        """Seconds left before the access token expires (negative if already expired)"""
         expires_in = self.token_data.get("tokens", {}).get("expires_in", 3600)
         saved_at = self.token_data.get("saved_at", 0)
-        elapsed = time.time() - saved_at
-        # Add 10 minute buffer to avoid edge cases
-        return elapsed >= (expires_in - 600)
+        return expires_in - (time.time() - saved_at)
 
-    def refresh_access_token(self):
-        """Refresh the access token using refresh token"""
+    def is_token_expired(self, margin=DEFAULT_REFRESH_MARGIN):
+        """Check if access token is expired"""
+        # Add a buffer (10 minutes by default) to avoid edge cases
+        return self.seconds_until_expiry() <= margin
+
+    def refresh_access_token(self, margin=DEFAULT_REFRESH_MARGIN, force=False):
+        """
+        Refresh the access token using refresh token.
+        Single-flighted across threads and processes: callers that waited on an
+        in-flight refresh reuse its result.
+        """
+        with self._refresh_lock, self.file_lock():
+            # Another thread or process may have refreshed while we waited for
+            # the lock; refresh tokens are single-use, so never refresh twice
+            if self.reload_if_newer():
+                print("  → Picked up tokens refreshed by another process")
+            if not force and not self.is_token_expired(margin):
+                return True
+            return self._refresh_access_token()
+
+    def _refresh_access_token(self):
         print("  → Access token expired, refreshing...")
 
         refresh_token = self.get_refresh_token()
         if not refresh_token:
             print("  ✗ ERROR: No refresh token available")
+            self.refresh_rejected = True
             return False
 
         endpoint = f"{self.auth_base_url}/Authentication/OAuth2/Token"
@@ -107,7 +253,8 @@ class TokenManager:
 
                     self.token_data["tokens"].update(new_tokens)
                     self.token_data["saved_at"] = time.time()
-                    self.save_tokens()
+                    self._write_tokens()
+                    self.refresh_rejected = False
                     print("  ✓ Token refreshed successfully")
                     return True
                 except json.JSONDecodeError:
@@ -117,12 +264,14 @@ class TokenManager:
                 print(
                     f"  ✗ ERROR: Token refresh failed with status {response.status_code}"
                 )
+                # A revoked or invalid refresh token will not start working on a retry
+                self.refresh_rejected = 400 <= response.status_code < 500 and response.status_code != 429
                 return False
         except Exception as e:
             print(f"  ✗ ERROR: Error refreshing token: {e}")
             return False
 
-    def validate_and_refresh_token(self):
+    def validate_and_refresh_token(self, margin=DEFAULT_REFRESH_MARGIN):
         """Validate token and refresh if needed"""
         print("\n[1/4] Validating tokens...")
 
@@ -131,17 +280,15 @@ class TokenManager:
             print("  ✗ ERROR: No access token found in token file")
             return False
 
-        if self.is_token_expired():
+        if self.is_token_expired(margin):
             print("  → Token is expired or expiring soon")
-            if not self.refresh_access_token():
+            if not self.refresh_access_token(margin):
                 print(
                     "\n✗ ERROR: Could not refresh access token. Please re-authenticate."
                 )
                 return False
         else:
-            elapsed = time.time() - self.token_data.get("saved_at", 0)
-            expires_in = self.token_data.get("tokens", {}).get("expires_in", 3600)
-            remaining = expires_in - elapsed
+            remaining = self.seconds_until_expiry()
             print(f"  ✓ Access token is still valid (expires in {int(remaining)}s)")
 
         return True
@@ -278,13 +425,30 @@ class TokenManager:
 
 class SessionManager:
     def __init__(
-        self, token_manager: TokenManager, session: requests.Session, api_base_url
+        self,
+        token_manager: TokenManager,
+        session: requests.Session,
+        api_base_url,
+        sso_mode="auto",
+        sso_extractors=None,
+        web_session_max_age=None,
+        hub_base_url=None,
     ):
         self.token_manager = token_manager
         self.session = session
         self.api_base_url = api_base_url
         self.web_base_url = None
+        # Fixed hub origin (e.g. a local stand-in); derived from the SSO URL when unset
+        self.hub_base_url = hub_base_url
         self.use_bearer_token = False
+        # "auto": HTTP first with Selenium fallback, "requests": HTTP only, "selenium": browser only
+        self.sso_mode = sso_mode
+        self.sso_extractors = sso_extractors or DEFAULT_SSO_EXTRACTORS
+        # Hub cookies rarely carry an expiry, so fall back to a maximum age
+        self.web_session_max_age = web_session_max_age
+        self.session_established_at = None
+        # Held while the session is (re)established or used for a fetch cycle
+        self.lock = threading.RLock()
 
     def get_sso_url(self):
         """
@@ -450,83 +614,287 @@ class SessionManager:
                 except:
                     pass
 
-    def establish_web_session(self):
+    def establish_web_session_with_requests(self, sso_url):
         """
-        Use the SSO URL to establish a web session with cookies.
-        Uses Selenium to execute JavaScript and complete authentication.
+        Follow the SSO hop chain with plain HTTP requests instead of a browser.
+        HTTP redirects are followed by requests itself; form posts, meta refreshes
+        and JavaScript redirects are resolved by the configured extractors.
         """
-        print("\n[2/4] Establishing web session...")
+        print("  → Completing SSO authentication via HTTP redirects...")
 
-        sso_url = self.get_sso_url()
-        if not sso_url:
-            print("  ✗ ERROR: Could not get SSO URL")
-            return False
+        headers = {
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        }
 
-        # Extract base URL from SSO URL
-        parsed = urlparse(sso_url)
-        self.web_base_url = f"{parsed.scheme}://hub.infomentor.se"
-        print(f"  → Using hub URL: {self.web_base_url}")
+        method, url, data = "GET", sso_url, None
+        try:
+            for hop in range(SSO_MAX_HOPS):
+                if method == "POST":
+                    response = self.session.post(
+                        url, data=data, headers=headers, timeout=30, allow_redirects=True
+                    )
+                else:
+                    response = self.session.get(
+                        url, headers=headers, timeout=30, allow_redirects=True
+                    )
 
-        # Use Selenium to complete the SSO flow
-        if not self.establish_web_session_with_selenium(sso_url):
-            print("  ✗ ERROR: Failed to establish session with Selenium")
+                if response.status_code != 200:
+                    print(f"  ✗ SSO hop {hop + 1} returned status {response.status_code}")
+                    return False
+
+                print(f"  → SSO hop {hop + 1}: {response.url[:100]}")
+
+                # Landing on the hub (and not its login page) ends the chain
+                landed = urlparse(response.url)
+                if (
+                    landed.netloc == urlparse(self.web_base_url).netloc
+                    and "login" not in landed.path.lower()
+                ):
+                    print(f"  → Final URL after SSO: {response.url[:100]}")
+                    return True
+
+                next_step = None
+                for extractor in self.sso_extractors:
+                    next_step = extractor(response.text, response.url)
+                    if next_step:
+                        break
+
+                if not next_step:
+                    # Nothing left to follow, the page we landed on is the end of the chain
+                    print(f"  → Final URL after SSO: {response.url[:100]}")
+                    return True
+
+                method, url, data = next_step
+
+            print(f"  ✗ SSO chain exceeded {SSO_MAX_HOPS} hops")
+            return False
+        except requests.exceptions.RequestException as e:
+            print(f"  ✗ Network error during HTTP SSO: {e}")
+            return False
+        except Exception as e:
+            print(f"  ✗ Unexpected error during HTTP SSO: {e}")
             return False
 
-        # Verify the session works by testing the news API
-        print("  → Testing session with news API endpoint...")
+    def verify_web_session(self):
+        """
+        Cheap session probe: request the news endpoint without following redirects
+        and without reading the body. An authenticated session answers 200, an
+        expired one redirects to the login page.
+        """
+        print("  → Probing web session...")
         test_url = f"{self.web_base_url}/Communication/News/GetNewsList"
         test_headers = {
             "Accept": "application/json, text/javascript, */*; q=0.01",
-            "Accept-Language": "en-US,en;q=0.6",
             "Cache-Control": "no-cache",
-            "Origin": "https://hub.infomentor.se",
-            "Pragma": "no-cache",
             "Referer": f"{self.web_base_url}/",
-            "Sec-Fetch-Dest": "empty",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Site": "same-origin",
             "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "X-Requested-With": "XMLHttpRequest",
         }
 
         try:
-            test_response = self.session.get(
-                test_url, headers=test_headers, timeout=10, allow_redirects=False
-            )
-
-            if test_response.status_code == 200:
-                try:
-                    test_data = test_response.json()
-                    if isinstance(test_data, dict):
-                        print("  ✓ Session test successful - got valid JSON response")
-                        return True
-                except:
-                    pass
-                print(
-                    f"  ✓ Session test got 200 OK (response length: {len(test_response.text)} bytes)"
-                )
+            # stream=True so only the status line and headers are transferred
+            with self.session.get(
+                test_url,
+                headers=test_headers,
+                timeout=10,
+                allow_redirects=False,
+                stream=True,
+            ) as test_response:
+                status = test_response.status_code
+                location = test_response.headers.get("Location", "")
+
+            if status == 200:
+                print("  ✓ Session probe successful")
                 return True
-            elif test_response.status_code in [301, 302, 303, 307, 308]:
-                redirect_url = test_response.headers.get("Location", "")
-                print(f"  ⚠ Session test got redirect {test_response.status_code}")
-                if redirect_url:
-                    print(f"  → Redirect to: {redirect_url[:100]}")
-                if "login" in redirect_url.lower():
+            elif status in [301, 302, 303, 307, 308]:
+                print(f"  ⚠ Session probe got redirect {status}")
+                if location:
+                    print(f"  → Redirect to: {location[:100]}")
+                if "login" in location.lower():
                     print(
                         "  ✗ ERROR: Still redirected to login - session not authenticated"
                     )
-                    return False
-                # Try following the redirect
-                final_response = self.session.get(
-                    redirect_url, headers=test_headers, timeout=10
-                )
-                if final_response.status_code == 200:
-                    print("  ✓ Session test successful after redirect")
-                    return True
+                return False
             else:
-                print(f"  ✗ ERROR: Session test returned {test_response.status_code}")
-                print(f"  → Response: {test_response.text[:200]}")
+                print(f"  ✗ ERROR: Session probe returned {status}")
+                return False
+        except Exception as e:
+            print(f"  ✗ ERROR: Error probing session: {e}")
+            return False
+
+    def seconds_until_session_expiry(self):
+        """
+        Seconds left before the hub cookies expire, or None if unknown.
+        Uses the earliest cookie expiry for the hub domain, otherwise the
+        configured maximum session age.
+        """
+        if not self.web_base_url or self.session_established_at is None:
+            return None
+
+        now = time.time()
+        hub_host = urlparse(self.web_base_url).netloc
+        expiries = [
+            cookie.expires
+            for cookie in self.session.cookies
+            if cookie.expires and hub_host.endswith(cookie.domain.lstrip("."))
+        ]
+        if self.web_session_max_age:
+            expiries.append(self.session_established_at + self.web_session_max_age)
+
+        if not expiries:
+            return None
+        return min(expiries) - now
+
+    def ensure_web_session(self, margin=DEFAULT_REFRESH_MARGIN):
+        """
+        Reuse the current web session if it is not about to expire and passes the
+        cheap probe, otherwise run the SSO flow. Single-flighted with the lock.
+        """
+        with self.lock:
+            if self.web_base_url and self.session_established_at is not None:
+                remaining = self.seconds_until_session_expiry()
+                if (remaining is None or remaining > margin) and self.verify_web_session():
+                    print("\n[2/4] Reusing existing web session")
+                    return True
+            # The SSO call needs a valid access token (no-op if still fresh)
+            self.token_manager.refresh_access_token(margin)
+            return self.establish_web_session()
+
+    def establish_web_session(self):
+        """
+        Use the SSO URL to establish a web session with cookies.
+        Tries plain HTTP redirects first and falls back to Selenium when the
+        resulting session does not pass the hub probe.
+        """
+        with tracer.span("auth.sso", mode=self.sso_mode) as span:
+            established = self._establish_web_session()
+            if not established:
+                span.fail()
+            return established
+
+    def _establish_web_session(self):
+        print("\n[2/4] Establishing web session...")
+
+        sso_url = self.get_sso_url()
+        if not sso_url:
+            print("  ✗ ERROR: Could not get SSO URL")
+            return False
+
+        # Extract base URL from SSO URL
+        parsed = urlparse(sso_url)
+        self.web_base_url = self.hub_base_url or f"{parsed.scheme}://hub.infomentor.se"
+        print(f"  → Using hub URL: {self.web_base_url}")
+
+        self.session_established_at = None
+
+        if self.sso_mode in ("auto", "requests"):
+            if self.establish_web_session_with_requests(sso_url) and self.verify_web_session():
+                self.session_established_at = time.time()
+                return True
+
+            if self.sso_mode == "requests":
+                print("  ✗ ERROR: HTTP SSO failed and Selenium fallback is disabled")
+                return False
+
+            # SSO URLs are one-time, so the fallback needs a fresh one
+            print("  ⚠ HTTP SSO did not yield a valid session, falling back to Selenium")
+            sso_url = self.get_sso_url()
+            if not sso_url:
+                print("  ✗ ERROR: Could not get SSO URL")
                 return False
+
+        # Use Selenium to complete the SSO flow
+        with tracer.span("auth.selenium") as span:
+            launched = self.establish_web_session_with_selenium(sso_url)
+            if not launched:
+                span.fail()
+        if not launched:
+            print("  ✗ ERROR: Failed to establish session with Selenium")
+            return False
+
+        if not self.verify_web_session():
+            return False
+        self.session_established_at = time.time()
+        return True
+
+
+class CredentialRefresher(threading.Thread):
+    """
+    Background thread that renews the OAuth token and hub cookies shortly before
+    they expire, so fetch cycles never start with an expired credential.
+    Failed renewals are retried with exponential backoff capped at
+    `max_interval`; after `max_auth_failures` rejected refresh tokens in a
+    row the thread gives up instead of hammering the token endpoint.
+    """
+
+    def __init__(
+        self,
+        token_manager: TokenManager,
+        session_manager: SessionManager,
+        margin=DEFAULT_REFRESH_MARGIN,
+        min_interval=30,
+        max_interval=3600,
+        max_auth_failures=3,
+    ):
+        super().__init__(name="credential-refresher", daemon=True)
+        self.token_manager = token_manager
+        self.session_manager = session_manager
+        self.margin = margin
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_auth_failures = max_auth_failures
+        # Consecutive failed renewals, and how many of them were rejected refresh tokens
+        self.failures = 0
+        self.auth_failures = 0
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def next_wakeup(self):
+        """Seconds until the earliest credential enters the refresh margin, or the backoff after a failure"""
+        if self.failures:
+            return min(self.max_interval, self.min_interval * 2 ** (self.failures - 1))
+        deadlines = [self.token_manager.seconds_until_expiry()]
+        session_remaining = self.session_manager.seconds_until_session_expiry()
+        if session_remaining is not None:
+            deadlines.append(session_remaining)
+
+        delay = min(deadlines) - self.margin
+        return max(self.min_interval, min(self.max_interval, delay))
+
+    def refresh(self):
+        """Renew whatever is inside the margin; returns False if a renewal failed"""
+        try:
+            if self.token_manager.is_token_expired(self.margin):
+                print("\n[Refresher] Proactively refreshing access token...")
+                if not self.token_manager.refresh_access_token(self.margin):
+                    return False
+
+            session_remaining = self.session_manager.seconds_until_session_expiry()
+            if session_remaining is not None and session_remaining <= self.margin:
+                print("\n[Refresher] Proactively renewing web session...")
+                if not self.session_manager.ensure_web_session(self.margin):
+                    return False
+            return True
         except Exception as e:
-            print(f"  ✗ ERROR: Error testing session: {e}")
+            print(f"  ✗ ERROR: Background credential refresh failed: {e}")
             return False
+
+    def run(self):
+        while not self._stop_event.wait(self.next_wakeup()):
+            if self.refresh():
+                self.failures = self.auth_failures = 0
+                continue
+
+            self.failures += 1
+            if self.token_manager.refresh_rejected:
+                self.auth_failures += 1
+                if self.auth_failures >= self.max_auth_failures:
+                    print(
+                        f"  ✗ ERROR: Refresh token rejected {self.auth_failures} times, stopping background "
+                        "refresh (run `cli.py auth` to log in again)"
+                    )
+                    return
+            print(f"  ⚠ Background credential refresh failed, retrying in {self.next_wakeup():.0f}s")
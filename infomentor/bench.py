@@ -0,0 +1,401 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+DEFAULT_HISTORY_FILE = "bench_history.json"
+# Fail when a metric is this much slower than its baseline
+DEFAULT_THRESHOLD = 0.25
+# Baseline is the median of this many previous runs
+BASELINE_RUNS = 5
+
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow the fetchers' progress output while timing"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def best_of(func, repeat=5, setup=None):
+    """
+    Fastest wall time of `repeat` calls, in seconds. With `setup`, each call
+    gets fresh arguments from it (untimed), so nothing memoized on the inputs
+    by an earlier repeat is reused.
+    """
+    timings = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def newsletter_html(size=50_000):
+    """A long newsletter in the hub's HTML, roughly `size` characters"""
+    paragraph = (
+        "<p>Hej alla föräldrar! Denna vecka har vi arbetat med <strong>bråk</strong> i matematiken "
+        "och läst <em>Bröderna Lejonhjärta</em> i svenskan. På fredag den 18/10 kl. 8:30-14:00 åker vi "
+        "på utflykt, ta med matsäck &amp; oömma kläder.<br>Mer info på "
+        '<a href="https://example.org/info">skolans webbplats</a>.</p>'
+        "<ul><li>Idrott: ta med gympapåse</li><li>Bibliotek: lämna tillbaka böcker</li></ul>\n"
+    )
+    return paragraph * (size // len(paragraph) + 1)
+
+
+# --- Benchmarks; each returns {metric_name: seconds} ---
+
+
+def bench_storage(quick=False):
+    from .storage import SHARD_SIZE, StorageManager
+
+    results = {}
+    for count in (1_000, 10_000) if quick else (1_000, 10_000, 100_000):
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = StorageManager(Path(tmp) / "news", Path(tmp) / "files")
+            for i in range(count):
+                path = storage.entity_path("news", i, "100")
+                if i % SHARD_SIZE == 0:
+                    path.parent.mkdir(parents=True)
+                path.write_text('{"id": %d}' % i)
+                # Another pupil's items and notifications, which the scan must not touch
+                path = storage.entity_path("notification", i, "101")
+                if i % SHARD_SIZE == 0:
+                    path.parent.mkdir(parents=True)
+                path.touch()
+            assert len(storage.get_existing_ids(pupil_id="100")) == count
+            label = f"{count // 1000}k"
+            results[f"storage.get_existing_ids.{label}"] = best_of(
+                lambda: storage.get_existing_ids(pupil_id="100"), repeat=3
+            )
+
+            # The same items after everything was rolled into packs
+            with quiet():
+                storage.compact(older_than_days=-1)
+            assert len(storage.get_existing_ids(pupil_id="100")) == count
+            results[f"storage.get_existing_ids.packed.{label}"] = best_of(
+                lambda: storage.get_existing_ids(pupil_id="100"), repeat=3
+            )
+            results[f"storage.load_news_item.packed.{label}"] = best_of(
+                lambda: storage.load_news_item(count // 2, pupil_id="100")
+            )
+    return results
+
+
+def schedule_weeks(entries=5_000, changed=0.1):
+    """Two large schedule snapshots with a share of modified, added and removed entries"""
+    start = datetime(2024, 10, 14, 8, 0)
+    old = []
+    for i in range(entries):
+        begin = start + timedelta(days=i % 5, minutes=15 * (i // 5 % 40))
+        old.append(
+            {
+                "id": i,
+                "title": f"Lektion {i % 9}",
+                "startDateFull": begin.strftime("%Y-%m-%dT%H:%M:%S"),
+                "endDateFull": (begin + timedelta(minutes=50)).strftime("%Y-%m-%dT%H:%M:%S"),
+                "formattedStartDate": begin.strftime("%a %d %b"),
+                "formattedEndDate": begin.strftime("%a %d %b"),
+                "startTime": begin.strftime("%H:%M"),
+                "endTime": (begin + timedelta(minutes=50)).strftime("%H:%M"),
+                "description": "Sal 12",
+            }
+        )
+    new = [dict(entry) for entry in old]
+    step = max(1, int(1 / changed))
+    for entry in new[::step]:
+        entry["title"] += " (inställd)"
+    del new[1::step * 2]
+    new.extend(dict(old[0], id=entries + i) for i in range(entries // step))
+    return old, new
+
+
+def bench_schedule(quick=False):
+    from .models import ScheduleEntry
+    from .schedule_fetcher import ScheduleFetcher
+
+    fetcher = ScheduleFetcher(None, None, None)
+    results = {}
+    for entries in (500, 5_000) if quick else (500, 5_000, 50_000):
+        old_week, new_week = schedule_weeks(entries)
+
+        def parsed():
+            return ScheduleEntry.parse_list(old_week), ScheduleEntry.parse_list(new_week)
+
+        results[f"schedule.detect_changes.{entries}"] = best_of(fetcher.detect_changes, setup=parsed)
+        # Steady state: the stored week is indexed, only the fetched one is new
+        old_map = fetcher.index_entries(ScheduleEntry.parse_list(old_week))
+        results[f"schedule.diff_indexed.{entries}"] = best_of(
+            lambda new: fetcher.diff_indexed(old_map, fetcher.index_entries(new)),
+            setup=lambda: (ScheduleEntry.parse_list(new_week),),
+        )
+    return results
+
+
+def hub_page(pupils=5, filler_kb=2_000, with_json=True):
+    """A large hub root page with the pupil block near the end"""
+    entries = [
+        {"name": f"Elev {i}", "id": str(100 + i), "switchPupilUrl": f"/Account/PupilSwitcher/SwitchPupil?pupilId={100 + i}"}
+        for i in range(pupils)
+    ]
+    filler = "<div class='tile'>" + "Lorem ipsum dolor sit amet. " * 36 + "</div>\n"
+    body = filler * filler_kb
+    if with_json:
+        block = json.dumps({"pupils": entries})
+    else:
+        # No parseable JSON array, forces the per-object regex fallback
+        block = ", ".join(json.dumps(e) for e in entries)
+    return f"<html><body>{body}<script>var IMHome = {block};</script>{filler * 10}</body></html>"
+
+
+class StreamedPage:
+    """Minimal stand-in for a streamed requests.Response"""
+
+    encoding = "utf-8"
+
+    def __init__(self, text):
+        self.content = text.encode("utf-8")
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+
+def bench_pupils(quick=False):
+    from .pupil_fetcher import PupilFetcher
+    from .storage import StorageManager
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        fetcher = PupilFetcher(None, StorageManager(Path(tmp) / "news", Path(tmp) / "files"))
+        for label, page in (
+            ("json", hub_page(filler_kb=200 if quick else 2_000)),
+            ("fallback", hub_page(filler_kb=200 if quick else 2_000, with_json=False)),
+        ):
+            with quiet():
+                assert fetcher.parse_pupils_from_html(page)
+                results[f"pupils.parse_pupils_from_html.{label}"] = best_of(
+                    lambda: fetcher.parse_pupils_from_html(page)
+                )
+                results[f"pupils.read_pupils.{label}"] = best_of(
+                    lambda: fetcher.read_pupils(StreamedPage(page))
+                )
+    return results
+
+
+def bench_notifiers(quick=False):
+    from .discord_notifier import DiscordNotifier
+    from .models import NewsItem
+    from .standins import WebhookStandIn
+    from .telegram_notifier import TelegramNotifier
+
+    sink = WebhookStandIn()
+    sink.start()
+    try:
+        item = NewsItem.from_json(
+            {
+                "title": "Veckobrev",
+                "publishedDateString": "2024-10-14",
+                "publishedBy": "Klassläraren",
+                "content": newsletter_html(),
+            }
+        )
+        events = [{"title": "Utflykt", "start": "2024-10-18T08:30:00", "end": "2024-10-18T14:00:00"}]
+        args = ("Sammanfattning av veckan.", events, ["Utflykt på fredag"], item.title)
+
+        discord = DiscordNotifier(f"{sink.base_url}/discord")
+        telegram = TelegramNotifier("bench", "1")
+        telegram.api_url = f"{sink.base_url}/telegram"
+
+        results = {}
+        with quiet():
+            results["notifier.discord.50kb"] = best_of(lambda: discord.send_webhook(*args, full_item=item), repeat=3)
+            results["notifier.telegram.50kb"] = best_of(lambda: telegram.send_webhook(*args, full_item=item), repeat=3)
+        return results
+    finally:
+        sink.stop()
+
+
+@contextlib.contextmanager
+def patched_env(values):
+    saved = {key: os.environ.get(key) for key in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def bench_cycle(quick=False):
+    from .standins import HubStandIn, LLMStandIn, WebhookStandIn
+
+    hub = HubStandIn(
+        pupils=2 if quick else 3,
+        news_per_pupil=10 if quick else 50,
+        notifications_per_pupil=10 if quick else 30,
+        attendance_per_pupil=50 if quick else 200,
+        shared_news=2,
+    )
+    llm = LLMStandIn(seed=0)
+    sink = WebhookStandIn()
+    for server in (hub, llm, sink):
+        server.start()
+
+    cwd = os.getcwd()
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            # Run from an empty directory so the local .env is not picked up
+            os.chdir(tmp)
+            hub.write_token_file("tokens.json")
+            env = {
+                "TOKEN_FILE": "tokens.json",
+                "API_BASE_URL": hub.base_url,
+                "AUTH_BASE_URL": hub.base_url,
+                "HUB_BASE_URL": hub.base_url,
+                "SSO_MODE": "requests",
+                "PERPLEXITY_API_KEY": "bench",
+                "PERPLEXITY_BASE_URL": llm.base_url,
+                "GEMINI_API_KEY": "",
+                "DISCORD_WEBHOOK_URL": f"{sink.base_url}/discord",
+                "TELEGRAM_BOT_TOKEN": "",
+                "LLM_FIXTURES_MODE": "",
+            }
+            with patched_env(env):
+                from .runner import InfoMentorFetcher
+
+                with quiet():
+                    fetcher = InfoMentorFetcher()
+                    results["cycle.fetch_and_process.cold"] = best_of(fetcher.fetch_and_process, repeat=1)
+                    results["cycle.fetch_and_process.warm"] = best_of(fetcher.fetch_and_process, repeat=3)
+                    for pupil in hub.pupils:
+                        hub.add_news(pupil["id"], 3)
+                    results["cycle.fetch_and_process.new_items"] = best_of(fetcher.fetch_and_process, repeat=1)
+                    # Seen by every pupil, processed and posted once
+                    hub.add_shared_news(3)
+                    results["cycle.fetch_and_process.shared_items"] = best_of(fetcher.fetch_and_process, repeat=1)
+                fetcher.llm_client.executor.shutdown(wait=False)
+                fetcher.llm_client.coordinator.shutdown(wait=False)
+    finally:
+        os.chdir(cwd)
+        for server in (hub, llm, sink):
+            server.stop()
+    return results
+
+
+BENCHMARKS = {
+    "storage": bench_storage,
+    "schedule": bench_schedule,
+    "pupils": bench_pupils,
+    "notifiers": bench_notifiers,
+    "cycle": bench_cycle,
+}
+
+
+# --- History and regression tracking ---
+
+
+def load_history(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+    except Exception as e:
+        print(f"⚠ Could not read benchmark history {path}: {e}")
+        return []
+
+
+def save_history(path, history):
+    with open(path, "w") as f:
+        json.dump(history, f, indent=2)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def baseline(history, metric, runs=BASELINE_RUNS):
+    """Median of the metric over the last `runs` recorded runs, or None"""
+    values = [run["results"][metric] for run in history if metric in run.get("results", {})]
+    if not values:
+        return None
+    return statistics.median(values[-runs:])
+
+
+def compare(results, history, threshold=DEFAULT_THRESHOLD):
+    """Print a comparison table and return the metrics that regressed"""
+    regressions = []
+    print(f"\n{'Metric':<45} {'Time':>10} {'Baseline':>10} {'Change':>8}")
+    print("-" * 76)
+    for metric, value in results.items():
+        base = baseline(history, metric)
+        if base is None or base <= 0:
+            print(f"{metric:<45} {value * 1000:>8.1f}ms {'-':>10} {'new':>8}")
+            continue
+        change = value / base - 1
+        marker = ""
+        if change > threshold:
+            marker = " ✗"
+            regressions.append((metric, value, base, change))
+        print(f"{metric:<45} {value * 1000:>8.1f}ms {base * 1000:>8.1f}ms {change:>+7.0%}{marker}")
+    return regressions
+
+
+def run(selected=None, quick=False, history_file=DEFAULT_HISTORY_FILE, threshold=DEFAULT_THRESHOLD, save=True):
+    """Run the selected benchmarks; returns True when nothing regressed"""
+    names = selected or list(BENCHMARKS)
+    results = {}
+    for name in names:
+        print(f"→ Running {name} benchmarks...")
+        start = time.perf_counter()
+        results.update(BENCHMARKS[name](quick=quick))
+        print(f"  ✓ {name} done in {time.perf_counter() - start:.1f}s")
+
+    history = load_history(history_file)
+    # Quick runs use smaller inputs and timings only compare on the same
+    # machine, so only compare like with like
+    machine = platform.node()
+    comparable = [
+        entry for entry in history
+        if entry.get("quick", False) == quick and entry.get("machine") == machine
+    ]
+    regressions = compare(results, comparable, threshold)
+
+    if save:
+        history.append(
+            {
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "revision": git_revision(),
+                "python": platform.python_version(),
+                "machine": machine,
+                "quick": quick,
+                "results": results,
+            }
+        )
+        save_history(history_file, history)
+        print(f"\n✓ Results appended to {history_file}")
+
+    if regressions:
+        print(f"\n✗ {len(regressions)} metric(s) regressed by more than {threshold:.0%}:")
+        for metric, value, base, change in regressions:
+            print(f"  - {metric}: {base * 1000:.1f}ms → {value * 1000:.1f}ms ({change:+.0%})")
+        return False
+    return True
@@ -7,15 +7,106 @@ class Config:
         self.env = self.load_env()
         self.perplexity_api_key = self.env.get("PERPLEXITY_API_KEY")
         self.gemini_api_key = self.env.get("GEMINI_API_KEY")
+        # Provider endpoints, overridable to point at the offline LLM stand-in
+        self.perplexity_base_url = self.env.get("PERPLEXITY_BASE_URL", "https://api.perplexity.ai")
+        self.gemini_base_url = self.env.get("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
+        # Record provider responses to fixtures ("record") or answer from them ("replay")
+        self.llm_fixtures_mode = self.env.get("LLM_FIXTURES_MODE") or None
+        self.llm_fixtures_dir = Path(self.env.get("LLM_FIXTURES_DIR", "llm_fixtures"))
+        # Maximum number of items packed into one batched LLM request
+        self.llm_batch_size = int(self.env.get("LLM_BATCH_SIZE", 5))
+        # Per-item LLM prompt budget after HTML and boilerplate are stripped
+        self.llm_max_input_tokens = int(self.env.get("LLM_MAX_INPUT_TOKENS", 3000))
+        # Routine posts the local extractor scores at least this confident skip the LLM
+        # (unset by default: every post goes to the LLM)
+        min_confidence = self.env.get("LOCAL_EXTRACTOR_MIN_CONFIDENCE", "")
+        self.local_min_confidence = float(min_confidence) if min_confidence.strip() else None
+        # Concurrent LLM requests and per-provider limits (requests/tokens per minute)
+        self.llm_concurrency = int(self.env.get("LLM_CONCURRENCY", 4))
+        # Hedge slow LLM calls by also asking the secondary provider after the primary's p95
+        self.llm_hedge = self.env.get("LLM_HEDGE", "").lower() in ("1", "true", "yes")
+        self.llm_rate_limits = {
+            "perplexity": (
+                self.optional_int("PERPLEXITY_RPM", 50),
+                self.optional_int("PERPLEXITY_TPM", None),
+            ),
+            "gemini": (
+                self.optional_int("GEMINI_RPM", 15),
+                self.optional_int("GEMINI_TPM", 250000),
+            ),
+        }
+        # Weeks of schedule fetched (in one request) and diffed, starting with the current one
+        self.schedule_weeks = int(self.env.get("SCHEDULE_WEEKS", 2))
+        # ScheduleEntry fields whose changes are reported (comma-separated)
+        self.schedule_diff_fields = tuple(
+            f.strip() for f in self.env.get("SCHEDULE_DIFF_FIELDS", "title,start,end,description").split(",") if f.strip()
+        )
+        # Hold schedule and attendance changes until they are stable for this many seconds (0 = off)
+        self.change_settle_seconds = int(self.env.get("CHANGE_SETTLE_SECONDS", 0))
+        # Attendance rows dated more than this many days before the newest one are not compared
+        self.attendance_lookback_days = int(self.env.get("ATTENDANCE_LOOKBACK_DAYS", 14))
+        # Ask the attendance endpoint for the recent date range only
+        self.attendance_range_request = self.env.get("ATTENDANCE_RANGE_REQUEST", "").lower() in ("1", "true", "yes")
+        # Notification IDs remembered per pupil next to the feed cursor's latest dateSent
+        self.notification_recent_ids = int(self.env.get("NOTIFICATION_RECENT_IDS", 500))
+        # Days a school-wide post is remembered so siblings' copies are not posted again
+        self.shared_retention_days = int(self.env.get("SHARED_RETENTION_DAYS", 30))
+        # Seconds within which a sibling's post with identical content (but its own ID) counts as a copy
+        self.shared_hash_window = int(self.env.get("SHARED_HASH_WINDOW", 3600))
+        # compact-storage archives news items and notifications saved more than this many days ago
+        self.archive_after_days = int(self.env.get("ARCHIVE_AFTER_DAYS", 90))
+        # Seconds the pupil list is reused before the hub root page is fetched again (0 = every cycle)
+        self.pupil_cache_ttl = int(self.env.get("PUPIL_CACHE_TTL", 21600))
         self.discord_webhook_url = self.env.get("DISCORD_WEBHOOK_URL")
         self.telegram_bot_token = self.env.get("TELEGRAM_BOT_TOKEN")
         self.telegram_chat_id = self.env.get("TELEGRAM_CHAT_ID")
+        # auto (HTTP with Selenium fallback), requests (HTTP only) or selenium
+        self.sso_mode = self.env.get("SSO_MODE", "auto").lower()
+        # Renew OAuth token and hub cookies this many seconds before they expire
+        self.credential_refresh_margin = int(self.env.get("CREDENTIAL_REFRESH_MARGIN", 600))
+        # Assumed hub session lifetime when cookies carry no expiry (unset = probe only)
+        max_age = self.env.get("WEB_SESSION_MAX_AGE")
+        self.web_session_max_age = int(max_age) if max_age else None
 
-        self.token_file = "infomentor_tokens.json"
-        self.output_dir = Path("news")
-        self.files_dir = Path("files")
-        self.api_base_url = "https://api-im.infomentor.se"
-        self.auth_base_url = "https://im.infomentor.se"
+        # Append one JSON line per timed stage to this file (unset = off)
+        self.trace_log = self.env.get("TRACE_LOG") or None
+        # Print the slowest stages at the end of every fetch cycle
+        self.trace_summary = self.env.get("TRACE_SUMMARY", "true").lower() in ("1", "true", "yes")
+
+        # Serve Prometheus metrics and /healthz on this port while running as a daemon (unset = off)
+        metrics_port = self.env.get("METRICS_PORT")
+        self.metrics_port = int(metrics_port) if metrics_port else None
+        self.metrics_host = self.env.get("METRICS_HOST", "0.0.0.0")
+        # /healthz fails when the last successful cycle is older than this (default: two intervals)
+        max_age = self.env.get("HEALTHZ_MAX_AGE")
+        self.healthz_max_age = int(max_age) if max_age else None
+
+        # Where `fetch --profile` and SIGUSR1 write profiles, and what SIGUSR1 profiles
+        self.profile_dir = Path(self.env.get("PROFILE_DIR", "profiles"))
+        self.profile_mode = self.env.get("PROFILE_MODE", "cpu").lower()
+
+        # Restart the daemon when RSS exceeds this many MB after a cycle (unset = never)
+        max_rss = self.env.get("MAX_RSS_MB")
+        self.max_rss_mb = int(max_rss) if max_rss else None
+        # exec (replace the process in place) or exit (let Docker/systemd restart it)
+        self.restart_mode = self.env.get("RESTART_MODE", "exec").lower()
+        # Rebuild the shared HTTP session with only its live cookies every N cycles (0 = never)
+        self.session_rebuild_cycles = int(self.env.get("SESSION_REBUILD_CYCLES", 24))
+
+        self.token_file = self.env.get("TOKEN_FILE", "infomentor_tokens.json")
+        self.output_dir = Path(self.env.get("NEWS_DIR", "news"))
+        self.files_dir = Path(self.env.get("FILES_DIR", "files"))
+        # InfoMentor endpoints, overridable to point at the local hub stand-in
+        self.api_base_url = self.env.get("API_BASE_URL", "https://api-im.infomentor.se")
+        self.auth_base_url = self.env.get("AUTH_BASE_URL", "https://im.infomentor.se")
+        self.hub_base_url = self.env.get("HUB_BASE_URL") or None
+
+    def optional_int(self, key, default):
+        """Read an integer setting; 0 or an empty value disables the limit"""
+        value = self.env.get(key)
+        if value is None:
+            return default
+        return int(value) if value.strip() else None
 
     def load_env(self):
         """Simple .env loader that merges with os.environ"""
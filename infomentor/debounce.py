@@ -0,0 +1,56 @@
+import time
+
+
+class ChangeDebouncer:
+    """
+    Holds detected changes until they have been stable for `settle_seconds`.
+
+    Callers diff the current state against the last *notified* state, so a
+    change that is reverted (an entry removed and re-added, a row edited back)
+    simply disappears from the diff and is dropped, and repeated edits of the
+    same item collapse into one net change. Each change is identified by a key
+    and a signature (e.g. its type and compared field values); a new signature for a
+    pending key restarts its window.
+    """
+
+    def __init__(self, settle_seconds=0, clock=time.time):
+        self.settle_seconds = settle_seconds
+        self.clock = clock
+        # scope -> {key: (signature, first seen)}
+        self.pending = {}
+
+    def settle(self, scope, changes):
+        """
+        Take {key: signature} of the changes detected in `scope` this poll and
+        return the keys that are ready to be emitted.
+        """
+        if not self.settle_seconds:
+            return set(changes)
+
+        now = self.clock()
+        held = self.pending.get(scope, {})
+        pending = {}
+        ready = set()
+        for key, signature in changes.items():
+            previous = held.get(key)
+            since = previous[1] if previous and previous[0] == signature else now
+            if now - since >= self.settle_seconds:
+                ready.add(key)
+            else:
+                pending[key] = (signature, since)
+
+        dropped = len(set(held) - set(changes))
+        if dropped:
+            print(f"  → Dropped {dropped} change(s) that disappeared before settling")
+        if pending:
+            print(f"  → Holding {len(pending)} change(s) until they settle")
+            self.pending[scope] = pending
+        else:
+            self.pending.pop(scope, None)
+        return ready
+
+    def has_pending(self, scope):
+        return bool(self.pending.get(scope))
+
+    def clear(self, scope):
+        self.pending.pop(scope, None)
@@ -0,0 +1,233 @@
+import hashlib
+import re
+import time
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def content_hash(*parts):
+    """Hash of whitespace-normalized text parts, e.g. a post's title and body"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(_WHITESPACE_RE.sub(" ", str(part or "")).strip().encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+class SharedContent:
+    """
+    Cross-pupil deduplication of news and notifications. Siblings at the same
+    school see school-wide posts under each pupil, with the same entity ID or
+    as copies with the same content. The first pupil to see an item claims it
+    and processes it (attachments, summary); siblings only join the claim.
+
+    Deliveries are queued and sent by `flush()` at the end of the cycle as
+    one notification naming every pupil that saw the item. Claimed keys are
+    kept on disk for `retention_days` together with the pupils that saw the
+    item. Entity-ID and URL keys match for that whole time, so a copy reaching
+    a sibling in a later cycle is not posted again. Content-hash keys only
+    match a different pupil's claim from the current cycle or the last
+    `hash_window` seconds, so a pupil's own repost and recurring reminders
+    are still delivered. With `deferred=False` deliveries are sent right away
+    (fetchers used on their own).
+
+    Every claim is also written to a persisted outbox before the item is
+    stored (and so marked seen), and only leaves it once its delivery was
+    sent. Entries left behind by a crash or a failed cycle are handed back to
+    the fetchers by `replay()` at the start of the next cycle.
+    """
+
+    def __init__(self, storage_manager, retention_days=30, hash_window=3600, deferred=True, clock=time.time):
+        self.storage_manager = storage_manager
+        self.retention = retention_days * 24 * 3600
+        self.hash_window = hash_window
+        self.deferred = deferred
+        self.clock = clock
+        # key -> (claimed at, canonical key); loaded on first use
+        self.claims = None
+        # canonical key -> IDs of the pupils that saw the item
+        self.owners = {}
+        # canonical key -> {"pupils": [names], "send": callable or None, "ready": bool}
+        self.pending = {}
+        self.dirty = False
+        # canonical key -> {"kind", "id", "pupil_id", "pupils", ...}; loaded on first use
+        self.outbox = None
+
+    def load(self):
+        if self.claims is None:
+            data = self.storage_manager.get_shared_claims() or {}
+            cutoff = self.clock() - self.retention
+            self.claims = {}
+            for key, value in data.items():
+                # [claimed at, canonical key, pupil IDs]; older state has no pupil IDs
+                claimed_at, canonical = value[0], value[1]
+                if claimed_at < cutoff:
+                    continue
+                self.claims[key] = (claimed_at, canonical)
+                if len(value) > 2:
+                    self.owners.setdefault(canonical, set()).update(value[2])
+            self.dirty = len(self.claims) != len(data)
+        return self.claims
+
+    def match(self, keys, pupil_id=None):
+        """The (claimed at, canonical key) of a claim on any of `keys` that applies to the pupil, else None"""
+        claims = self.load()
+        for key in keys:
+            if not key or key not in claims:
+                continue
+            claimed_at, canonical = claims[key]
+            if ":hash:" not in key:
+                return claims[key]
+            # Same content is only a sibling's copy when another pupil saw it recently;
+            # otherwise it is a repost or a recurring reminder
+            if str(pupil_id) in self.owners.get(canonical, ()):
+                continue
+            if canonical in self.pending or claimed_at >= self.clock() - self.hash_window:
+                return claims[key]
+        return None
+
+    def join(self, keys, pupil_name, pupil_id=None):
+        """
+        If any of `keys` matches a claim that applies to this pupil, add the
+        pupil to the claim and return True; the caller then skips the item.
+        """
+        match = self.match(keys, pupil_id)
+        if match is None:
+            return False
+        claimed_at, canonical = match
+        # Remember the other keys too, e.g. the content hash of an item first seen by ID
+        self.add_keys(keys, canonical, claimed_at)
+        self.add_owner(canonical, pupil_id)
+        delivery = self.pending.get(canonical)
+        if delivery is not None:
+            first = delivery["pupils"][0]
+            if pupil_name not in delivery["pupils"]:
+                delivery["pupils"].append(pupil_name)
+            print(f"  → Same item as for {first}, combining into one notification")
+            entry = self.load_outbox().get(canonical)
+            if entry is not None and entry.get("pupils") != delivery["pupils"]:
+                entry["pupils"] = list(delivery["pupils"])
+                self.save_outbox()
+        else:
+            print("  → Already posted for a sibling, skipping")
+        return True
+
+    def claim(self, keys, pupil_name, pupil_id, entry):
+        """
+        Claim an unseen item for this pupil and put `entry` (what the fetcher
+        needs to redeliver it) in the outbox; returns the canonical key.
+        Call before the item is stored.
+        """
+        self.load()
+        canonical = next(key for key in keys if key)
+        # Hash keys an older claim still holds did not match this pupil, so they move to this claim
+        self.add_keys(keys, canonical, self.clock(), replace=True)
+        self.owners[canonical] = set()
+        self.add_owner(canonical, pupil_id)
+        self.pending[canonical] = {"pupils": [pupil_name], "send": None, "ready": False}
+        self.load_outbox()[canonical] = dict(entry, pupils=[pupil_name])
+        self.save_outbox()
+        return canonical
+
+    def release(self, canonical):
+        """Drop a claim whose item could not be stored, so it is retried"""
+        self.pending.pop(canonical, None)
+        self.owners.pop(canonical, None)
+        for key in [key for key, (_, owner) in self.claims.items() if owner == canonical]:
+            del self.claims[key]
+        if self.load_outbox().pop(canonical, None) is not None:
+            self.save_outbox()
+
+    def load_outbox(self):
+        if self.outbox is None:
+            self.outbox = self.storage_manager.get_outbox() or {}
+        return self.outbox
+
+    def save_outbox(self):
+        self.storage_manager.set_outbox(self.load_outbox())
+
+    def replay(self, handlers):
+        """
+        Hand undelivered outbox entries from an earlier cycle back to the
+        fetchers: `handlers` maps an entry's kind to `handler(canonical, entry)`,
+        which queues the delivery again (or calls `drop`).
+        """
+        entries = list(self.load_outbox().items())
+        if entries:
+            print(f"\n[Delivery] Retrying {len(entries)} undelivered notification(s)")
+        for canonical, entry in entries:
+            handler = handlers.get(entry.get("kind"))
+            if handler is None:
+                self.drop(canonical)
+                continue
+            self.pending[canonical] = {"pupils": list(entry.get("pupils") or []), "send": None, "ready": False}
+            try:
+                handler(canonical, entry)
+            except Exception as e:
+                print(f"  ✗ ERROR retrying {canonical}: {e}")
+
+    def drop(self, canonical):
+        """Forget an outbox entry that can no longer be delivered"""
+        self.pending.pop(canonical, None)
+        if self.load_outbox().pop(canonical, None) is not None:
+            self.save_outbox()
+
+    def add_keys(self, keys, canonical, claimed_at, replace=False):
+        for key in keys:
+            if key and (replace or key not in self.claims):
+                self.claims[key] = (claimed_at, canonical)
+                self.dirty = True
+
+    def add_owner(self, canonical, pupil_id):
+        owners = self.owners.setdefault(canonical, set())
+        if pupil_id is not None and str(pupil_id) not in owners:
+            owners.add(str(pupil_id))
+            self.dirty = True
+
+    def deliver(self, canonical, send):
+        """Queue `send(pupil_names)` for the end of the cycle (None: nothing to send)"""
+        if not self.deferred:
+            delivery = self.pending.pop(canonical, None)
+            if send:
+                send(self.pupil_names(delivery["pupils"] if delivery else []))
+            self.drop(canonical)
+            return
+        delivery = self.pending.setdefault(canonical, {"pupils": [], "send": None, "ready": False})
+        delivery["send"] = send
+        delivery["ready"] = True
+
+    def pupil_names(self, pupils):
+        return ", ".join(name for name in pupils if name) or None
+
+    def flush(self):
+        """Send the queued deliveries, clear them from the outbox and persist the claims"""
+        pending, self.pending = self.pending, {}
+        deliveries = {canonical: delivery for canonical, delivery in pending.items() if delivery["send"]}
+        shared = sum(1 for delivery in deliveries.values() if len(delivery["pupils"]) > 1)
+        if deliveries:
+            print(f"\n[Delivery] Sending {len(deliveries)} notification(s), {shared} shared between pupils")
+
+        outbox = self.load_outbox()
+        before = len(outbox)
+        for canonical, delivery in pending.items():
+            # Entries whose fetcher failed before queueing them stay for the next cycle
+            if not delivery["ready"]:
+                continue
+            if delivery["send"]:
+                try:
+                    delivery["send"](self.pupil_names(delivery["pupils"]))
+                except Exception as e:
+                    print(f"  ✗ ERROR sending notification: {e}")
+                    continue
+            outbox.pop(canonical, None)
+        if len(outbox) != before or pending:
+            self.save_outbox()
+
+        if self.dirty and self.claims is not None:
+            self.storage_manager.set_shared_claims(
+                {
+                    key: [claimed_at, canonical, sorted(self.owners.get(canonical, ()))]
+                    for key, (claimed_at, canonical) in self.claims.items()
+                }
+            )
+            self.dirty = False
@@ -5,6 +5,8 @@ from urllib.parse import quote
 
 import requests
 
+from .tracing import tracer
+
 
 class DiscordNotifier:
     def __init__(self, webhook_url):
@@ -83,9 +85,11 @@ class DiscordNotifier:
                 else:
                     response = requests.post(self.webhook_url, json=data, timeout=30)
                 response.raise_for_status()
+                tracer.add("messages")
                 return True
             except Exception as e:
                 print(f"    ✗ Error sending to Discord: {e}")
+                tracer.fail(e)
                 return False
             finally:
                 for f in opened_files:
@@ -128,10 +132,10 @@ class DiscordNotifier:
 
         # --- Embed 2+: Full Content ---
         if full_item:
-            f_title = full_item.get("title", "No Title")
-            date = full_item.get("publishedDateString", "Unknown Date")
-            author = full_item.get("publishedBy", "Unknown Author")
-            raw_content = full_item.get("content", "")
+            f_title = full_item.title or "No Title"
+            date = full_item.published_date or "Unknown Date"
+            author = full_item.published_by or "Unknown Author"
+            raw_content = full_item.content or ""
 
             # Convert HTML to Markdown
             markdown_content = raw_content
@@ -209,11 +213,11 @@ class DiscordNotifier:
                 ctype = change["type"]
 
                 if ctype == "added":
-                    change_text += f"➕ **Added**: {entry['formattedStartDate']} {entry['startTime'] or ''} - {entry['title']}\n"
+                    change_text += f"➕ **Added**: {entry.start_date} {entry.start_time or ''} - {entry.title}\n"
                 elif ctype == "removed":
-                    change_text += f"➖ **Removed**: {entry['formattedStartDate']} {entry['startTime'] or ''} - {entry['title']}\n"
+                    change_text += f"➖ **Removed**: {entry.start_date} {entry.start_time or ''} - {entry.title}\n"
                 elif ctype == "modified":
-                    change_text += f"✏️ **Modified**: {entry['formattedStartDate']} {entry['startTime'] or ''} - {entry['title']}\n"
+                    change_text += f"✏️ **Modified**: {entry.start_date} {entry.start_time or ''} - {entry.title}\n"
                     for diff in change.get("diffs", []):
                         change_text += f"  - {diff}\n"
 
@@ -223,10 +227,10 @@ class DiscordNotifier:
         # Group by day
         days = {}
         # Sort by startDateFull to ensure correct order
-        sorted_schedule = sorted(schedule, key=lambda x: x.get("startDateFull", ""))
+        sorted_schedule = sorted(schedule, key=lambda x: x.start or "")
 
         for entry in sorted_schedule:
-            day = entry.get("formattedStartDate", "Unknown")
+            day = entry.start_date or "Unknown"
             if day not in days:
                 days[day] = []
             days[day].append(entry)
@@ -236,14 +240,14 @@ class DiscordNotifier:
             schedule_text += f"**{day}**\n"
             for entry in entries:
                 time_str = (
-                    f"{entry['startTime']}-{entry['endTime']}"
-                    if entry["startTime"]
+                    f"{entry.start_time}-{entry.end_time}"
+                    if entry.start_time
                     else "All Day"
                 )
-                schedule_text += f"• {time_str}: {entry['title']}\n"
-                if entry.get("description"):
+                schedule_text += f"• {time_str}: {entry.title}\n"
+                if entry.description:
                     # Strip HTML tags for description
-                    desc = re.sub(r"<[^>]+>", "", entry["description"]).strip()
+                    desc = re.sub(r"<[^>]+>", "", entry.description).strip()
                     if desc:
                         # Truncate description if too long
                         if len(desc) > 100:
@@ -272,17 +276,19 @@ class DiscordNotifier:
             print("    → Sending Discord schedule notification...")
             requests.post(self.webhook_url, json=data, timeout=30)
             print("    ✓ Schedule sent to Discord")
+            tracer.add("messages")
         except Exception as e:
             print(f"    ✗ Error sending schedule to Discord: {e}")
+            tracer.fail(e)
 
     def send_notification(self, notification, pupil_name=None):
         if not self.webhook_url:
             return
 
-        title = notification.get("title", "New Notification")
-        subtitle = notification.get("subTitle", "")
-        date_sent = notification.get("dateSent", "")
-        url = notification.get("url", "")
+        title = notification.title or "New Notification"
+        subtitle = notification.subtitle or ""
+        date_sent = notification.date_sent or ""
+        url = notification.url or ""
 
         description = f"{subtitle}\n\n" if subtitle else ""
 
@@ -311,8 +317,10 @@ class DiscordNotifier:
             print("    → Sending Discord app notification...")
             requests.post(self.webhook_url, json=data, timeout=30)
             print("    ✓ Notification sent to Discord")
+            tracer.add("messages")
         except Exception as e:
             print(f"    ✗ Error sending notification to Discord: {e}")
+            tracer.fail(e)
 
     def send_attendance_update(self, new_records, pupil_name=None):
         if not self.webhook_url or not new_records:
@@ -326,10 +334,10 @@ class DiscordNotifier:
         
         fields = []
         for record in new_records:
-            date = record.get("dateString", "Unknown Date")
-            lesson = record.get("lessonName", "Unknown Lesson")
-            status = record.get("registrationTypeName", "Unknown Status")
-            comment = record.get("comment", "")
+            date = record.date or "Unknown Date"
+            lesson = record.lesson or "Unknown Lesson"
+            status = record.status or "Unknown Status"
+            comment = record.comment or ""
             
             value = f"**Status:** {status}\n**Lesson:** {lesson}"
             if comment:
@@ -358,8 +366,10 @@ class DiscordNotifier:
             print("    → Sending Discord attendance notification...")
             requests.post(self.webhook_url, json=data, timeout=30)
             print("    ✓ Attendance update sent to Discord")
+            tracer.add("messages")
         except Exception as e:
             print(f"    ✗ Error sending attendance update to Discord: {e}")
+            tracer.fail(e)
 
     def send_error(self, context, error_message):
         if not self.webhook_url:
@@ -2,12 +2,114 @@ import requests
 import json
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import local_extractor, metrics
+from .llm_fixtures import LLMFixtures
+from .llm_router import ProviderRouter
+from .rate_limit import TokenBucket, backoff_delay, parse_retry_after
+from .text_normalizer import estimate_tokens, normalize_for_llm
+from .tracing import tracer
+
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+DEFAULT_PERPLEXITY_BASE_URL = "https://api.perplexity.ai"
+DEFAULT_GEMINI_BASE_URL = "https://generativelanguage.googleapis.com"
+
+# Default (requests per minute, tokens per minute) per provider; None = unlimited
+DEFAULT_RATE_LIMITS = {
+    "perplexity": (50, None),
+    "gemini": (15, 250000),
+}
+
+SYSTEM_PROMPT = "You are a strict data extraction AI. You output ONLY JSON."
+
+ANALYSIS_INSTRUCTIONS = """
+        Analyze the following school news text (plain text extracted from HTML) and extract specific information.
+
+        1. Create a concise summary highlighting important information for a parent (in Swedish).
+        2. Highlight extra important sections of information, like school ends early.
+        3. Extract any specific events that have a date and time.
+        """
+
+ANALYSIS_SCHEMA = """{
+            "summary": "The summary text...",
+            "highlights": [
+                "Ta med gosedjur den 11/12",
+                "Skolan slutar 15.00 den 1/2"
+            ],
+            "events": [
+                {
+                    "title": "Event Title",
+                    "start": "YYYY-MM-DDTHH:MM:SS",
+                    "end": "YYYY-MM-DDTHH:MM:SS",
+                    "description": "Details about the event"
+                }
+            ]
+        }"""
+
+EVENT_RULES = """Rules for events:
+        - If a date is mentioned without a year, assume the next occurrence of that date.
+        - If no specific time is mentioned for a date, assume 08:00:00 for start and 09:00:00 for end.
+        - Format dates strictly as ISO 8601 (YYYY-MM-DDTHH:MM:SS).
+        - If no events are found, "events" should be an empty list.
+        - Respond with only the JSON object, wrapped in three backticks (```json ... ```)."""
 
 
 class LLMClient:
-    def __init__(self, perplexity_api_key=None, gemini_api_key=None):
+    def __init__(
+        self,
+        perplexity_api_key=None,
+        gemini_api_key=None,
+        batch_size=5,
+        batch_max_chars=20000,
+        max_concurrency=4,
+        rate_limits=None,
+        max_retries=5,
+        hedge=False,
+        max_input_tokens=3000,
+        local_min_confidence=None,
+        perplexity_base_url=DEFAULT_PERPLEXITY_BASE_URL,
+        gemini_base_url=DEFAULT_GEMINI_BASE_URL,
+        fixtures_dir=None,
+        fixtures_mode=None,
+    ):
         self.perplexity_api_key = perplexity_api_key
         self.gemini_api_key = gemini_api_key
+        # Overridable so the offline stand-in server (infomentor.standins) can be used
+        self.perplexity_base_url = perplexity_base_url.rstrip("/")
+        self.gemini_base_url = gemini_base_url.rstrip("/")
+        # Record real responses to fixtures, or replay them without network access
+        self.fixtures = LLMFixtures(fixtures_dir, fixtures_mode) if fixtures_dir and fixtures_mode else None
+        # Backlogs are packed into batched requests of at most this many items/characters
+        self.batch_size = batch_size
+        self.batch_max_chars = batch_max_chars
+        self.max_retries = max_retries
+        # Per-item prompt budget after markup and boilerplate are stripped
+        self.max_input_tokens = max_input_tokens
+        # Routine posts scoring at least this confidence skip the LLM (None disables)
+        self.local_min_confidence = local_min_confidence
+
+        # Separate request and token buckets per provider
+        self.limiters = {}
+        for provider, (rpm, tpm) in {**DEFAULT_RATE_LIMITS, **(rate_limits or {})}.items():
+            self.limiters[provider] = (TokenBucket.per_minute(rpm), TokenBucket.per_minute(tpm))
+
+        # Summarizations run concurrently up to this limit
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, max_concurrency), thread_name_prefix="llm"
+        )
+        # Coordinates whole backlogs in the background; kept separate from the
+        # worker pool so a waiting coordinator never starves its own batches
+        self.coordinator = ThreadPoolExecutor(max_workers=2, thread_name_prefix="llm-batch")
+
+        # Perplexity stays preferred when configured; Gemini becomes the failover
+        providers = []
+        if perplexity_api_key:
+            providers.append("perplexity")
+        if gemini_api_key:
+            providers.append("gemini")
+        self.router = ProviderRouter(providers, hedge=hedge)
 
     def clean_json_response(self, response_text):
         """Extract JSON from potential markdown code blocks or raw text"""
@@ -28,154 +130,274 @@ class LLMClient:
 
         return response_text
 
-    def summarize_news_entry(self, content, published_date):
-        if not content:
-            return None
+    def has_api_key(self):
+        return bool(self.perplexity_api_key or self.gemini_api_key)
 
-        # Only summarize if content is substantial
-        if len(content) <= 300:
-            print(f"    → Skipping LLM analysis (content too short: {len(content)} chars)")
-            return None
+    def can_analyze(self):
+        """True if items can be analyzed at all, by an LLM or the local extractor"""
+        return self.has_api_key() or self.local_min_confidence is not None
 
-        if self.perplexity_api_key:
-            return self.call_perplexity(content, published_date)
-        elif self.gemini_api_key:
-            return self.call_gemini(content, published_date)
-        else:
-            print("    ⚠ No LLM API key (Perplexity or Gemini) found, skipping LLM analysis")
+    def extract_locally(self, content, published_date):
+        """Return the local extractor's analysis if it is confident enough, else None"""
+        if self.local_min_confidence is None:
             return None
+        analysis, confidence = local_extractor.extract(content, published_date)
+        if confidence >= self.local_min_confidence:
+            print(f"    ✓ Handled locally without LLM (confidence {confidence:.2f})")
+            tracer.add("local_hits")
+            metrics.LLM_CALLS_AVOIDED.inc(source="local_extractor")
+            return analysis
+        return None
 
-    def call_perplexity(self, content, published_date):
-        url = "https://api.perplexity.ai/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {self.perplexity_api_key}",
-            "Content-Type": "application/json",
-        }
+    def should_summarize(self, content):
+        """Only summarize if content is substantial"""
+        return bool(content) and len(content) > 300
 
-        system_prompt = "You are a strict data extraction AI. You output ONLY JSON."
+    def normalize(self, content):
+        """Strip markup and boilerplate and enforce the token budget before prompting"""
+        text, tokens_before, tokens_after = normalize_for_llm(content, self.max_input_tokens)
+        if tokens_before:
+            print(
+                f"    → Normalized content: ~{tokens_before} → ~{tokens_after} tokens "
+                f"(saved ~{tokens_before - tokens_after})"
+            )
+        return text
 
-        user_prompt = f"""
+    def build_prompt(self, content, published_date):
+        return f"""
         The current news item was published on: {published_date}.
-        
-        Analyze the following school news text (which may be HTML) and extract specific information.
-        
-        1. Create a concise summary highlighting important information for a parent (in Swedish).
-        2. Highlight extra important sections of information, like school ends early. 
-        3. Extract any specific events that have a date and time.
-        
+        {ANALYSIS_INSTRUCTIONS}
         IMPORTANT: All dates mentioned in the text (like "on Friday" or "tomorrow") must be calculated relative to the publish date: {published_date}.
         If a year is not specified, assume it is the same year as the publish date, unless the date has already passed relative to the publish date, in which case it is the next year.
-        
+
         Return ONLY a valid JSON object with this structure. Do not include any markdown formatting or explanations outside the JSON.
         Do not include any preamble. Start directly with the JSON object.
-        {{
-            "summary": "The summary text...",
-            "highlights": [
-                "Ta med gosedjur den 11/12", 
-                "Skolan slutar 15.00 den 1/2"
-            ],
-            "events": [
-                {{
-                    "title": "Event Title",
-                    "start": "YYYY-MM-DDTHH:MM:SS",
-                    "end": "YYYY-MM-DDTHH:MM:SS", 
-                    "description": "Details about the event"
-                }}
-            ]
-        }}
-        Rules for events:
-        - If a date is mentioned without a year, assume the next occurrence of that date.
-        - If no specific time is mentioned for a date, assume 08:00:00 for start and 09:00:00 for end.
-        - Format dates strictly as ISO 8601 (YYYY-MM-DDTHH:MM:SS).
-        - If no events are found, "events" should be an empty list.
-        - Respond with only the JSON object, wrapped in three backticks (```json ... ```).
+        {ANALYSIS_SCHEMA}
+        {EVENT_RULES}
 
         Text to analyze:
         {content}
         """
 
-        payload = {
-            "model": "sonar-pro",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-        }
+    def build_batch_prompt(self, entries):
+        """Build one prompt covering several (item_id, content, published_date) entries"""
+        texts = ""
+        for item_id, content, published_date in entries:
+            texts += f"""
+        ### ITEM id={item_id} (published on: {published_date})
+        {content}
+        ### END ITEM id={item_id}
+        """
+
+        return f"""
+        You will receive {len(entries)} separate school news items, each with its own id and publish date.
+        For EACH item, independently:
+        {ANALYSIS_INSTRUCTIONS}
+        IMPORTANT: All dates mentioned in an item (like "on Friday" or "tomorrow") must be calculated relative to that item's own publish date.
+        If a year is not specified, assume it is the same year as the publish date, unless the date has already passed relative to the publish date, in which case it is the next year.
+
+        Return ONLY a valid JSON object of the form {{"items": [...]}} with exactly one entry per input item.
+        Each entry must contain the item's "id" exactly as given plus the fields of this structure:
+        {ANALYSIS_SCHEMA}
+        {EVENT_RULES}
+
+        Items to analyze:
+        {texts}
+        """
 
+    def parse_analysis(self, raw_content):
+        """Parse a JSON analysis out of raw model output"""
+        cleaned_content = self.clean_json_response(raw_content)
         try:
-            print("    → Calling Perplexity API for analysis...")
-            response = requests.post(url, json=payload, headers=headers, timeout=60)
+            return json.loads(cleaned_content)
+        except json.JSONDecodeError as e:
+            print(f"    ✗ JSON Decode Error: {e}")
+            print(f"    Raw content: {raw_content!r}")
+            print(f"    Cleaned content: {cleaned_content!r}")
+            return None
+
+    def complete_with(self, provider, user_prompt, max_retries=None):
+        if provider == "perplexity":
+            return self.complete_perplexity(user_prompt, max_retries)
+        return self.complete_gemini(user_prompt, max_retries)
+
+    def route(self, user_prompt, parse=None):
+        """
+        Send a prompt through the provider router (failover and optional hedging).
+        With `parse`, a response that fails to parse counts as a provider failure.
+        Providers with a healthy fallback get one attempt, so a 429 or timeout
+        fails over at once instead of waiting out the backoff.
+        """
+        if not self.has_api_key():
+            print("    ⚠ No LLM API key (Perplexity or Gemini) found, skipping LLM analysis")
+            return None
 
-            if response.status_code != 200:
-                print(f"    ✗ Perplexity API returned status {response.status_code}")
-                print(f"    Response body: {response.text[:500]}")
+        def call(provider, final):
+            raw = self.complete_with(provider, user_prompt, None if final else 1)
+            if raw is None or parse is None:
+                return raw
+            return parse(raw)
 
-            response.raise_for_status()
-            print("    ✓ Perplexity API response received")
+        return self.router.run(call)
 
-            response_json = response.json()
-            content = response_json["choices"][0]["message"]["content"]
-            cleaned_content = self.clean_json_response(content)
+    def complete(self, user_prompt):
+        """Send a prompt to the healthiest provider and return the raw text response"""
+        return self.route(user_prompt)
 
-            try:
-                return json.loads(cleaned_content)
-            except json.JSONDecodeError as e:
-                print(f"    ✗ JSON Decode Error: {e}")
-                print(f"    Raw content: {content!r}")
-                print(f"    Cleaned content: {cleaned_content!r}")
-                return None
+    def summarize_news_entry(self, content, published_date):
+        if not content:
+            return None
+
+        content = self.normalize(content)
+
+        # Only summarize if content is substantial
+        if not self.should_summarize(content):
+            print(f"    → Skipping LLM analysis (content too short: {len(content)} chars)")
+            return None
+
+        local = self.extract_locally(content, published_date)
+        if local:
+            return local
+
+        return self.summarize_with_llm(content, published_date)
+
+    def summarize_with_llm(self, content, published_date):
+        """Summarize already-normalized content with a single LLM request"""
+        return self.route(self.build_prompt(content, published_date), parse=self.parse_analysis)
+
+    def summarize_news_batch(self, entries):
+        """
+        Summarize several (item_id, content, published_date) entries with as few
+        requests as possible. Returns a dict of item_id -> analysis (or None).
+        Items missing from a batch response fall back to single calls.
+        """
+        results = {}
+        pending = []
+        for item_id, content, published_date in entries:
+            content = self.normalize(content)
+            if not self.should_summarize(content):
+                results[item_id] = None
+                continue
+
+            local = self.extract_locally(content, published_date)
+            if local:
+                results[item_id] = local
+            else:
+                pending.append((item_id, content, published_date))
+
+        if not pending:
+            return results
+
+        if not self.has_api_key():
+            print("    ⚠ No LLM API key (Perplexity or Gemini) found, skipping LLM analysis")
+            results.update({item_id: None for item_id, _, _ in pending})
+            return results
+
+        # Batches run concurrently on the executor, bounded by the rate limiters
+        futures = [
+            self.executor.submit(self._run_batch, batch)
+            for batch in self._split_batches(pending)
+        ]
+        for future in futures:
+            results.update(future.result())
+
+        return results
+
+    def submit_news_batch(self, entries):
+        """Start summarize_news_batch in the background so callers can keep fetching"""
+        return self.coordinator.submit(self.summarize_news_batch, entries)
+
+    def _run_batch(self, batch):
+        results = {}
+        if len(batch) == 1:
+            item_id, content, published_date = batch[0]
+            results[item_id] = self.summarize_with_llm(content, published_date)
+            return results
+
+        print(f"    → Summarizing batch of {len(batch)} items in one request...")
+        parsed = self._summarize_batch(batch)
+        for item_id, content, published_date in batch:
+            if str(item_id) in parsed:
+                results[item_id] = parsed[str(item_id)]
+            else:
+                print(f"    ⚠ Item {item_id} missing from batch response, summarizing individually")
+                results[item_id] = self.summarize_with_llm(content, published_date)
+        return results
+
+    def _split_batches(self, entries):
+        batch, batch_chars = [], 0
+        for entry in entries:
+            entry_chars = len(entry[1])
+            if batch and (len(batch) >= self.batch_size or batch_chars + entry_chars > self.batch_max_chars):
+                yield batch
+                batch, batch_chars = [], 0
+            batch.append(entry)
+            batch_chars += entry_chars
+        if batch:
+            yield batch
+
+    def _summarize_batch(self, batch):
+        """Run one batched request; returns a dict of str(item_id) -> analysis"""
+        data = self.route(self.build_batch_prompt(batch), parse=self.parse_analysis)
+        items = data.get("items") if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            print("    ✗ Batch response did not contain an item list")
+            return {}
+
+        expected = {str(item_id) for item_id, _, _ in batch}
+        parsed = {}
+        for item in items:
+            if not isinstance(item, dict) or str(item.get("id")) not in expected:
+                continue
+            parsed[str(item.pop("id"))] = item
+        return parsed
+
+    def call_perplexity(self, content, published_date):
+        raw = self.complete_perplexity(self.build_prompt(content, published_date))
+        if raw is None:
+            return None
+        return self.parse_analysis(raw)
+
+    def complete_perplexity(self, user_prompt, max_retries=None):
+        url = f"{self.perplexity_base_url}/chat/completions"
+        headers = {
+            "Authorization": f"Bearer {self.perplexity_api_key}",
+            "Content-Type": "application/json",
+        }
+
+        payload = {
+            "model": "sonar-pro",
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt},
+            ],
+        }
 
-        except requests.exceptions.RequestException as e:
-            print(f"    ✗ HTTP Error calling Perplexity API: {e}")
+        response_json = self.post_with_retry(
+            "perplexity", "Perplexity", url, payload, headers, self.estimate_tokens(user_prompt), max_retries
+        )
+        if response_json is None:
             return None
-        except Exception as e:
-            print(f"    ✗ Unexpected error calling Perplexity API: {e}")
+        try:
+            return response_json["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError) as e:
+            print(f"    ✗ Unexpected response shape from Perplexity API: {e}")
             return None
 
     def call_gemini(self, content, published_date):
+        raw = self.complete_gemini(self.build_prompt(content, published_date))
+        if raw is None:
+            return None
+        return self.parse_analysis(raw)
+
+    def complete_gemini(self, user_prompt, max_retries=None):
         # Gemini 3.1 Flash Lite Preview endpoint
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-3.1-flash-lite-preview:generateContent?key={self.gemini_api_key}"
+        url = f"{self.gemini_base_url}/v1beta/models/gemini-3.1-flash-lite-preview:generateContent?key={self.gemini_api_key}"
         headers = {"Content-Type": "application/json"}
 
         prompt = f"""
-        You are a strict data extraction AI. You output ONLY JSON.
-        The current news item was published on: {published_date}.
-        
-        Analyze the following school news text (which may be HTML) and extract specific information.
-        
-        1. Create a concise summary highlighting important information for a parent (in Swedish).
-        2. Highlight extra important sections of information, like school ends early. 
-        3. Extract any specific events that have a date and time.
-        
-        IMPORTANT: All dates mentioned in the text (like "on Friday" or "tomorrow") must be calculated relative to the publish date: {published_date}.
-        If a year is not specified, assume it is the same year as the publish date, unless the date has already passed relative to the publish date, in which case it is the next year.
-        
-        Return ONLY a valid JSON object with this structure. Do not include any markdown formatting or explanations outside the JSON.
-        Do not include any preamble. Start directly with the JSON object.
-        {{
-            "summary": "The summary text...",
-            "highlights": [
-                "Ta med gosedjur den 11/12", 
-                "Skolan slutar 15.00 den 1/2"
-            ],
-            "events": [
-                {{
-                    "title": "Event Title",
-                    "start": "YYYY-MM-DDTHH:MM:SS",
-                    "end": "YYYY-MM-DDTHH:MM:SS", 
-                    "description": "Details about the event"
-                }}
-            ]
-        }}
-        Rules for events:
-        - If a date is mentioned without a year, assume the next occurrence of that date.
-        - If no specific time is mentioned for a date, assume 08:00:00 for start and 09:00:00 for end.
-        - Format dates strictly as ISO 8601 (YYYY-MM-DDTHH:MM:SS).
-        - If no events are found, "events" should be an empty list.
-        - Respond with only the JSON object, wrapped in three backticks (```json ... ```).
-
-        Text to analyze:
-        {content}
+        {SYSTEM_PROMPT}
+        {user_prompt}
         """
 
         payload = {
@@ -184,57 +406,103 @@ class LLMClient:
                 "temperature": 0.1,
                 "topK": 1,
                 "topP": 1,
-                "maxOutputTokens": 2048,
+                "maxOutputTokens": 8192,
                 "response_mime_type": "application/json",
             },
         }
 
-        max_retries = 5
-        retry_delay = 10
+        response_json = self.post_with_retry(
+            "gemini", "Gemini", url, payload, headers, self.estimate_tokens(prompt), max_retries
+        )
+        if response_json is None:
+            return None
+        try:
+            # Extract text from Gemini response structure: candidates[0].content.parts[0].text
+            return response_json["candidates"][0]["content"]["parts"][0]["text"]
+        except (KeyError, IndexError, TypeError) as e:
+            print(f"    ✗ Unexpected response shape from Gemini API: {e}")
+            return None
+
+    def estimate_tokens(self, text):
+        """Rough token estimate for the token buckets"""
+        return estimate_tokens(text)
+
+    def post_with_retry(self, provider, label, url, payload, headers, estimated_tokens, max_retries=None):
+        """
+        POST to a provider honoring its request/token buckets, retrying retryable
+        failures with jittered exponential backoff (or the server's Retry-After),
+        up to `max_retries` attempts (default: the client's). Returns the decoded
+        JSON body or None.
+        """
+        with tracer.span("llm.call", provider=provider, estimated_tokens=estimated_tokens) as span:
+            response_json = self._post_with_retry(
+                provider, label, url, payload, headers, estimated_tokens, max_retries or self.max_retries
+            )
+            if response_json is None:
+                span.fail()
+            else:
+                usage = response_json.get("usage") or response_json.get("usageMetadata") or {}
+                total = usage.get("total_tokens") or usage.get("totalTokenCount")
+                if total:
+                    span.add("tokens", total)
+            return response_json
+
+    def _post_with_retry(self, provider, label, url, payload, headers, estimated_tokens, max_retries):
+        if self.fixtures and self.fixtures.mode == "replay":
+            response_json = self.fixtures.load(provider, payload)
+            if response_json is None:
+                print(f"    ✗ No recorded {label} fixture for this request")
+            else:
+                print(f"    ✓ {label} API response replayed from fixture")
+                tracer.add("fixture_hits")
+            return response_json
+
+        request_bucket, token_bucket = self.limiters[provider]
 
         for attempt in range(max_retries):
+            request_bucket.acquire()
+            token_bucket.acquire(estimated_tokens)
+
+            retry_after = None
             try:
                 if attempt > 0:
-                    print(f"    → Retrying Gemini API call (Attempt {attempt + 1}/{max_retries})...")
+                    print(f"    → Retrying {label} API call (Attempt {attempt + 1}/{max_retries})...")
                 else:
-                    print("    → Calling Gemini API for analysis...")
-                    
+                    print(f"    → Calling {label} API for analysis...")
+
                 response = requests.post(url, json=payload, headers=headers, timeout=60)
+                tracer.add("requests")
+                tracer.add(f"http_{response.status_code}")
+                tracer.add("bytes", len(response.content))
 
                 if response.status_code != 200:
-                    print(f"    ✗ Gemini API returned status {response.status_code}")
+                    print(f"    ✗ {label} API returned status {response.status_code}")
                     print(f"    Response body: {response.text[:500]}")
-                    
-                    if response.status_code in (503, 429, 500, 502, 504) and attempt < max_retries - 1:
-                        print(f"    ⚠ Service Unavailable or Rate Limited. Retrying in {retry_delay} seconds...")
-                        time.sleep(retry_delay)
+
+                    if response.status_code in RETRYABLE_STATUS_CODES and attempt < max_retries - 1:
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        delay = backoff_delay(attempt, retry_after=retry_after)
+                        print(f"    ⚠ Service Unavailable or Rate Limited. Retrying in {delay:.1f} seconds...")
+                        time.sleep(delay)
                         continue
 
                 response.raise_for_status()
-                print("    ✓ Gemini API response received")
-
+                print(f"    ✓ {label} API response received")
                 response_json = response.json()
-                # Extract text from Gemini response structure: candidates[0].content.parts[0].text
-                extracted_content = response_json["candidates"][0]["content"]["parts"][0]["text"]
-                cleaned_content = self.clean_json_response(extracted_content)
-
-                try:
-                    return json.loads(cleaned_content)
-                except json.JSONDecodeError as e:
-                    print(f"    ✗ JSON Decode Error: {e}")
-                    print(f"    Raw content: {extracted_content!r}")
-                    print(f"    Cleaned content: {cleaned_content!r}")
-                    return None
+                if self.fixtures:
+                    self.fixtures.save(provider, payload, response_json)
+                return response_json
 
             except requests.exceptions.RequestException as e:
-                print(f"    ✗ HTTP Error calling Gemini API: {e}")
+                print(f"    ✗ HTTP Error calling {label} API: {e}")
                 if attempt < max_retries - 1:
-                    print(f"    ⚠ Network error. Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
+                    delay = backoff_delay(attempt)
+                    print(f"    ⚠ Network error. Retrying in {delay:.1f} seconds...")
+                    time.sleep(delay)
                     continue
                 return None
             except Exception as e:
-                print(f"    ✗ Unexpected error calling Gemini API: {e}")
+                print(f"    ✗ Unexpected error calling {label} API: {e}")
                 return None
-                
+
         return None
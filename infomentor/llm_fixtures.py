@@ -0,0 +1,51 @@
+import hashlib
+import json
+from pathlib import Path
+
+
+class LLMFixtures:
+    """
+    Record/replay store for provider responses, keyed by a hash of the
+    provider and request payload. API keys are never part of the key or file.
+    mode is "record" (call the provider and save responses) or "replay"
+    (answer from fixtures only, no network).
+    """
+
+    def __init__(self, directory, mode):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown LLM fixture mode: {mode}")
+        self.directory = Path(directory)
+        self.mode = mode
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, provider, payload):
+        digest = hashlib.sha256(
+            json.dumps({"provider": provider, "payload": payload}, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        return self.directory / f"{provider}_{digest[:16]}.json"
+
+    def load(self, provider, payload):
+        """Return the recorded response JSON for this request, or None"""
+        path = self.path_for(provider, payload)
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f).get("response")
+        except Exception as e:
+            print(f"    ✗ ERROR: Failed to load LLM fixture {path.name}: {e}")
+            return None
+
+    def save(self, provider, payload, response_json):
+        path = self.path_for(provider, payload)
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"provider": provider, "request": payload, "response": response_json},
+                    f,
+                    ensure_ascii=False,
+                    indent=2,
+                )
+            print(f"    → Recorded LLM fixture {path.name}")
+        except Exception as e:
+            print(f"    ✗ ERROR: Failed to record LLM fixture {path.name}: {e}")
@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class ProviderStats:
+    """Rolling latency and error statistics for one LLM provider"""
+
+    def __init__(self, name, window=50):
+        self.name = name
+        self.samples = deque(maxlen=window)  # (latency_seconds, ok)
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, latency, ok, failure_threshold=3, cooldown=60):
+        with self.lock:
+            self.samples.append((latency, ok))
+            if ok:
+                self.consecutive_failures = 0
+            else:
+                self.consecutive_failures += 1
+                # Take a repeatedly failing provider out of rotation for a while
+                if self.consecutive_failures >= failure_threshold:
+                    self.down_until = time.monotonic() + cooldown
+
+    def error_rate(self):
+        with self.lock:
+            if not self.samples:
+                return 0.0
+            return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def latency_percentile(self, percentile=95, min_samples=5):
+        """Latency percentile over successful calls, or None with too few samples"""
+        with self.lock:
+            latencies = sorted(latency for latency, ok in self.samples if ok)
+        if len(latencies) < min_samples:
+            return None
+        index = min(len(latencies) - 1, int(len(latencies) * percentile / 100))
+        return latencies[index]
+
+    def is_down(self):
+        return time.monotonic() < self.down_until
+
+
+class ProviderRouter:
+    """
+    Orders LLM providers by health and runs a call with automatic failover.
+    Only the last healthy provider in the order gets the caller's full retry
+    budget; those before it are tried once and failed over on the first
+    error. With hedging enabled, the next provider is started as well when the primary
+    has not answered within its p95 latency, and the first useful result wins.
+    """
+
+    def __init__(self, providers, hedge=False, max_error_rate=0.5, hedge_min_delay=2.0):
+        self.providers = list(providers)
+        self.stats = {name: ProviderStats(name) for name in self.providers}
+        self.hedge = hedge
+        self.max_error_rate = max_error_rate
+        self.hedge_min_delay = hedge_min_delay
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="llm-hedge")
+
+    def ordered_providers(self):
+        """Configured order, with down or error-prone providers moved to the back"""
+
+        def penalty(name):
+            stats = self.stats[name]
+            if stats.is_down():
+                return 2
+            if stats.error_rate() > self.max_error_rate:
+                return 1
+            return 0
+
+        return sorted(self.providers, key=penalty)
+
+    def _timed(self, name, call, final):
+        start = time.monotonic()
+        try:
+            result = call(name, final)
+        except Exception as e:
+            print(f"    ✗ {name} call failed: {e}")
+            result = None
+        self.stats[name].record(time.monotonic() - start, result is not None)
+        return result
+
+    def finals(self, providers):
+        """
+        Whether each provider should retry (True) or fail over on its first error:
+        retrying only pays off when no healthy provider is left to take over
+        """
+        healthy_after = 0
+        finals = []
+        for name in reversed(providers):
+            finals.append(healthy_after == 0)
+            if not self.stats[name].is_down():
+                healthy_after += 1
+        return dict(zip(reversed(providers), finals))
+
+    def run(self, call):
+        """
+        Run call(provider_name, final) -> result or None, failing over between
+        providers; `final` is False while a healthy provider remains to fail over to
+        """
+        providers = self.ordered_providers()
+        if not providers:
+            return None
+        finals = self.finals(providers)
+
+        if not self.hedge or len(providers) < 2:
+            for i, name in enumerate(providers):
+                if i > 0:
+                    print(f"    ⚠ Failing over to {name}")
+                result = self._timed(name, call, finals[name])
+                if result is not None:
+                    return result
+            return None
+
+        return self._run_hedged(providers, call, finals)
+
+    def _run_hedged(self, providers, call, finals):
+        primary, remaining = providers[0], providers[1:]
+        pending = {self.executor.submit(self._timed, primary, call, finals[primary])}
+
+        p95 = self.stats[primary].latency_percentile()
+        hedge_after = max(self.hedge_min_delay, p95) if p95 is not None else None
+
+        while pending or remaining:
+            # Wait for the primary's p95 before hedging; without enough samples
+            # to know its p95, only fail over once the current call has failed
+            timeout = hedge_after if remaining else None
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                result = future.result()
+                if result is not None:
+                    return result
+
+            if remaining and (not done or not pending):
+                name = remaining.pop(0)
+                reason = "failed" if done else f"slower than p95 ({hedge_after:.1f}s)"
+                print(f"    ⚠ Primary LLM provider {reason}, also trying {name}")
+                pending.add(self.executor.submit(self._timed, name, call, finals[name]))
+
+        return None
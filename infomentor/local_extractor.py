@@ -0,0 +1,280 @@
+import re
+from datetime import date, datetime, timedelta
+
+WEEKDAYS = {
+    "måndag": 0,
+    "tisdag": 1,
+    "onsdag": 2,
+    "torsdag": 3,
+    "fredag": 4,
+    "lördag": 5,
+    "söndag": 6,
+}
+
+MONTHS = {
+    "januari": 1, "jan": 1,
+    "februari": 2, "feb": 2,
+    "mars": 3, "mar": 3,
+    "april": 4, "apr": 4,
+    "maj": 5,
+    "juni": 6, "jun": 6,
+    "juli": 7, "jul": 7,
+    "augusti": 8, "aug": 8,
+    "september": 9, "sept": 9, "sep": 9,
+    "oktober": 10, "okt": 10,
+    "november": 11, "nov": 11,
+    "december": 12, "dec": 12,
+}
+
+_WEEKDAY = r"(?P<weekday>måndag|tisdag|onsdag|torsdag|fredag|lördag|söndag)(?:en|s)?"
+_MONTH = "|".join(sorted(MONTHS, key=len, reverse=True))
+
+# "fredag den 18/10", "18/10-24", "fredag 18 oktober", "den 3:e nov", "2024-10-18", "fredag v. 42", "på fredag"
+_DATE_RE = re.compile(
+    rf"(?:{_WEEKDAY}\s*)?(?P<den>den\s+)?"
+    rf"(?:(?P<iso>\d{{4}}-\d{{2}}-\d{{2}})"
+    rf"|(?P<day>\d{{1,2}})/(?P<month>\d{{1,2}})(?:[-/](?P<year>\d{{2,4}}))?"
+    rf"|(?P<tday>\d{{1,2}})(?::?e)?\s+(?P<tmonth>{_MONTH})\.?(?:\s+(?P<tyear>\d{{4}}))?"
+    rf"|\b(?:v\.?|vecka|veckan)\s*(?P<week>\d{{1,2}})\b)"
+    rf"|{_WEEKDAY.replace('weekday', 'lone_weekday')}",
+    re.IGNORECASE,
+)
+# "8:30-15:00", "kl. 08.30–12", "kl 9"
+_TIME_RANGE_RE = re.compile(
+    r"(?:kl\.?\s*)?(?P<h1>\d{1,2})[:.](?P<m1>\d{2})\s*(?:-|–|till)\s*(?P<h2>\d{1,2})(?:[:.](?P<m2>\d{2}))?"
+)
+_TIME_RE = re.compile(r"(?:kl\.?\s*(?P<kh>\d{1,2})(?:[:.](?P<km>\d{2}))?|\b(?P<h>\d{1,2})[:.](?P<m>\d{2})\b)", re.IGNORECASE)
+# Sentence ends, but not after abbreviations like "v. 42" or "kl. 8"
+_SENTENCE_RE = re.compile(r"(?<=[.!?])(?<!\b[vV]\.)(?<!\b[kK]l\.)(?<!\bca\.)(?<!\bex\.)\s+|\n+")
+
+# Clause boundaries inside a sentence, for event titles
+_CLAUSE_RE = re.compile(r"\s*[,;:]\s+|\s+(?:–|-)\s+|\s+(?:men|då|eftersom)\s+", re.IGNORECASE)
+# Prepositions left dangling in front of a removed date or time
+_DANGLING_RE = re.compile(r"\b(?:på|den|kl\.?|från|till|under|om|i|nu)\s*(?=[,.:!?]|$)|^\s*(?:på|den|från|under|nu)\s+", re.IGNORECASE)
+# Inverted or plain "har vi"/"vi har" openings, so "På fredag har vi studiedag" becomes "Studiedag"
+_OPENING_RE = re.compile(
+    r"^(?:(?:har|är|blir|hålls|kommer)\s+(?:vi|ni|det|alla\s+elever|eleverna)|(?:vi|ni|det|eleverna)\s+(?:har|är|blir|kommer\s+att\s+ha))\s+",
+    re.IGNORECASE,
+)
+
+# Relative expressions the extractor does not resolve; their presence means
+# the LLM has to interpret the text
+_UNRESOLVED_RE = re.compile(
+    r"\b(imorgon|i\s+morgon|i\s+övermorgon|nästa\s+vecka|om\s+\w+\s+veckor|efter\s+lovet|i\s+helgen)\b",
+    re.IGNORECASE,
+)
+
+# Above this length a post is treated as a newsletter and left to the LLM
+MAX_SIMPLE_CHARS = 800
+MAX_SIMPLE_EVENTS = 3
+# Greetings and sign-offs shorter than this do not count against coverage
+MIN_CONTENT_CHARS = 25
+
+
+def parse_published_date(published_date):
+    """Best-effort parse of the hub's publish date, falling back to today"""
+    if isinstance(published_date, str):
+        try:
+            return datetime.fromisoformat(published_date[:10]).date()
+        except ValueError:
+            match = _DATE_RE.search(published_date)
+            if match and match.group("tday"):
+                resolved = _resolve_date(match, date.today())
+                if resolved:
+                    return resolved
+    return date.today()
+
+
+def _next_year_if_passed(candidate, published):
+    """Same year as the publish date unless that date has already passed"""
+    if candidate < published:
+        return candidate.replace(year=candidate.year + 1)
+    return candidate
+
+
+def _resolve_date(match, published, weekday_hint=None):
+    try:
+        if match.group("iso"):
+            return date.fromisoformat(match.group("iso"))
+
+        if match.group("day"):
+            year = match.group("year")
+            day, month = int(match.group("day")), int(match.group("month"))
+            if year:
+                return date(int(year) + (2000 if len(year) == 2 else 0), month, day)
+            return _next_year_if_passed(date(published.year, month, day), published)
+
+        if match.group("tday"):
+            month = MONTHS[match.group("tmonth").lower()]
+            day = int(match.group("tday"))
+            if match.group("tyear"):
+                return date(int(match.group("tyear")), month, day)
+            return _next_year_if_passed(date(published.year, month, day), published)
+
+        if match.group("week"):
+            week = int(match.group("week"))
+            year = published.year
+            if week < published.isocalendar()[1]:
+                year += 1
+            weekday = WEEKDAYS.get((match.group("weekday") or weekday_hint or "måndag").lower(), 0)
+            return date.fromisocalendar(year, week, weekday + 1)
+
+        if match.group("lone_weekday"):
+            weekday = WEEKDAYS[match.group("lone_weekday").lower()]
+            return published + timedelta(days=(weekday - published.weekday()) % 7)
+    except (ValueError, KeyError):
+        return None
+    return None
+
+
+def _is_date(match, sentence):
+    """
+    Numeric d/m only counts as a date next to date context (a weekday, "den",
+    a year or a time), so "3/4 av eleverna" is not read as 3 April
+    """
+    if not match.group("day"):
+        return True
+    if match.group("weekday") or match.group("den") or match.group("year"):
+        return True
+    return bool(re.match(r"\s*(?:kl\b|\d{1,2}[:.]\d{2})", sentence[match.end():], re.IGNORECASE))
+
+
+def _find_times(sentence):
+    """Return (start, end) as (hour, minute) tuples, either may be None"""
+    match = _TIME_RANGE_RE.search(sentence)
+    if match:
+        start = (int(match.group("h1")), int(match.group("m1")))
+        end = (int(match.group("h2")), int(match.group("m2") or 0))
+        return start, end
+
+    match = _TIME_RE.search(sentence)
+    if match:
+        hour = match.group("kh") or match.group("h")
+        minute = match.group("km") or match.group("m") or 0
+        return (int(hour), int(minute)), None
+    return None, None
+
+
+def _event_title(sentence, match):
+    """Title from the clause holding the date, with the date and time phrases removed"""
+    start = 0
+    clause = sentence
+    for part in _CLAUSE_RE.split(sentence):
+        start = sentence.find(part, start)
+        if start <= match.start() < start + len(part):
+            clause = part
+            break
+        start += len(part)
+
+    title = _TIME_RANGE_RE.sub("", clause)
+    title = _TIME_RE.sub("", title)
+    title = _DATE_RE.sub("", title)
+    title = re.sub(r"\s{2,}", " ", title).strip()
+    # Repeat: removing "den" can leave "på" dangling in front of it
+    for _ in range(2):
+        title = _DANGLING_RE.sub("", title).strip()
+    title = _OPENING_RE.sub("", title)
+    title = re.sub(r"\s+([,.:!?])", r"\1", title).strip(" ,.:;-–!")
+    if len(title) > 80:
+        title = title[:78].rsplit(" ", 1)[0] + "..."
+    return title[:1].upper() + title[1:]
+
+
+def extract(text, published_date):
+    """
+    Rule-based extraction of Swedish dates, times, weekdays and week numbers.
+    Returns (analysis, confidence) where analysis has the same
+    {summary, highlights, events} shape as the LLM output.
+    """
+    published = parse_published_date(published_date)
+    sentences = [s.strip() for s in _SENTENCE_RE.split(text) if s and s.strip()]
+
+    events = []
+    highlights = []
+    unresolved = 0
+    for sentence in sentences:
+        matches = [m for m in _DATE_RE.finditer(sentence) if _is_date(m, sentence)]
+        if not matches:
+            continue
+
+        # "v. 42 på tisdag": the weekday picks the day within the week
+        weekday_hint = None
+        if any(m.group("week") for m in matches):
+            lone = [m for m in matches if m.group("lone_weekday")]
+            if lone:
+                weekday_hint = lone[0].group("lone_weekday")
+                matches = [m for m in matches if not m.group("lone_weekday")]
+
+        for match in matches:
+            day = _resolve_date(match, published, weekday_hint)
+            if day is None:
+                unresolved += 1
+                continue
+
+            start, end = _find_times(sentence)
+            # Same defaults as the LLM prompt: 08-09 without a time
+            start = start or (8, 0)
+            if end is None:
+                end = ((start[0] + 1) % 24, start[1])
+            try:
+                start_dt = datetime.combine(day, datetime.min.time()).replace(hour=start[0], minute=start[1])
+                end_dt = datetime.combine(day, datetime.min.time()).replace(hour=end[0], minute=end[1])
+            except ValueError:
+                unresolved += 1
+                continue
+
+            if not highlights or highlights[-1] != sentence:
+                highlights.append(sentence)
+            events.append(
+                {
+                    "title": _event_title(sentence, match) or "Händelse",
+                    "start": start_dt.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "end": end_dt.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "description": sentence,
+                }
+            )
+
+    # Lead with what happens when rather than the greeting
+    summary = " ".join(highlights[:2] or sentences[:2])
+    if len(summary) > 300:
+        summary = summary[:297] + "..."
+
+    analysis = {"summary": summary, "highlights": highlights[:5], "events": events}
+    return analysis, score(text, events, unresolved, highlights)
+
+
+def score(text, events, unresolved, event_sentences=()):
+    """
+    Confidence (0-1) that the local result is as good as an LLM summary: the
+    share of the text covered by sentences that produced an event, lowered
+    for paragraphs without any event and for other signs of a newsletter
+    """
+    if not events:
+        # Nothing date-bound to extract, a summary is all the LLM would add
+        return 0.0
+
+    event_sentences = set(event_sentences)
+    covered = total = 0
+    for sentence in _SENTENCE_RE.split(text):
+        sentence = (sentence or "").strip()
+        if sentence in event_sentences:
+            covered += len(sentence)
+            total += len(sentence)
+        elif len(sentence) >= MIN_CONTENT_CHARS:
+            total += len(sentence)
+    confidence = covered / total if total else 0.0
+
+    for paragraph in re.split(r"\n\s*\n", text):
+        if len(paragraph.strip()) >= MIN_CONTENT_CHARS and not any(s in paragraph for s in event_sentences):
+            confidence -= 0.15
+
+    if len(text) > MAX_SIMPLE_CHARS:
+        confidence -= 0.5 + min(0.5, (len(text) - MAX_SIMPLE_CHARS) / 2000)
+    if len(events) > MAX_SIMPLE_EVENTS:
+        confidence -= 0.3
+    if text.count("\n\n") > 3:
+        confidence -= 0.2
+    if _UNRESOLVED_RE.search(text):
+        confidence -= 0.4
+    confidence -= 0.2 * unresolved
+    return max(0.0, min(1.0, confidence))
@@ -0,0 +1,324 @@
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+_ID_SEGMENT_RE = re.compile(r"/\d+(?=/|$)")
+
+# Hub and API endpoints that get their own request label (numeric IDs collapsed);
+# SSO hops, attachment downloads and anything else are counted as "other"
+KNOWN_ENDPOINTS = {
+    path.lower(): path
+    for path in (
+        "/",
+        "/Account/PupilSwitcher/SwitchPupil",
+        "/Account/PupilSwitcher/SwitchPupil/:id",
+        "/Attendance/attendance/GetAttendanceList",
+        "/Authentication/Authentication/LoginOAuth2",
+        "/Authentication/OAuth2/Token",
+        "/NA1/Authentication/sso",
+        "/Communication/News/GetNewsItem",
+        "/Communication/News/GetNewsList",
+        "/Message/Message/GetMessage",
+        "/Message/Message/GetMessages",
+        "/NotificationApp/NotificationApp/appData",
+        "/calendarv2/calendarv2/getentries",
+    )
+}
+# Hosts (netloc) of the hub and API; empty until the runner registers them
+hub_hosts = set()
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            lines.extend(self.render_value(key, value))
+        return lines
+
+    def render_value(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            state = self.values.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def render_value(self, key, state):
+        lines = []
+        for bound, count in zip(self.buckets, state["counts"]):
+            labels = _format_labels(self.label_names, key, [("le", bound)])
+            lines.append(f"{self.name}_bucket{labels} {count}")
+        labels = _format_labels(self.label_names, key, [("le", "+Inf")])
+        lines.append(f"{self.name}_bucket{labels} {state['count']}")
+        plain = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{plain} {state['sum']:.6f}")
+        lines.append(f"{self.name}_count{plain} {state['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+        self.last_success = None
+        self.last_cycle = None
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter(
+    "infomentor_http_requests_total", "Requests to InfoMentor by endpoint and status", ("endpoint", "status")
+)
+HTTP_LATENCY = registry.histogram(
+    "infomentor_http_request_seconds", "InfoMentor request latency by endpoint", ("endpoint",)
+)
+CYCLES = registry.counter("infomentor_cycles_total", "Fetch cycles by outcome", ("outcome",))
+CYCLE_DURATION = registry.histogram("infomentor_cycle_seconds", "Fetch cycle duration")
+LAST_SUCCESS = registry.gauge("infomentor_last_success_timestamp_seconds", "Unix time of the last successful cycle")
+SSO = registry.counter("infomentor_sso_total", "SSO handshakes by outcome", ("outcome",))
+SSO_DURATION = registry.histogram("infomentor_sso_seconds", "SSO handshake duration")
+CHROME_LAUNCHES = registry.counter("infomentor_chrome_launches_total", "Selenium Chrome sessions by outcome", ("outcome",))
+LLM_CALLS = registry.counter("infomentor_llm_calls_total", "LLM provider calls by outcome", ("provider", "outcome"))
+LLM_LATENCY = registry.histogram("infomentor_llm_call_seconds", "LLM provider call latency incl. retries", ("provider",))
+LLM_TOKENS = registry.counter("infomentor_llm_tokens_total", "Tokens reported by LLM providers", ("provider",))
+LLM_CALLS_AVOIDED = registry.counter(
+    "infomentor_llm_calls_avoided_total", "Analyses produced without a provider call, by source", ("source",)
+)
+NOTIFICATIONS = registry.counter(
+    "infomentor_notifications_total", "Notifier sends by channel, kind and outcome", ("channel", "kind", "outcome")
+)
+STORAGE_FILES = registry.gauge("infomentor_storage_files", "Files in the storage directories", ("directory",))
+STORAGE_BYTES = registry.gauge("infomentor_storage_bytes", "Bytes in the storage directories", ("directory",))
+
+
+def track_hosts(*urls):
+    """Register the hub/API base URLs whose known endpoints are labelled individually"""
+    for url in urls:
+        if url:
+            hub_hosts.add(urlparse(url).netloc.lower())
+
+
+def endpoint_label(url):
+    """
+    A known hub endpoint with numeric IDs collapsed, else "other", so that
+    external hosts and one-off paths cannot grow the label set
+    """
+    parsed = urlparse(url)
+    if hub_hosts and parsed.netloc.lower() not in hub_hosts:
+        return "other"
+    path = _ID_SEGMENT_RE.sub("/:id", parsed.path.rstrip("/")) or "/"
+    return KNOWN_ENDPOINTS.get(path.lower(), "other")
+
+
+def response_hook(response, *args, **kwargs):
+    """requests response hook counting hub requests per endpoint and status"""
+    endpoint = endpoint_label(response.url)
+    HTTP_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    HTTP_LATENCY.observe(response.elapsed.total_seconds(), endpoint=endpoint)
+    return response
+
+
+def observe_span(span):
+    """Tracer listener turning finished spans into metrics"""
+    duration = span.duration or 0
+    if span.name == "cycle":
+        CYCLES.inc(outcome=span.outcome)
+        CYCLE_DURATION.observe(duration)
+        registry.last_cycle = time.time()
+        if span.outcome == "ok":
+            registry.last_success = time.time()
+            LAST_SUCCESS.set(registry.last_success)
+    elif span.name == "auth.sso":
+        SSO.inc(outcome=span.outcome)
+        SSO_DURATION.observe(duration)
+    elif span.name == "auth.selenium":
+        CHROME_LAUNCHES.inc(outcome=span.outcome)
+    elif span.name == "llm.call":
+        provider = span.attrs.get("provider", "")
+        LLM_CALLS.inc(provider=provider, outcome=span.outcome)
+        LLM_LATENCY.observe(duration, provider=provider)
+        if span.counters.get("tokens"):
+            LLM_TOKENS.inc(span.counters["tokens"], provider=provider)
+        if span.counters.get("fixture_hits"):
+            LLM_CALLS_AVOIDED.inc(span.counters["fixture_hits"], source="fixture")
+    elif span.name.startswith("notify."):
+        NOTIFICATIONS.inc(channel=span.name.split(".", 1)[1], kind=span.attrs.get("kind", ""), outcome=span.outcome)
+
+
+def update_storage(directories):
+    """Refresh file count and size gauges for {label: path}"""
+    for label, path in directories.items():
+        files = 0
+        size = 0
+        for root, _, names in os.walk(path):
+            for name in names:
+                try:
+                    size += os.stat(os.path.join(root, name)).st_size
+                    files += 1
+                except OSError:
+                    pass
+        STORAGE_FILES.set(files, directory=label)
+        STORAGE_BYTES.set(size, directory=label)
+
+
+class MetricsServer:
+    """
+    Background HTTP server exposing `/metrics` in the Prometheus text format
+    and `/healthz`, which is 200 while the last successful cycle is younger
+    than `max_age` seconds and 503 otherwise. The storage gauges for
+    `storage` ({label: path}) are only recomputed on a scrape, at most once
+    per `storage_ttl` seconds, since walking the directories is not free.
+    """
+
+    def __init__(self, host="0.0.0.0", port=9108, max_age=None, registry=registry, storage=None, storage_ttl=300):
+        self.registry = registry
+        self.max_age = max_age
+        self.storage = storage or {}
+        self.storage_ttl = storage_ttl
+        self.storage_updated = None
+        self.storage_lock = threading.Lock()
+        self.started_at = time.time()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        host, port = self.server.server_address[:2]
+        print(f"✓ Metrics available on http://{host}:{port}/metrics")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def refresh_storage(self):
+        if not self.storage:
+            return
+        with self.storage_lock:
+            now = time.monotonic()
+            if self.storage_updated is not None and now - self.storage_updated < self.storage_ttl:
+                return
+            update_storage(self.storage)
+            self.storage_updated = now
+
+    def health(self):
+        now = time.time()
+        last_success = self.registry.last_success
+        last_cycle = self.registry.last_cycle
+        if self.max_age is not None:
+            # Before the first success, the grace period starts at startup
+            healthy = now - (last_success or self.started_at) <= self.max_age
+        else:
+            # Without a max age, healthy unless the most recent cycle failed
+            healthy = last_cycle is None or (last_success is not None and last_success >= last_cycle)
+        return healthy, {
+            "status": "ok" if healthy else "unhealthy",
+            "last_success": last_success,
+            "last_success_age": round(now - last_success, 1) if last_success else None,
+            "last_cycle": last_cycle,
+            "max_age": self.max_age,
+        }
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def send_body(self, status, body, content_type):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                if path == "/metrics":
+                    server.refresh_storage()
+                    self.send_body(200, server.registry.render(), "text/plain; version=0.0.4; charset=utf-8")
+                elif path == "/healthz":
+                    healthy, body = server.health()
+                    self.send_body(200 if healthy else 503, json.dumps(body), "application/json")
+                else:
+                    self.send_body(404, "Not found\n", "text/plain")
+
+        return Handler
@@ -0,0 +1,121 @@
+from dataclasses import dataclass, field, fields
+from functools import cache
+
+
+def json_field(json_key):
+    """A record field read from `json_key` in the payload (default None)"""
+    return field(default=None, metadata={"key": json_key})
+
+
+@dataclass(slots=True, kw_only=True)
+class Record:
+    """
+    Compact record parsed once from a hub JSON payload. Subclasses declare
+    the fields they use; `json_field()` maps a field to a differently named JSON
+    key. `raw` is the escape hatch back to the full payload for persistence:
+    the original dict when it was kept, otherwise rebuilt from the fields.
+    The payload is dropped unless `keep_raw` is passed, which callers do only
+    for records they write back (fetched items, schedule baselines).
+    """
+
+    _raw: dict | None = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    @cache
+    def json_fields(cls):
+        """(attribute, JSON key) pairs of the record's fields"""
+        return tuple((f.name, f.metadata.get("key", f.name)) for f in fields(cls) if f.name != "_raw")
+
+    @classmethod
+    def from_json(cls, data, keep_raw=False):
+        record = cls(**{attr: data.get(json_key) for attr, json_key in cls.json_fields()})
+        record._raw = data if keep_raw else None
+        record.parsed(data)
+        return record
+
+    @classmethod
+    def parse_list(cls, items, keep_raw=False):
+        """Parse a list of payload dicts, skipping anything that is not a dict"""
+        return [cls.from_json(item, keep_raw) for item in items or [] if isinstance(item, dict)]
+
+    def parsed(self, data):
+        """Hook for subclasses to normalize fields after parsing `data`"""
+
+    @property
+    def raw(self):
+        if self._raw is not None:
+            return self._raw
+        return {json_key: getattr(self, attr) for attr, json_key in self.json_fields()}
+
+
+@dataclass(slots=True, kw_only=True)
+class NewsItem(Record):
+    id: int | None = None
+    title: str | None = None
+    content: str | None = None
+    published_date: str | None = json_field("publishedDateString")
+    published_by: str | None = json_field("publishedBy")
+    attachments: list | None = None
+
+    def parsed(self, data):
+        # Messages opened from a notification carry their text in body/text
+        self.content = self.content or data.get("body") or data.get("text") or ""
+        self.attachments = [
+            (attachment.get("url"), attachment.get("title") or "untitled")
+            for attachment in self.attachments or []
+            if isinstance(attachment, dict)
+        ]
+
+
+@dataclass(slots=True, kw_only=True)
+class ScheduleEntry(Record):
+    id: int | None = None
+    title: str | None = None
+    start: str | None = json_field("startDateFull")
+    end: str | None = json_field("endDateFull")
+    start_date: str | None = json_field("formattedStartDate")
+    end_date: str | None = json_field("formattedEndDate")
+    start_time: str | None = json_field("startTime")
+    end_time: str | None = json_field("endTime")
+    description: str | None = None
+
+
+@dataclass(slots=True, kw_only=True)
+class AttendanceRecord(Record):
+    date: str | None = json_field("dateString")
+    lesson: str | None = json_field("lessonName")
+    status: str | None = json_field("registrationTypeName")
+    start_time: str | None = json_field("startTime")
+    comment: str | None = None
+
+    @property
+    def key(self):
+        # InfoMentor attendance items don't always have IDs
+        return f"{self.date}_{self.lesson}_{self.status}_{self.start_time}"
+
+
+@dataclass(slots=True, kw_only=True)
+class Notification(Record):
+    id: int | None = None
+    title: str | None = None
+    subtitle: str | None = json_field("subTitle")
+    date_sent: str | None = json_field("dateSent")
+    url: str | None = None
+    pupil_source_id: int | str | None = json_field("pupilSourceId")
+    pupil_im2_id: int | str | None = json_field("pupilIM2Id")
+
+    def is_for_pupil(self, pupil_id):
+        """True unless the notification names a different pupil"""
+        if self.pupil_source_id is None and self.pupil_im2_id is None:
+            return True
+        return str(pupil_id) in (str(self.pupil_source_id), str(self.pupil_im2_id))
+
+
+@dataclass(slots=True, kw_only=True)
+class Pupil(Record):
+    id: int | str | None = None
+    name: str | None = None
+    switch_url: str | None = json_field("switchPupilUrl")
+
+    def parsed(self, data):
+        self.switch_url = data.get("switch_url") or self.switch_url
@@ -3,6 +3,10 @@ from datetime import datetime
 
 import requests
 
+from .dedup import SharedContent, content_hash
+from .models import NewsItem
+from .tracing import tracer
+
 
 class NewsFetcher:
     def __init__(
@@ -12,12 +16,15 @@ class NewsFetcher:
         notifier,
         llm_client,
         files_dir,
+        shared=None,
     ):
         self.session = session
         self.storage_manager = storage_manager
         self.notifier = notifier
         self.llm_client = llm_client
         self.files_dir = files_dir
+        # Cross-pupil dedup of school-wide posts (see dedup.py)
+        self.shared = shared or SharedContent(storage_manager, deferred=False)
         self.web_base_url = None
         self.use_bearer_token = False
         self.pupil_name = None
@@ -64,19 +71,23 @@ class NewsFetcher:
             if response.status_code == 200:
                 try:
                     data = response.json()
-                    items = data.get("items", [])
+                    # New items are saved as fetched, so their payload is kept
+                    items = NewsItem.parse_list(data.get("items", []), keep_raw=True)
                     print(f"  ✓ Successfully fetched {len(items)} news items")
                     return items
                 except json.JSONDecodeError:
                     print("  ✗ ERROR: Invalid JSON in news response")
+                    tracer.fail("invalid JSON")
                     return []
             else:
                 print(
                     f"  ✗ ERROR: News endpoint returned status {response.status_code}"
                 )
+                tracer.fail(f"status {response.status_code}")
                 return []
         except Exception as e:
             print(f"  ✗ ERROR: Error fetching news: {e}")
+            tracer.fail(e)
             return []
 
     def download_attachment(self, url, title):
@@ -115,16 +126,12 @@ class NewsFetcher:
 
     def download_attachments(self, item, existing_attachments):
         """Download all attachments for a news item"""
-        attachments = item.get("attachments", [])
         downloaded_paths = []
-        if not attachments:
+        if not item.attachments:
             return 0, []
 
         downloaded = 0
-        for attachment in attachments:
-            url = attachment.get("url")
-            title = attachment.get("title", "untitled")
-
+        for url, title in item.attachments:
             safe_title = "".join(
                 c for c in title if c.isalnum() or c in (" ", ".", "_", "-")
             ).strip()
@@ -146,76 +153,175 @@ class NewsFetcher:
 
         return downloaded, downloaded_paths
 
-    def process_new_item(self, item, attachment_paths=None):
+    def submit_summaries(self, items):
+        """
+        Start batched LLM summarization of several items in the background.
+        Returns a future resolving to id -> analysis, or None without an API key.
+        """
+        if not self.llm_client.can_analyze():
+            return None
+
+        entries = [
+            (
+                item.id,
+                item.content,
+                item.published_date or datetime.now().strftime("%Y-%m-%d"),
+            )
+            for item in items
+            if item.content
+        ]
+        return self.llm_client.submit_news_batch(entries)
+
+    def collect_summaries(self, future):
+        """Wait for a future from submit_summaries"""
+        if future is None:
+            return {}
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"    ✗ ERROR processing batched LLM analysis: {e}")
+            self.notifier.send_error("Batched LLM Analysis", e)
+            return {}
+
+    def shared_keys(self, item):
+        """Dedup keys of a news item: its entity ID and a hash of its content"""
+        return [
+            f"news:id:{item.id}" if item.id else None,
+            f"news:hash:{content_hash(item.title, item.content)}",
+        ]
+
+    def process_new_item(self, item, attachment_paths=None, analysis=None, analyzed=False, claim=None):
         """Process a new news item with LLM and Discord"""
-        content = item.get("content", "")
-        title = item.get("title", "No Title")
-        published_date = item.get(
-            "publishedDateString", datetime.now().strftime("%Y-%m-%d")
-        )
+        content = item.content
+        title = item.title or "No Title"
+        published_date = item.published_date or datetime.now().strftime("%Y-%m-%d")
 
         if not content:
+            if claim is not None:
+                self.shared.deliver(claim, None)
             return
 
-        analysis = None
-        # Only summarize if we have an API key (Perplexity or Gemini)
-        if self.llm_client.perplexity_api_key or self.llm_client.gemini_api_key:
+        # Only summarize if we have an API key (Perplexity or Gemini) or the local
+        # extractor, and the caller did not already analyze the item in a batch
+        if not analyzed and self.llm_client.can_analyze():
             try:
                 analysis = self.llm_client.summarize_news_entry(content, published_date)
-                if analysis:
-                    print(f"    ✓ Generated summary ({len(analysis.get('summary', ''))} chars)")
             except Exception as e:
                 print(f"    ✗ ERROR processing LLM analysis: {e}")
                 self.notifier.send_error(f"LLM Analysis for '{title}'", e)
+        if analysis:
+            print(f"    ✓ Generated summary ({len(analysis.get('summary', ''))} chars)")
 
         # Send to notifiers even if summary is missing
-        try:
-            summary = analysis.get("summary") if analysis else None
-            events = analysis.get("events", []) if analysis else []
-            highlights = analysis.get("highlights", []) if analysis else []
-
-            self.notifier.send_webhook(
-                summary,
-                events,
-                highlights,
-                title,
-                attachment_paths,
-                item,
-                self.pupil_name,
-            )
-        except Exception as e:
-            print(f"    ✗ ERROR sending notification for '{title}': {e}")
-            self.notifier.send_error(f"Notification for '{title}'", e)
+        summary = analysis.get("summary") if analysis else None
+        events = analysis.get("events", []) if analysis else []
+        highlights = analysis.get("highlights", []) if analysis else []
+
+        def send(pupil_names):
+            try:
+                self.notifier.send_webhook(
+                    summary,
+                    events,
+                    highlights,
+                    title,
+                    attachment_paths,
+                    item,
+                    pupil_names,
+                )
+            except Exception as e:
+                print(f"    ✗ ERROR sending notification for '{title}': {e}")
+                self.notifier.send_error(f"Notification for '{title}'", e)
+
+        if claim is None:
+            send(self.pupil_name)
+        else:
+            # Sent once at the end of the cycle, naming every pupil that has the item
+            self.shared.deliver(claim, send)
+
+    def redeliver(self, claim, entry):
+        """Queue an outbox entry left undelivered by an earlier cycle"""
+        item = self.storage_manager.load_news_item(entry.get("id"), pupil_id=entry.get("pupil_id"))
+        if item is None:
+            # Claimed but never stored; it is fetched as new again
+            self.shared.drop(claim)
+            return
+        # Attachments saved before the interruption are reused, not downloaded again
+        _, attachment_paths = self.download_attachments(
+            item, self.storage_manager.get_existing_attachments()
+        )
+        self.process_new_item(item, attachment_paths, claim=claim)
 
     def process_news(self, access_token):
         """Fetch, save, and process news items"""
         # Get existing IDs and attachments before fetching
-        existing_ids = self.storage_manager.get_existing_ids(pupil_id=self.pupil_id)
-        existing_attachments = self.storage_manager.get_existing_attachments()
+        with tracer.span("news.load_state"):
+            existing_ids = self.storage_manager.get_existing_ids(pupil_id=self.pupil_id)
+            existing_attachments = self.storage_manager.get_existing_attachments()
 
-        items = self.fetch_news(access_token=access_token)
+        with tracer.span("news.fetch") as span:
+            items = self.fetch_news(access_token=access_token)
+            span.add("items", len(items))
 
         if items:
-            new_items = [item for item in items if item.get("id") not in existing_ids]
+            with tracer.span("news.diff") as span:
+                new_items = [item for item in items if item.id not in existing_ids]
+                span.add("items", len(new_items))
 
             if new_items:
                 print(f"  → Found {len(new_items)} new news items")
-                for item in new_items:
-                    filename = self.storage_manager.save_news_item(
-                        item, pupil_id=self.pupil_id
-                    )
-                    if filename:
-                        title = item.get("title", "No title")
-                        published = item.get("publishedDateString", "Unknown date")
-                        print(f"  ✓ NEW: {filename.name} - {title} ({published})")
-
-                        # Download attachments
-                        _, attachment_paths = self.download_attachments(
-                            item, existing_attachments
-                        )
 
-                        # Process with LLM and send to Discord
-                        self.process_new_item(item, attachment_paths)
+                # School-wide posts already handled for a sibling are only
+                # recorded for this pupil; the rest are claimed and processed
+                with tracer.span("news.dedup") as span:
+                    unique = []
+                    for item in new_items:
+                        keys = self.shared_keys(item)
+                        if self.shared.join(keys, self.pupil_name, self.pupil_id):
+                            self.storage_manager.save_news_item(item, pupil_id=self.pupil_id)
+                        else:
+                            entry = {"kind": "news", "id": item.id, "pupil_id": self.pupil_id}
+                            unique.append((item, self.shared.claim(keys, self.pupil_name, self.pupil_id, entry)))
+                    span.add("shared", len(new_items) - len(unique))
+
+                saved = []
+                with tracer.span("news.persist") as span:
+                    for item, claim in unique:
+                        filename = self.storage_manager.save_news_item(
+                            item, pupil_id=self.pupil_id
+                        )
+                        if filename:
+                            title = item.title or "No title"
+                            published = item.published_date or "Unknown date"
+                            print(f"  ✓ NEW: {filename.name} - {title} ({published})")
+                            saved.append((item, claim))
+                        else:
+                            # Retried next cycle, so not summarized now
+                            self.shared.release(claim)
+                    span.add("items", len(saved))
+
+                # Summarize the saved items in batched requests while
+                # attachments are downloaded
+                summaries = self.submit_summaries([item for item, _ in saved])
+
+                with tracer.span("news.attachments"):
+                    saved = [
+                        (item, self.download_attachments(item, existing_attachments)[1], claim)
+                        for item, claim in saved
+                    ]
+
+                # Time spent waiting on summaries that did not finish during the downloads
+                with tracer.span("news.summarize_wait"):
+                    analyses = self.collect_summaries(summaries)
+
+                # Send to Discord
+                for item, attachment_paths, claim in saved:
+                    self.process_new_item(
+                        item,
+                        attachment_paths,
+                        analysis=analyses.get(item.id),
+                        analyzed=item.id in analyses,
+                        claim=claim,
+                    )
             else:
                 print("  → No new news items")
             return len(new_items)
@@ -1,21 +1,132 @@
+import re
+from collections import deque
+from datetime import datetime
+
 import requests
 
+from .dedup import SharedContent, content_hash
+from .models import NewsItem, Notification
+from .tracing import tracer
+
+_DOTNET_DATE_RE = re.compile(r"/Date\((-?\d+)")
+
+
+def parse_date_sent(value):
+    """dateSent as a naive datetime (ISO or /Date(ms)/), None if unparseable"""
+    if not isinstance(value, str) or not value:
+        return None
+    match = _DOTNET_DATE_RE.match(value)
+    try:
+        if match:
+            return datetime.fromtimestamp(int(match.group(1)) / 1000)
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+class NotificationCursor:
+    """
+    Per-pupil high-water mark over the notification feed: the latest dateSent
+    processed, the IDs sent exactly at that time, and a bounded window of
+    recent IDs (for entries without a usable date). Entries sent before the
+    mark are rejected outright.
+    """
+
+    def __init__(self, sent=None, recent_ids=(), window=500, at_mark=()):
+        self.sent = sent
+        self.at_mark = set(at_mark)
+        self.recent = deque(maxlen=window)
+        self.recent_set = set()
+        for notif_id in recent_ids:
+            self.remember(notif_id)
+
+    @classmethod
+    def from_json(cls, data, window=500):
+        sent = data.get("sent")
+        return cls(
+            datetime.fromisoformat(sent) if sent else None,
+            data.get("recent_ids", []),
+            window,
+            data.get("at_mark", []),
+        )
+
+    def to_json(self):
+        return {
+            "sent": self.sent.isoformat() if self.sent else None,
+            "at_mark": sorted(self.at_mark, key=str),
+            "recent_ids": list(self.recent),
+        }
+
+    def remember(self, notif_id):
+        if notif_id in self.recent_set:
+            return
+        if len(self.recent) == self.recent.maxlen:
+            self.recent_set.discard(self.recent[0])
+        self.recent.append(notif_id)
+        self.recent_set.add(notif_id)
+
+    def is_old(self, sent):
+        return sent is not None and self.sent is not None and sent < self.sent
+
+    def is_seen(self, notif_id):
+        return notif_id in self.at_mark or notif_id in self.recent_set
+
+    def advance(self, seen, failed):
+        """
+        Fold in (id, sent) pairs that are done. The mark never passes a
+        failed entry, so it is retried on the next cycle.
+        """
+        for notif_id, _ in seen:
+            self.remember(notif_id)
+        dates = [sent for _, sent in seen if sent is not None]
+        if self.sent is not None:
+            dates.append(self.sent)
+        if not dates:
+            return
+        mark = max(dates)
+        failed_dates = [sent for _, sent in failed if sent is not None]
+        if failed_dates:
+            mark = min(mark, min(failed_dates))
+        if mark != self.sent:
+            self.at_mark = set()
+            self.sent = mark
+        # Entries sent in the same instant as the mark are not rejected by date
+        self.at_mark.update(notif_id for notif_id, sent in seen if sent == mark)
+
 
 class NotificationFetcher:
     def __init__(
-        self, session: requests.Session, storage_manager, notifier, llm_client, news_fetcher
+        self,
+        session: requests.Session,
+        storage_manager,
+        notifier,
+        llm_client,
+        news_fetcher,
+        recent_window=500,
+        shared=None,
     ):
         self.session = session
         self.storage_manager = storage_manager
         self.notifier = notifier
         self.llm_client = llm_client
         self.news_fetcher = news_fetcher
+        # Size of the per-pupil recent-ID window kept with the feed cursor
+        self.recent_window = recent_window
+        # pupil_id -> NotificationCursor
+        self.cursors = {}
+        # Cross-pupil dedup of school-wide posts (see dedup.py)
+        self.shared = shared or SharedContent(storage_manager, deferred=False)
         self.web_base_url: str | None = None
         self.pupil_name = None
         self.pupil_id = None
 
     def fetch_communication_content(self, url_route):
-        """Fetch content from hub URL (e.g. news or message)"""
+        """Fetch content from hub URL (e.g. news or message) as a NewsItem"""
+        content = self._fetch_communication_content(url_route)
+        # Kept whole for the outbox entry it may be written to
+        return NewsItem.from_json(content, keep_raw=True) if isinstance(content, dict) else None
+
+    def _fetch_communication_content(self, url_route):
         if not self.web_base_url or not url_route:
             return None
 
@@ -103,98 +214,202 @@ class NotificationFetcher:
 
             if response.status_code == 200:
                 data = response.json()
-                notifications = data.get("notifications", [])
+                notifications = Notification.parse_list(data.get("notifications", []), keep_raw=True)
                 print(f"  ✓ Successfully fetched {len(notifications)} notifications")
                 return notifications
             else:
                 print(
                     f"  ✗ ERROR: Notification endpoint returned status {response.status_code}"
                 )
+                tracer.fail(f"status {response.status_code}")
                 return []
         except Exception as e:
             print(f"  ✗ ERROR: Error fetching notifications: {e}")
+            tracer.fail(e)
             self.notifier.send_error("Fetching Notifications", e)
             return []
 
     def process_notifications(self):
         """Fetch, save, and notify about new notifications"""
-        notifications = self.fetch_notifications()
+        with tracer.span("notifications.fetch") as span:
+            notifications = self.fetch_notifications()
+            span.add("items", len(notifications))
 
         if not notifications:
             return
 
-        existing_ids = self.storage_manager.get_existing_notification_ids(
-            pupil_id=self.pupil_id
-        )
+        with tracer.span("notifications.load_state"):
+            cursor = self.load_cursor()
 
+        # Stored IDs, only read when the cursor cannot decide (first run, unparseable dates)
+        existing_ids = None
         new_notifications = []
+        seen = []
+        skipped = 0
         for n in notifications:
-            if n.get("id") in existing_ids:
+            sent = parse_date_sent(n.date_sent)
+            if cursor.is_old(sent) or cursor.is_seen(n.id):
+                skipped += 1
                 continue
 
-            pupil_source_id = n.get("pupilSourceId")
-            pupil_im2_id = n.get("pupilIM2Id")
+            if cursor.sent is None or sent is None:
+                if existing_ids is None:
+                    existing_ids = self.storage_manager.get_existing_notification_ids(
+                        pupil_id=self.pupil_id
+                    )
+                if n.id in existing_ids:
+                    seen.append((n.id, sent))
+                    continue
 
             # If the notification specifies a pupil ID, verify it matches the current pupil_id
-            if pupil_source_id is not None or pupil_im2_id is not None:
-                if str(pupil_source_id) != str(self.pupil_id) and str(pupil_im2_id) != str(self.pupil_id):
-                    continue
+            if not n.is_for_pupil(self.pupil_id):
+                seen.append((n.id, sent))
+                continue
 
             new_notifications.append(n)
+        tracer.add("skipped", skipped)
+
+        failed = []
 
         if new_notifications:
             print(f"  → Found {len(new_notifications)} new notifications")
-            for notification in new_notifications:
-                filename = self.storage_manager.save_notification(
-                    notification, pupil_id=self.pupil_id
-                )
-                if filename:
-                    title = notification.get("title", "No title")
-                    url_route = notification.get("url")
-                    print(f"  ✓ NEW: {filename.name} - {title}")
+            saved = []
+            with tracer.span("notifications.persist") as span:
+                for notification in new_notifications:
+                    # Claimed (and put in the outbox) before it is stored and marked seen
+                    comm_content, claim = self.claim_notification(notification)
 
-                    # Try to fetch additional communication content
-                    comm_content = self.fetch_communication_content(url_route)
-                    
-                    summarized = False
-                    if comm_content:
-                        # Process with LLM if possible
-                        summary = None
-                        events = []
-                        highlights = []
-
-                        if self.llm_client.perplexity_api_key or self.llm_client.gemini_api_key:
-                            try:
-                                content_to_summarize = comm_content.get("content", "")
-                                if not content_to_summarize:
-                                    # For messages, the field might be "body" or "text"
-                                    content_to_summarize = comm_content.get("body", "") or comm_content.get("text", "")
-                                
-                                if content_to_summarize:
-                                    print(f"    → Summarizing communication content ({len(content_to_summarize)} chars)")
-                                    analysis = self.llm_client.summarize_news_entry(content_to_summarize, notification.get("dateSent", ""))
-                                    if analysis:
-                                        summary = analysis.get("summary")
-                                        events = analysis.get("events", [])
-                                        highlights = analysis.get("highlights", [])
-                            except Exception as e:
-                                print(f"    ✗ Error summarizing communication: {e}")
-
-                        # Send as webhook if we have content (even if not summarized)
-                        # We use this to send the full message/news item details
-                        self.notifier.send_webhook(
-                            summary,
-                            events,
-                            highlights,
-                            f"{title}: {comm_content.get('title', '')}",
-                            None, # attachment_paths
-                            comm_content, # full_item
-                            self.pupil_name
-                        )
-                        summarized = True
-
-                    # Fallback to standard notification if no detailed content was found
-                    if not summarized:
-                        self.notifier.send_notification(notification, self.pupil_name)
+                    filename = self.storage_manager.save_notification(
+                        notification, pupil_id=self.pupil_id
+                    )
+                    sent = parse_date_sent(notification.date_sent)
+                    if not filename:
+                        failed.append((notification.id, sent))
+                        if claim:
+                            self.shared.release(claim)
+                        continue
+
+                    seen.append((notification.id, sent))
+                    print(f"  ✓ NEW: {filename.name} - {notification.title or 'No title'}")
+                    if claim:
+                        saved.append((notification, comm_content, claim))
+                span.add("items", len(saved))
+
+            # Summarize all communication content in batched LLM requests
+            with tracer.span("notifications.summarize"):
+                analyses = self.summarize_communications(saved)
+
+            for notification, comm_content, claim in saved:
+                # Sent once at the end of the cycle, naming every pupil that has the post
+                self.shared.deliver(claim, self.make_send(notification, comm_content, analyses))
         else:
             print("  → No new notifications")
+
+        if seen:
+            cursor.advance(seen, failed)
+            self.storage_manager.set_notification_cursor(cursor.to_json(), pupil_id=self.pupil_id)
+
+    def claim_notification(self, notification):
+        """
+        Fetch the linked content and claim the notification unless a sibling
+        already has it; returns (content, claim) with claim None for copies.
+        """
+        # The linked news item or message identifies a post sent to siblings too
+        link_key = f"notification:url:{notification.url.lower()}" if notification.url else None
+        if link_key and self.shared.join([link_key], self.pupil_name, self.pupil_id):
+            return None, None
+
+        # Try to fetch additional communication content
+        comm_content = self.fetch_communication_content(notification.url)
+        if comm_content and comm_content.content:
+            digest = content_hash(comm_content.title, comm_content.content)
+        else:
+            digest = content_hash(notification.title, notification.subtitle, notification.date_sent)
+        keys = [link_key, f"notification:hash:{digest}"]
+        if self.shared.join(keys, self.pupil_name, self.pupil_id):
+            return None, None
+
+        entry = {
+            "kind": "notification",
+            "id": notification.id,
+            "pupil_id": self.pupil_id,
+            "content": comm_content.raw if comm_content else None,
+        }
+        return comm_content, self.shared.claim(keys, self.pupil_name, self.pupil_id, entry)
+
+    def redeliver(self, claim, entry):
+        """Queue an outbox entry left undelivered by an earlier cycle"""
+        notification = self.storage_manager.load_notification(entry.get("id"), pupil_id=entry.get("pupil_id"))
+        if notification is None:
+            # Claimed but never stored; it is fetched as new again
+            self.shared.drop(claim)
+            return
+        comm_content = NewsItem.from_json(entry["content"]) if entry.get("content") else None
+        saved = [(notification, comm_content, claim)]
+        analyses = self.summarize_communications(saved)
+        self.shared.deliver(claim, self.make_send(notification, comm_content, analyses))
+
+    def make_send(self, notification, comm_content, analyses):
+        """Delivery callback for one notification, taking the pupil names to show"""
+        title = notification.title or "No title"
+
+        def send(pupil_names):
+            # Fallback to standard notification if no detailed content was found
+            if not comm_content:
+                self.notifier.send_notification(notification, pupil_names)
+                return
+
+            analysis = analyses.get(notification.id)
+            summary = analysis.get("summary") if analysis else None
+            events = analysis.get("events", []) if analysis else []
+            highlights = analysis.get("highlights", []) if analysis else []
+
+            # Send as webhook if we have content (even if not summarized)
+            # We use this to send the full message/news item details
+            self.notifier.send_webhook(
+                summary,
+                events,
+                highlights,
+                f"{title}: {comm_content.title or ''}",
+                None, # attachment_paths
+                comm_content, # full_item
+                pupil_names
+            )
+
+        return send
+
+    def load_cursor(self):
+        """The pupil's feed cursor, read from storage once per process"""
+        cursor = self.cursors.get(self.pupil_id)
+        if cursor is None:
+            data = self.storage_manager.get_notification_cursor(pupil_id=self.pupil_id)
+            try:
+                cursor = NotificationCursor.from_json(data, self.recent_window) if data else None
+            except (ValueError, TypeError, AttributeError):
+                print("  ⚠ Ignoring unreadable notification cursor")
+                cursor = None
+            self.cursors[self.pupil_id] = cursor = cursor or NotificationCursor(window=self.recent_window)
+        return cursor
+
+    def summarize_communications(self, saved):
+        """Summarize (notification, comm_content) pairs; returns notification id -> analysis"""
+        if not self.llm_client.can_analyze():
+            return {}
+
+        entries = []
+        for notification, comm_content, _ in saved:
+            if not comm_content:
+                continue
+            # For messages, NewsItem falls back to the "body" or "text" field
+            content_to_summarize = comm_content.content
+            if content_to_summarize:
+                print(f"    → Summarizing communication content ({len(content_to_summarize)} chars)")
+                entries.append(
+                    (notification.id, content_to_summarize, notification.date_sent or "")
+                )
+
+        try:
+            return self.llm_client.summarize_news_batch(entries)
+        except Exception as e:
+            print(f"    ✗ Error summarizing communication: {e}")
+            return {}
@@ -1,7 +1,15 @@
+from .tracing import tracer
+
+
 class CompositeNotifier:
     def __init__(self, notifiers):
         self.notifiers = notifiers
 
+    def traced(self, notifier, kind):
+        """Span around one channel's send, e.g. notify.discord"""
+        channel = notifier.__class__.__name__.replace("Notifier", "").lower()
+        return tracer.span(f"notify.{channel}", kind=kind)
+
     def send_webhook(
         self,
         summary,
@@ -13,31 +21,35 @@ class CompositeNotifier:
         pupil_name=None,
     ):
         for notifier in self.notifiers:
-            notifier.send_webhook(
-                summary,
-                events,
-                highlights,
-                news_title,
-                attachment_paths,
-                full_item,
-                pupil_name,
-            )
+            with self.traced(notifier, "webhook"):
+                notifier.send_webhook(
+                    summary,
+                    events,
+                    highlights,
+                    news_title,
+                    attachment_paths,
+                    full_item,
+                    pupil_name,
+                )
 
     def send_schedule_update(
         self, schedule, week_str, is_new_week=False, changes=None, pupil_name=None
     ):
         for notifier in self.notifiers:
-            notifier.send_schedule_update(
-                schedule, week_str, is_new_week, changes, pupil_name
-            )
+            with self.traced(notifier, "schedule"):
+                notifier.send_schedule_update(
+                    schedule, week_str, is_new_week, changes, pupil_name
+                )
 
     def send_notification(self, notification, pupil_name=None):
         for notifier in self.notifiers:
-            notifier.send_notification(notification, pupil_name)
+            with self.traced(notifier, "notification"):
+                notifier.send_notification(notification, pupil_name)
 
     def send_attendance_update(self, new_records, pupil_name=None):
         for notifier in self.notifiers:
-            notifier.send_attendance_update(new_records, pupil_name)
+            with self.traced(notifier, "attendance"):
+                notifier.send_attendance_update(new_records, pupil_name)
 
     def send_error(self, context, error_message):
         for notifier in self.notifiers:
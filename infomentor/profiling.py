@@ -0,0 +1,178 @@
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+PROFILE_MODES = ("cpu", "memory", "all")
+# Leaf frames of idle pool and server threads; such samples are dropped
+IDLE_LEAVES = {"thread:_worker", "threading:wait", "selectors:select", "socket:accept"}
+
+
+class StackSampler:
+    """
+    Samples the stacks of all threads at a fixed interval and counts them in
+    the folded format ("thread;module:func;... count") that flamegraph.pl,
+    speedscope and inferno read. Covers the LLM worker threads, which
+    cProfile (main thread only) does not see.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.stacks.clear()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        main_id = threading.main_thread().ident
+        while self.running:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{Path(code.co_filename).stem}:{code.co_name}")
+                    frame = frame.f_back
+                # Time the main thread spends waiting is part of the cycle, idle workers are not
+                if thread_id != main_id and stack and stack[0] in IDLE_LEAVES:
+                    continue
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class CycleProfiler:
+    """
+    Wraps fetch cycles in cProfile and a stack sampler ("cpu"), tracemalloc
+    snapshots diffed against the previous cycle ("memory"), or both ("all"),
+    writing the results under `directory`. `cycles` is the number of cycles
+    to profile, or None to keep profiling until disabled.
+    """
+
+    def __init__(self, directory="profiles", mode="cpu", cycles=1, top=40):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {mode!r}, expected one of {PROFILE_MODES}")
+        self.directory = Path(directory)
+        self.mode = mode
+        self.remaining = cycles
+        self.top = top
+        self.count = 0
+        self.previous_snapshot = None
+
+    @property
+    def active(self):
+        return self.remaining is None or self.remaining > 0
+
+    def enable(self, cycles=None):
+        self.remaining = cycles
+        print(f"✓ Profiling enabled ({self.mode}, {'until toggled' if cycles is None else f'{cycles} cycles'})")
+
+    def disable(self):
+        self.remaining = 0
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.previous_snapshot = None
+        print("✓ Profiling disabled")
+
+    def toggle(self):
+        if self.active:
+            self.disable()
+        else:
+            self.enable()
+
+    def run(self, func):
+        """Run one cycle, profiled if profiling is active"""
+        if not self.active:
+            return func()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.count += 1
+        stem = self.directory / f"cycle-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{self.count}"
+        cpu = self.mode in ("cpu", "all")
+        memory = self.mode in ("memory", "all")
+
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            self.previous_snapshot = tracemalloc.take_snapshot()
+
+        profile = cProfile.Profile() if cpu else None
+        sampler = StackSampler() if cpu else None
+        if cpu:
+            sampler.start()
+            profile.enable()
+        try:
+            return func()
+        finally:
+            if cpu:
+                profile.disable()
+                sampler.stop()
+                self.write_cpu(stem, profile, sampler)
+            if memory:
+                self.write_memory(stem)
+            if self.remaining is not None:
+                self.remaining -= 1
+                if self.remaining == 0:
+                    self.disable()
+
+    def write_cpu(self, stem, profile, sampler):
+        try:
+            profile.dump_stats(f"{stem}.pstats")
+            sampler.write(f"{stem}.folded")
+            report = io.StringIO()
+            pstats.Stats(profile, stream=report).sort_stats("cumulative").print_stats(self.top)
+            with open(f"{stem}-cpu.txt", "w") as f:
+                f.write(report.getvalue())
+            print(f"  ✓ CPU profile written to {stem}.pstats (+ .folded, -cpu.txt)")
+        except Exception as e:
+            print(f"  ✗ ERROR: Could not write CPU profile: {e}")
+
+    def write_memory(self, stem):
+        try:
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                (
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, cProfile.__file__),
+                    tracemalloc.Filter(False, __file__),
+                )
+            )
+            current, peak = tracemalloc.get_traced_memory()
+            lines = [
+                f"Traced memory: current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB",
+                f"Top {self.top} allocation changes since the previous snapshot:",
+                "",
+            ]
+            if self.previous_snapshot is not None:
+                for stat in snapshot.compare_to(self.previous_snapshot, "lineno")[: self.top]:
+                    lines.append(str(stat))
+            lines += ["", f"Top {self.top} live allocations:", ""]
+            lines += [str(stat) for stat in snapshot.statistics("lineno")[: self.top]]
+            with open(f"{stem}-memory.txt", "w") as f:
+                f.write("\n".join(lines) + "\n")
+            self.previous_snapshot = snapshot
+            print(f"  ✓ Memory diff written to {stem}-memory.txt")
+        except Exception as e:
+            print(f"  ✗ ERROR: Could not write memory profile: {e}")
@@ -1,13 +1,48 @@
+import hashlib
 import json
 import re
+import time
+
 import requests
 
+from .models import Pupil
+
+# Start of the pupils array in the hub's inline script ("pupils": [ ...)
+PUPILS_BLOCK_RE = re.compile(r'["\']pupils["\']\s*:\s*(?=\[)')
+# Fallback: individual objects with name and switchPupilUrl fields
+PUPIL_OBJECT_RE = re.compile(
+    r'\{[^{}]*?["\']name["\']\s*:\s*["\']([^"\']+)["\'][^{}]*?["\']switchPupilUrl["\']\s*:\s*["\']([^"\']+)["\'][^{}]*?\}'
+)
+PUPIL_ID_RE = re.compile(r'pupilId=([^&"\']+)')
+# Stop reading the root page after this many bytes
+MAX_PAGE_BYTES = 8 * 1024 * 1024
+_decoder = json.JSONDecoder()
+
+
+def extract_pupils_block(text):
+    """The pupils JSON array from the page text, or None if absent or not (yet) complete"""
+    match = PUPILS_BLOCK_RE.search(text)
+    if not match:
+        return None
+    try:
+        pupils, _ = _decoder.raw_decode(text, match.end())
+    except json.JSONDecodeError:
+        return None
+    return pupils if isinstance(pupils, list) else None
+
 
 class PupilFetcher:
-    def __init__(self, session: requests.Session, storage_manager):
+    def __init__(self, session: requests.Session, storage_manager, cache_ttl=21600):
         self.session = session
         self.storage_manager = storage_manager
         self.web_base_url = None
+        # Seconds the pupil list is reused before the root page is fetched again (0 = always fetch)
+        self.cache_ttl = cache_ttl
+        self.cached = None
+        self.cached_at = 0
+        # Whether the last process_pupils() call was served from the cache
+        self.from_cache = False
+        self.force_refresh = False
 
     def fetch_pupils(self):
         """Fetch pupils from the root page (hub.infomentor.se)"""
@@ -35,64 +70,71 @@ class PupilFetcher:
 
         try:
             response = self.session.get(
-                url, headers=headers, timeout=30, allow_redirects=True
+                url, headers=headers, timeout=30, allow_redirects=True, stream=True
             )
 
-            if response.status_code == 200:
-                html_content = response.text
-                return self.parse_pupils_from_html(html_content)
-            else:
-                print(
-                    f"  ✗ ERROR: Root page returned status {response.status_code}"
-                )
-                return None
+            try:
+                if response.status_code == 200:
+                    return self.read_pupils(response)
+                else:
+                    print(
+                        f"  ✗ ERROR: Root page returned status {response.status_code}"
+                    )
+                    return None
+            finally:
+                response.close()
         except Exception as e:
             print(f"  ✗ ERROR: Error fetching root page: {e}")
             return None
 
+    def read_pupils(self, response):
+        """
+        Stream the root page and stop as soon as the pupils block has been
+        parsed; the rest of the page is only read for the regex fallback.
+        """
+        encoding = response.encoding or "utf-8"
+        buffer = bytearray()
+        searched = 0
+        for chunk in response.iter_content(chunk_size=16384):
+            buffer.extend(chunk)
+            # Only decode from shortly before the new data until the block starts
+            start = max(0, searched - 64)
+            text = buffer[start:].decode(encoding, errors="ignore")
+            if PUPILS_BLOCK_RE.search(text):
+                pupils = extract_pupils_block(text)
+                if pupils is not None:
+                    print(f"  ✓ Found {len(pupils)} pupils in JSON block ({len(buffer) // 1024} KB read)")
+                    return self.finish_pupils(pupils)
+            else:
+                searched = len(buffer)
+            if len(buffer) > MAX_PAGE_BYTES:
+                print("  ⚠ Root page exceeds the size limit, parsing what was read")
+                break
+        return self.parse_pupils_from_html(buffer.decode(encoding, errors="replace"))
+
     def parse_pupils_from_html(self, html_content):
         """Parse pupils and switch URLs from HTML source"""
-        # Search for pupil data in script tags. 
-        # Typically InfoMentor hub stores this in a JSON-like structure in the HTML.
-        
-        pupils = []
-        
-        # Look for patterns like: "pupils": [ ... ]
-        # This is often found in a script tag as part of a larger object.
-        pupil_list_match = re.search(r'["\']pupils["\']\s*:\s*(\[.*?\])\s*[,}]', html_content, re.DOTALL)
-        
-        if pupil_list_match:
-            try:
-                pupils_json = pupil_list_match.group(1)
-                # Some basic cleanup in case of non-strict JSON (like trailing commas)
-                # but usually it's injected from a server-side object and valid.
-                pupils = json.loads(pupils_json)
-                print(f"  ✓ Found {len(pupils)} pupils in JSON block")
-            except json.JSONDecodeError:
-                # If direct JSON load fails, try a more manual approach
-                print("  ⚠ Failed to parse pupils JSON block directly, attempting regex extraction...")
-        
+        # Typically InfoMentor hub stores this in a JSON-like structure in a script tag
+        pupils = extract_pupils_block(html_content) or []
+        if pupils:
+            print(f"  ✓ Found {len(pupils)} pupils in JSON block")
+        elif PUPILS_BLOCK_RE.search(html_content):
+            print("  ⚠ Failed to parse pupils JSON block directly, attempting regex extraction...")
+
         if not pupils:
             # Fallback: regex search for individual pupil objects containing switchPupilUrl
-            # This looks for objects with name and switchPupilUrl fields.
-            pattern = r'\{[^{}]*?["\']name["\']\s*:\s*["\']([^"\']+)["\'][^{}]*?["\']switchPupilUrl["\']\s*:\s*["\']([^"\']+)["\'][^{}]*?\}'
-            matches = re.finditer(pattern, html_content)
-            for match in matches:
+            for match in PUPIL_OBJECT_RE.finditer(html_content):
                 name = match.group(1)
                 switch_url = match.group(2)
-                
-                # Try to extract ID from switch URL (e.g. ...?pupilId=123 or .../123)
-                pupil_id = None
-                id_match = re.search(r'pupilId=([^&"\']+)', switch_url)
-                if id_match:
-                    pupil_id = id_match.group(1)
-                
+
+                # Try to extract ID from switch URL (e.g. ...?pupilId=123)
+                id_match = PUPIL_ID_RE.search(switch_url)
                 pupils.append({
                     "name": name,
-                    "id": pupil_id,
+                    "id": id_match.group(1) if id_match else None,
                     "switchPupilUrl": switch_url
                 })
-            
+
             if pupils:
                 print(f"  ✓ Found {len(pupils)} pupils via regex pattern matching")
 
@@ -100,24 +142,61 @@ class PupilFetcher:
             print("  ✗ ERROR: Could not find pupil information in HTML")
             return None
 
-        # Ensure every pupil has an ID
+        return self.finish_pupils(pupils)
+
+    def finish_pupils(self, pupils):
+        """Fill in missing IDs, parse into Pupil records and store them if they changed"""
+        pupils = [pupil for pupil in pupils if isinstance(pupil, dict)]
         for i, pupil in enumerate(pupils):
             if not pupil.get("id"):
                 # Try to extract from switchPupilUrl if it wasn't done above (for JSON branch)
-                switch_url = pupil.get("switchPupilUrl", "")
-                id_match = re.search(r'pupilId=([^&"\']+)', switch_url)
+                id_match = PUPIL_ID_RE.search(pupil.get("switchPupilUrl", ""))
                 if id_match:
                     pupil["id"] = id_match.group(1)
                 else:
                     # Last resort: use a hash or index-based ID
-                    import hashlib
                     pupil["id"] = hashlib.md5(pupil.get("name", f"pupil_{i}").encode()).hexdigest()[:8]
 
+        pupils = Pupil.parse_list(pupils, keep_raw=True)
+        if not pupils:
+            return None
 
-        # Save to storage
-        self.storage_manager.save_pupils(pupils)
+        # Save to storage (only when the list changed)
+        previous = self.cached or self.storage_manager.load_pupils() or []
+        if previous != pupils:
+            self.storage_manager.save_pupils(pupils)
         return pupils
 
+    def cached_pupils(self):
+        """The pupil list while it is younger than the TTL, else None"""
+        if not self.cache_ttl or self.force_refresh:
+            return None
+        if self.cached is None:
+            # After a restart, pupils.json serves as the cache
+            saved_at = self.storage_manager.get_pupils_saved_at()
+            if saved_at is None:
+                return None
+            self.cached = self.storage_manager.load_pupils()
+            self.cached_at = saved_at
+        if not self.cached or time.time() - self.cached_at > self.cache_ttl:
+            return None
+        return self.cached
+
+    def invalidate(self):
+        """Fetch the pupil list again on the next process_pupils() call (e.g. after a failed switch)"""
+        self.force_refresh = True
+
     def process_pupils(self):
-        """Fetch and save pupil information"""
-        return self.fetch_pupils()
+        """Return the cached pupil list, fetching and saving it on a miss"""
+        pupils = self.cached_pupils()
+        self.from_cache = bool(pupils)
+        if pupils:
+            print(f"\n[Pupils] Using {len(pupils)} cached pupils")
+            return pupils
+
+        pupils = self.fetch_pupils()
+        if pupils:
+            self.cached = pupils
+            self.cached_at = time.time()
+            self.force_refresh = False
+        return pupils
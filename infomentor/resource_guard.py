@@ -0,0 +1,139 @@
+import os
+import sys
+import time
+from collections import deque
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import requests
+
+from . import metrics
+
+PROCESS_RSS = metrics.registry.gauge("infomentor_process_rss_bytes", "Resident set size after the last cycle")
+COOKIE_JAR_SIZE = metrics.registry.gauge("infomentor_cookie_jar_size", "Cookies in the shared session after pruning")
+OPEN_FDS = metrics.registry.gauge("infomentor_open_fds", "Open file descriptors after the last cycle")
+SESSION_REBUILDS = metrics.registry.counter("infomentor_session_rebuilds_total", "Shared requests.Session rebuilds")
+
+# Warn when RSS grew after this many cycles in a row
+GROWTH_WARNING_CYCLES = 10
+
+
+def process_rss():
+    """Current resident set size in bytes (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        if resource is None:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def open_fds():
+    """Number of open file descriptors, or None where it cannot be counted"""
+    for path in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(path))
+        except OSError:
+            continue
+    return None
+
+
+def prune_cookies(jar):
+    """
+    Drop expired cookies; returns the number removed. Host-only and domain
+    cookies with the same name ("hub.x" and ".hub.x") are distinct cookies
+    the server may both read, so they are left alone. The jar already keeps
+    a single cookie per exact (domain, path, name).
+    """
+    before = len(jar)
+    jar.clear_expired_cookies()
+    return before - len(jar)
+
+
+def rebuild_session(old):
+    """A fresh Session carrying over headers, hooks and the live cookies"""
+    session = requests.Session()
+    session.headers.clear()
+    session.headers.update(old.headers)
+    session.hooks = {event: list(hooks) for event, hooks in old.hooks.items()}
+    for cookie in old.cookies:
+        if not cookie.is_expired():
+            session.cookies.set_cookie(cookie)
+    # Releases pooled connections (and their file descriptors)
+    old.close()
+    return session
+
+
+class ResourceGuard:
+    """
+    Per-cycle resource check for the daemon: records RSS, cookie jar size and
+    open file descriptors, prunes the cookie jar, periodically rebuilds the
+    shared session, and reports when RSS exceeds the configured ceiling.
+    """
+
+    def __init__(self, max_rss_mb=None, rebuild_every=24):
+        self.max_rss = max_rss_mb * 1024 * 1024 if max_rss_mb else None
+        self.rebuild_every = rebuild_every
+        self.cycles = 0
+        self.rss_history = deque(maxlen=GROWTH_WARNING_CYCLES + 1)
+
+    def check(self, fetcher):
+        """Run after a cycle; returns True when the process should restart"""
+        self.cycles += 1
+        session = fetcher.session
+
+        removed = prune_cookies(session.cookies)
+        if self.rebuild_every and self.cycles % self.rebuild_every == 0:
+            fetcher.replace_session(rebuild_session(session))
+            SESSION_REBUILDS.inc()
+            print(f"  → Rebuilt HTTP session with {len(fetcher.session.cookies)} live cookies")
+
+        rss = process_rss()
+        fds = open_fds()
+        cookies = len(fetcher.session.cookies)
+        PROCESS_RSS.set(rss)
+        COOKIE_JAR_SIZE.set(cookies)
+        if fds is not None:
+            OPEN_FDS.set(fds)
+
+        pruned = f", pruned {removed}" if removed else ""
+        print(
+            f"→ Resources: RSS {rss / 1024 / 1024:.1f} MB, {cookies} cookies{pruned}, "
+            f"{fds if fds is not None else '?'} open fds"
+        )
+
+        self.rss_history.append(rss)
+        history = list(self.rss_history)
+        if len(history) > GROWTH_WARNING_CYCLES and all(b > a for a, b in zip(history, history[1:])):
+            print(f"  ⚠ RSS grew in each of the last {GROWTH_WARNING_CYCLES} cycles")
+
+        if self.max_rss and rss > self.max_rss:
+            print(
+                f"  ⚠ RSS {rss / 1024 / 1024:.1f} MB exceeds the ceiling of "
+                f"{self.max_rss / 1024 / 1024:.0f} MB"
+            )
+            return True
+        return False
+
+
+def restart_process(mode="exec"):
+    """
+    Replace the process with a fresh copy of itself ("exec"), or exit with a
+    non-zero status so a supervisor (Docker restart policy, systemd) starts a
+    new worker ("exit"). All state lives on disk, so nothing is lost.
+    """
+    sys.stdout.flush()
+    if mode == "exit":
+        print("→ Exiting so the supervisor restarts the worker")
+        sys.stdout.flush()
+        os._exit(75)
+    print("→ Restarting process to release memory")
+    sys.stdout.flush()
+    time.sleep(1)
+    os.execv(sys.executable, [sys.executable] + sys.argv)
@@ -1,39 +1,81 @@
 import random
+import signal
+import threading
 import time
 from datetime import datetime
 
 import requests
 
 from .attendance_fetcher import AttendanceFetcher
-from .auth import SessionManager, TokenManager
+from .auth import CredentialRefresher, SessionManager, TokenManager
 from .config import Config
+from .debounce import ChangeDebouncer
+from .dedup import SharedContent
+from . import metrics
 from .discord_notifier import DiscordNotifier
 from .llm_client import LLMClient
 from .news_fetcher import NewsFetcher
 from .notification_fetcher import NotificationFetcher
 from .notifier import CompositeNotifier
+from .profiling import CycleProfiler
 from .pupil_fetcher import PupilFetcher
+from .resource_guard import ResourceGuard, restart_process
 from .schedule_fetcher import ScheduleFetcher
 from .storage import StorageManager
 from .telegram_notifier import TelegramNotifier
+from .tracing import tracer
 
 
 class InfoMentorFetcher:
     def __init__(self):
         self.config = Config()
+        tracer.configure(self.config.trace_log, self.config.trace_summary)
         self.session = requests.Session()
+        self.session.hooks["response"].append(tracer.response_hook)
+        self.session.hooks["response"].append(metrics.response_hook)
+        tracer.add_listener(metrics.observe_span)
+        self.metrics_server = None
+        # Set by `cli.py fetch --profile` or toggled with SIGUSR1
+        self.profiler = None
+        self.profile_toggle_requested = False
+        # Set by SIGUSR1 to cut the sleep between cycles short
+        self.wakeup = threading.Event()
+        self.resource_guard = ResourceGuard(
+            max_rss_mb=self.config.max_rss_mb,
+            rebuild_every=self.config.session_rebuild_cycles,
+        )
 
         self.token_manager = TokenManager(
             self.config.token_file, self.config.auth_base_url
         )
         self.session_manager = SessionManager(
-            self.token_manager, self.session, self.config.api_base_url
+            self.token_manager,
+            self.session,
+            self.config.api_base_url,
+            sso_mode=self.config.sso_mode,
+            web_session_max_age=self.config.web_session_max_age,
+            hub_base_url=self.config.hub_base_url,
         )
+        metrics.track_hosts(
+            self.config.api_base_url, self.config.auth_base_url, self.config.hub_base_url, self.token_manager.auth_base_url
+        )
+        self.credential_refresher = None
         self.storage_manager = StorageManager(
             self.config.output_dir, self.config.files_dir
         )
         self.llm_client = LLMClient(
-            self.config.perplexity_api_key, self.config.gemini_api_key
+            self.config.perplexity_api_key,
+            self.config.gemini_api_key,
+            batch_size=self.config.llm_batch_size,
+            max_concurrency=self.config.llm_concurrency,
+            rate_limits=self.config.llm_rate_limits,
+            hedge=self.config.llm_hedge,
+            max_input_tokens=self.config.llm_max_input_tokens,
+            local_min_confidence=self.config.local_min_confidence,
+            perplexity_base_url=self.config.perplexity_base_url,
+            gemini_base_url=self.config.gemini_base_url,
+            fixtures_dir=self.config.llm_fixtures_dir,
+            fixtures_mode=self.config.llm_fixtures_mode,
         )
 
         notifiers = []
@@ -50,18 +92,35 @@ class InfoMentorFetcher:
         print(f"Initialized {len(notifiers)} notification channels: " + 
               ", ".join([n.__class__.__name__ for n in notifiers]))
 
+        self.shared = SharedContent(
+            self.storage_manager,
+            retention_days=self.config.shared_retention_days,
+            hash_window=self.config.shared_hash_window,
+        )
         self.news_fetcher = NewsFetcher(
             self.session,
             self.storage_manager,
             self.notifier,
             self.llm_client,
             self.config.files_dir,
+            shared=self.shared,
         )
+        self.debouncer = ChangeDebouncer(self.config.change_settle_seconds)
         self.schedule_fetcher = ScheduleFetcher(
-            self.session, self.storage_manager, self.notifier
+            self.session,
+            self.storage_manager,
+            self.notifier,
+            weeks=self.config.schedule_weeks,
+            diff_fields=self.config.schedule_diff_fields,
+            debouncer=self.debouncer,
         )
         self.attendance_fetcher = AttendanceFetcher(
-            self.session, self.storage_manager, self.notifier
+            self.session,
+            self.storage_manager,
+            self.notifier,
+            debouncer=self.debouncer,
+            lookback_days=self.config.attendance_lookback_days,
+            range_request=self.config.attendance_range_request,
         )
         self.notification_fetcher = NotificationFetcher(
             self.session,
@@ -69,30 +128,127 @@ class InfoMentorFetcher:
             self.notifier,
             self.llm_client,
             self.news_fetcher,
+            recent_window=self.config.notification_recent_ids,
+            shared=self.shared,
         )
         self.pupil_fetcher = PupilFetcher(
-            self.session, self.storage_manager
+            self.session, self.storage_manager, cache_ttl=self.config.pupil_cache_ttl
         )
 
     def fetch_and_process(self):
         """Fetch and save all data (news, schedule, notifications)"""
+        # Keep the background refresher from swapping cookies mid-cycle
+        with self.session_manager.lock:
+            self.apply_profile_toggle()
+            if self.profiler is not None:
+                self.profiler.run(self.run_cycle)
+            else:
+                self.run_cycle()
+
+    def run_cycle(self):
+        tracer.start_cycle()
+        try:
+            with tracer.span("cycle"):
+                self._fetch_and_process()
+        finally:
+            tracer.end_cycle()
+
+    def replace_session(self, session):
+        """Swap the shared HTTP session in every component"""
+        with self.session_manager.lock:
+            self.session = session
+            self.session_manager.session = session
+            for fetcher in (
+                self.news_fetcher,
+                self.schedule_fetcher,
+                self.attendance_fetcher,
+                self.notification_fetcher,
+                self.pupil_fetcher,
+            ):
+                fetcher.session = session
+
+    def check_resources(self):
+        """Prune cookies, recycle the session and restart above the memory ceiling"""
+        try:
+            with self.session_manager.lock:
+                restart = self.resource_guard.check(self)
+        except Exception as e:
+            print(f"  ⚠ Resource check failed: {e}")
+            return
+        if restart:
+            if self.credential_refresher:
+                self.credential_refresher.stop()
+            if self.metrics_server:
+                self.metrics_server.stop()
+            restart_process(self.config.restart_mode)
+
+    def toggle_profiling(self):
+        if self.profiler is None:
+            self.profiler = CycleProfiler(
+                self.config.profile_dir, self.config.profile_mode, cycles=0
+            )
+        self.profiler.toggle()
+
+    def apply_profile_toggle(self):
+        if self.profile_toggle_requested:
+            self.profile_toggle_requested = False
+            self.toggle_profiling()
+
+    def handle_profile_signal(self, signum, frame):
+        # Only flag it here and wake the sleep; the toggle happens between cycles
+        self.profile_toggle_requested = True
+        self.wakeup.set()
+        print("→ SIGUSR1 received, toggling profiling")
+
+    def sleep_until_next_cycle(self, sleep_time):
+        """
+        Sleep between cycles. SIGUSR1 wakes it: turning profiling off applies
+        right away, turning it on ends the sleep so a profiled cycle runs now.
+        """
+        deadline = time.monotonic() + sleep_time
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.wakeup.wait(remaining):
+                return
+            self.wakeup.clear()
+            self.apply_profile_toggle()
+            if self.profiler is not None and self.profiler.active:
+                print("→ Starting a profiled cycle now")
+                return
+
+    def _fetch_and_process(self):
         print(f"\n{'='*60}")
         print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - Starting fetch cycle")
         print(f"{'='*60}")
 
         # Validate and refresh token if needed
-        if not self.token_manager.validate_and_refresh_token():
+        with tracer.span("auth.token") as span:
+            token_ok = self.token_manager.validate_and_refresh_token(
+                self.config.credential_refresh_margin
+            )
+            if not token_ok:
+                span.fail()
+        if not token_ok:
+            tracer.fail("token validation failed")
             print("\n✗ ABORTING: Token validation failed")
             self.notifier.send_error("Token Validation", "Failed to validate or refresh token.")
             return
 
-        # Establish web session using SSO
-        if not self.session_manager.establish_web_session():
+        # Reuse the web session if it is still healthy, otherwise run SSO
+        with tracer.span("auth.web_session") as span:
+            session_ok = self.session_manager.ensure_web_session(
+                self.config.credential_refresh_margin
+            )
+            if not session_ok:
+                span.fail()
+        if not session_ok:
+            tracer.fail("web session failed")
             print("\n✗ ABORTING: Could not establish web session")
             self.notifier.send_error("Web Session Establishment", "Failed to establish web session via SSO.")
             return
 
         # Update components with web base url
+        metrics.track_hosts(self.session_manager.web_base_url)
         self.news_fetcher.set_web_base_url(self.session_manager.web_base_url)
         self.news_fetcher.use_bearer_token = self.session_manager.use_bearer_token
         self.schedule_fetcher.web_base_url = self.session_manager.web_base_url
@@ -102,7 +258,9 @@ class InfoMentorFetcher:
 
         # 1. Fetch pupils initially to know who we're dealing with
         try:
-            pupils = self.pupil_fetcher.process_pupils()
+            with tracer.span("pupils") as span:
+                pupils = self.pupil_fetcher.process_pupils()
+                span.add("items", len(pupils or []))
             if not pupils:
                 print("  ⚠ No pupils found, nothing to process.")
                 return
@@ -111,11 +269,52 @@ class InfoMentorFetcher:
             self.notifier.send_error("Initial Pupil List Fetch", e)
             return
 
-        # 2. Iterate over each pupil
+        # 2. Iterate over each pupil; posts shared between siblings go out once at the end
+        try:
+            # Notifications a crash or failed cycle left in the outbox go out with this cycle's
+            self.shared.replay(
+                {"news": self.news_fetcher.redeliver, "notification": self.notification_fetcher.redeliver}
+            )
+            self.process_each_pupil(pupils)
+        finally:
+            with tracer.span("deliver"):
+                self.shared.flush()
+
+        print(f"\n{'='*60}\n")
+
+    def switch_pupil(self, pupil_id, switch_url):
+        with tracer.span("pupil.switch", pupil_id=pupil_id) as span:
+            switched = self.session_manager.switch_pupil(switch_url)
+            if not switched:
+                span.fail()
+        return switched
+
+    def refresh_pupils(self):
+        """
+        Re-read the pupil list after a failed switch; returns {pupil id: Pupil},
+        or None when the list was already fresh or could not be fetched
+        """
+        if not self.pupil_fetcher.from_cache:
+            return None
+        print("  → Switch URL may be stale, re-reading the pupil list")
+        self.pupil_fetcher.invalidate()
+        with tracer.span("pupils") as span:
+            pupils = self.pupil_fetcher.process_pupils()
+            span.add("items", len(pupils or []))
+        if not pupils:
+            return None
+        return {str(pupil.id): pupil for pupil in pupils}
+
+    def process_each_pupil(self, pupils):
+        """Switch to each pupil in turn and run the fetchers"""
+        # Pupils from a list re-read this cycle, once a cached switch URL failed
+        fresh = None
         for i, pupil in enumerate(pupils):
-            pupil_name = pupil.get("name", f"Pupil {i+1}")
-            pupil_id = pupil.get("id")
-            switch_url = pupil.get("switch_url") or pupil.get("switchPupilUrl")
+            if fresh is not None:
+                pupil = fresh.get(str(pupil.id), pupil)
+            pupil_name = pupil.name or f"Pupil {i+1}"
+            pupil_id = pupil.id
+            switch_url = pupil.switch_url
 
             print(f"\n--- Processing Pupil: {pupil_name} (ID: {pupil_id}) ---")
 
@@ -131,44 +330,55 @@ class InfoMentorFetcher:
 
             # Switch context if needed
             if switch_url:
-                if not self.session_manager.switch_pupil(switch_url):
+                switched = self.switch_pupil(pupil_id, switch_url)
+                if not switched and fresh is None:
+                    # A cached switch URL may be stale; re-read the list and retry once
+                    fresh = self.refresh_pupils() or {}
+                    retry_url = fresh[str(pupil_id)].switch_url if str(pupil_id) in fresh else None
+                    if retry_url:
+                        switched = self.switch_pupil(pupil_id, retry_url)
+                if not switched:
                     print(f"  ✗ Skipping {pupil_name} due to switch failure")
+                    # Re-read the pupil list next cycle
+                    self.pupil_fetcher.invalidate()
                     continue
             else:
                 print(f"  ⚠ No switch URL for {pupil_name}, proceeding with current context")
 
             # Process News
             try:
-                self.news_fetcher.process_news(
-                    access_token=self.token_manager.get_access_token()
-                )
+                with tracer.span("news", pupil_id=pupil_id):
+                    self.news_fetcher.process_news(
+                        access_token=self.token_manager.get_access_token()
+                    )
             except Exception as e:
                 print(f"  ✗ ERROR processing news for {pupil_name}: {e}")
                 self.notifier.send_error(f"Processing News ({pupil_name})", e)
 
             # Process Schedule
             try:
-                self.schedule_fetcher.process_schedule()
+                with tracer.span("schedule", pupil_id=pupil_id):
+                    self.schedule_fetcher.process_schedule()
             except Exception as e:
                 print(f"  ✗ ERROR processing schedule for {pupil_name}: {e}")
                 self.notifier.send_error(f"Processing Schedule ({pupil_name})", e)
 
             # Process Attendance
             try:
-                self.attendance_fetcher.process_attendance()
+                with tracer.span("attendance", pupil_id=pupil_id):
+                    self.attendance_fetcher.process_attendance()
             except Exception as e:
                 print(f"  ✗ ERROR processing attendance for {pupil_name}: {e}")
                 self.notifier.send_error(f"Processing Attendance ({pupil_name})", e)
 
             # Process Notifications
             try:
-                self.notification_fetcher.process_notifications()
+                with tracer.span("notifications", pupil_id=pupil_id):
+                    self.notification_fetcher.process_notifications()
             except Exception as e:
                 print(f"  ✗ ERROR processing notifications for {pupil_name}: {e}")
                 self.notifier.send_error(f"Processing Notifications ({pupil_name})", e)
 
-        print(f"\n{'='*60}\n")
-
     def run(self, base_interval=1800):
         """
         Run fetcher on schedule
@@ -176,6 +386,28 @@ class InfoMentorFetcher:
         """
         print(f"Starting InfoMentor fetcher (every ~{base_interval//60} min)\n")
 
+        if self.config.metrics_port:
+            try:
+                self.metrics_server = metrics.MetricsServer(
+                    self.config.metrics_host,
+                    self.config.metrics_port,
+                    max_age=self.config.healthz_max_age or base_interval * 2,
+                    storage={"news": self.config.output_dir, "files": self.config.files_dir},
+                )
+                self.metrics_server.start()
+            except OSError as e:
+                print(f"⚠ Could not start metrics server: {e}")
+
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, self.handle_profile_signal)
+
+        self.credential_refresher = CredentialRefresher(
+            self.token_manager,
+            self.session_manager,
+            margin=self.config.credential_refresh_margin,
+        )
+        self.credential_refresher.start()
+
         while True:
             try:
                 self.fetch_and_process()
@@ -183,6 +415,8 @@ class InfoMentorFetcher:
                 print(f"  ✗ CRITICAL ERROR in run loop: {e}")
                 self.notifier.send_error("Main Run Loop", e)
 
+            self.check_resources()
+
             # Add 1/15 variation converted to int
             vari = base_interval // 15
             variation = random.randint(-vari, vari)
@@ -192,4 +426,4 @@ class InfoMentorFetcher:
             next_time = datetime.fromtimestamp(next_run).strftime("%H:%M:%S")
             print(f"Next fetch at {next_time} ({sleep_time}s)\n")
 
-            time.sleep(sleep_time)
+            self.sleep_until_next_cycle(sleep_time)
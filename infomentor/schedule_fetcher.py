@@ -1,17 +1,53 @@
 from datetime import datetime, timedelta
+from operator import attrgetter
 
 import requests
 
+from .debounce import ChangeDebouncer
+from .models import ScheduleEntry
+from .tracing import tracer
+
+# ScheduleEntry attributes compared between snapshots unless configured otherwise
+DEFAULT_DIFF_FIELDS = ("title", "start", "end", "description")
+
 
 class ScheduleFetcher:
-    def __init__(self, session: requests.Session, storage_manager, notifier):
+    def __init__(
+        self,
+        session: requests.Session,
+        storage_manager,
+        notifier,
+        weeks=1,
+        diff_fields=None,
+        debouncer=None,
+    ):
         self.session = session
         self.storage_manager = storage_manager
         self.notifier = notifier
+        # Number of Sunday-Saturday weeks fetched, starting with the current one
+        self.weeks = max(1, weeks)
+        self.diff_fields = self.validate_diff_fields(diff_fields or DEFAULT_DIFF_FIELDS)
+        # Values of the compared fields; entries with equal keys are unchanged
+        self.compare_key = attrgetter(*self.diff_fields)
+        # (pupil_id, week) -> {entry id: ScheduleEntry} of the stored snapshot
+        self.index = {}
+        # Holds changes back until they stop flapping (no-op without a settle window)
+        self.debouncer = debouncer or ChangeDebouncer()
         self.web_base_url: str | None = "https://hub.infomentor.se"
         self.pupil_name = None
         self.pupil_id = None
 
+    def validate_diff_fields(self, fields):
+        known = {attr for attr, _ in ScheduleEntry.json_fields()} - {"id"}
+        unknown = [field for field in fields if field not in known]
+        if unknown:
+            print(f"  ⚠ Ignoring unknown schedule diff fields: {', '.join(unknown)}")
+        return tuple(field for field in fields if field in known) or DEFAULT_DIFF_FIELDS
+
+    def index_entries(self, entries):
+        """Map entries by ID"""
+        return {entry.id: entry for entry in entries}
+
     def get_current_week_dates(self):
         """Get start (Sunday) and end (Saturday) dates for the current week"""
         today = datetime.now().date()
@@ -24,11 +60,34 @@ class ScheduleFetcher:
         end_date = start_date + timedelta(days=6)
         return start_date, end_date
 
+    def get_week_starts(self):
+        """Sunday start dates of the weeks in the horizon"""
+        start_date, _ = self.get_current_week_dates()
+        return [start_date + timedelta(weeks=i) for i in range(self.weeks)]
+
+    def split_by_week(self, entries, week_starts):
+        """
+        Group entries by the week they start in. Entries starting before or
+        after the horizon (multi-day events) go to the first or last week,
+        entries without a parseable start to the first.
+        """
+        weeks = {start: [] for start in week_starts}
+        first, last = week_starts[0], week_starts[-1]
+        for entry in entries:
+            try:
+                day = datetime.strptime((entry.start or "")[:10], "%Y-%m-%d").date()
+            except ValueError:
+                day = first
+            index = (day - first).days // 7
+            weeks[week_starts[min(max(index, 0), len(week_starts) - 1)]].append(entry)
+        return weeks
+
     def fetch_schedule(self):
-        """Fetch the schedule for the current week"""
+        """Fetch the schedule for all weeks in the horizon in one request"""
         print("\n[Schedule] Fetching schedule...")
 
-        start_date, end_date = self.get_current_week_dates()
+        start_date, _ = self.get_current_week_dates()
+        end_date = start_date + timedelta(weeks=self.weeks, days=-1)
         start_str = start_date.strftime("%Y/%m/%d")
         end_str = end_date.strftime("%Y/%m/%d")
 
@@ -60,38 +119,66 @@ class ScheduleFetcher:
             response = self.session.post(url, headers=headers, json=data, timeout=30)
 
             if response.status_code == 200:
-                schedule_data = response.json()
+                # Becomes the stored baseline, which is written back whole
+                schedule_data = ScheduleEntry.parse_list(response.json(), keep_raw=True)
                 print(f"  ✓ Successfully fetched {len(schedule_data)} schedule entries")
                 return schedule_data
             else:
                 print(
                     f"  ✗ ERROR: Schedule endpoint returned status {response.status_code}"
                 )
+                tracer.fail(f"status {response.status_code}")
                 return None
         except Exception as e:
             print(f"  ✗ ERROR: Error fetching schedule: {e}")
+            tracer.fail(e)
             self.notifier.send_error("Fetching Schedule", e)
             return None
 
     def process_schedule(self):
-        """Fetch, compare, and notify about schedule"""
-        current_schedule = self.fetch_schedule()
+        """Fetch, compare, and notify about each week in the horizon"""
+        with tracer.span("schedule.fetch") as span:
+            current_schedule = self.fetch_schedule()
+            span.add("items", len(current_schedule or []))
         if current_schedule is None:
             return
 
-        start_date, _ = self.get_current_week_dates()
-        week_str = start_date.strftime("%Y-%m-%d")
+        week_starts = self.get_week_starts()
+        weeks = self.split_by_week(current_schedule, week_starts)
+        for i, week_start in enumerate(week_starts):
+            self.process_week(
+                week_start.strftime("%Y-%m-%d"), weeks[week_start], is_current=i == 0
+            )
+
+        # Weeks that left the horizon are not compared again
+        horizon = {week_start.strftime("%Y-%m-%d") for week_start in week_starts}
+        for key in [key for key in self.index if key[0] == self.pupil_id and key[1] not in horizon]:
+            del self.index[key]
+            self.debouncer.clear(("schedule",) + key)
+
+    def process_week(self, week_str, current_schedule, is_current=True):
+        """Compare one week's snapshot against its stored state and notify"""
+        if self.weeks > 1:
+            print(f"  [Week of {week_str}]")
 
-        # Load previous schedule for this week
-        previous_schedule = self.storage_manager.load_schedule(
-            week_str, pupil_id=self.pupil_id
-        )
+        current_map = self.index_entries(current_schedule)
+
+        # Previous snapshot of this week, from the index or (first time) storage
+        key = (self.pupil_id, week_str)
+        previous_map = self.index.get(key)
+        if previous_map is None:
+            with tracer.span("schedule.load_state", week=week_str):
+                previous_schedule = self.storage_manager.load_schedule(
+                    week_str, pupil_id=self.pupil_id
+                )
+            if previous_schedule is not None:
+                previous_map = self.index[key] = self.index_entries(previous_schedule)
 
         today = datetime.now().date()
         is_sunday = today.weekday() == 6
 
-        # If it's Sunday, we always post the full schedule
-        if is_sunday:
+        # If it's Sunday, we always post the full schedule of the current week
+        if is_sunday and is_current:
             # Check if we already posted today to avoid spamming if script restarts
             last_sunday_post = self.storage_manager.get_last_sunday_post(
                 pupil_id=self.pupil_id
@@ -101,73 +188,114 @@ class ScheduleFetcher:
                 self.notifier.send_schedule_update(
                     current_schedule, week_str, is_new_week=True, pupil_name=self.pupil_name
                 )
-                self.storage_manager.save_schedule(
-                    week_str, current_schedule, pupil_id=self.pupil_id
-                )
+                self.save_week(week_str, current_schedule, current_map)
+                self.debouncer.clear(("schedule",) + key)
                 self.storage_manager.set_last_sunday_post(
                     today.strftime("%Y-%m-%d"), pupil_id=self.pupil_id
                 )
                 return
 
         # If we have a previous schedule, check for changes
-        if previous_schedule:
-            changes = self.detect_changes(previous_schedule, current_schedule)
+        if previous_map is not None:
+            with tracer.span("schedule.diff", week=week_str) as span:
+                changes = self.diff_indexed(previous_map, current_map)
+                changes = self.settled_changes(("schedule",) + key, changes)
+                span.add("items", len(changes))
             if changes:
                 print(f"  → Found {len(changes)} changes in schedule")
+                if self.debouncer.has_pending(("schedule",) + key):
+                    # Only settled changes move the baseline, the rest stay pending
+                    baseline = self.apply_changes(previous_map, changes)
+                else:
+                    baseline = current_map
                 self.notifier.send_schedule_update(
-                    current_schedule, week_str, changes=changes, pupil_name=self.pupil_name
-                )
-                self.storage_manager.save_schedule(
-                    week_str, current_schedule, pupil_id=self.pupil_id
+                    list(baseline.values()), week_str, changes=changes, pupil_name=self.pupil_name
                 )
-            else:
+                with tracer.span("schedule.persist", week=week_str):
+                    self.save_week(week_str, list(baseline.values()), baseline)
+            elif not self.debouncer.has_pending(("schedule",) + key):
                 print("  → No changes in schedule")
         else:
             # First time seeing this week's schedule (and not Sunday), save it
             print("  → New week detected (or first run), saving baseline.")
-            self.storage_manager.save_schedule(
-                week_str, current_schedule, pupil_id=self.pupil_id
-            )
+            self.save_week(week_str, current_schedule, current_map)
+
+    def settled_changes(self, scope, changes):
+        """The changes that have been stable for the debouncer's settle window"""
+        signatures = {
+            change["entry"].id: (change["type"], self.compare_key(change["entry"])) for change in changes
+        }
+        ready = self.debouncer.settle(scope, signatures)
+        return [change for change in changes if change["entry"].id in ready]
+
+    def apply_changes(self, baseline, changes):
+        """A copy of the baseline snapshot with the given changes applied"""
+        updated = dict(baseline)
+        for change in changes:
+            entry = change["entry"]
+            if change["type"] == "removed":
+                updated.pop(entry.id, None)
+            else:
+                updated[entry.id] = entry
+        return updated
+
+    def save_week(self, week_str, schedule, entry_map):
+        """Persist a week's snapshot and make it the indexed baseline"""
+        if self.storage_manager.save_schedule(week_str, schedule, pupil_id=self.pupil_id):
+            self.index[(self.pupil_id, week_str)] = entry_map
 
     def detect_changes(self, old_schedule, new_schedule):
         """Compare two schedules and return list of changes"""
-        # Convert to dicts keyed by ID for easier comparison
-        old_map = {entry["id"]: entry for entry in old_schedule}
-        new_map = {entry["id"]: entry for entry in new_schedule}
+        return self.diff_indexed(self.index_entries(old_schedule), self.index_entries(new_schedule))
 
+    def diff_indexed(self, old_map, new_map):
+        """
+        Compare two {id: entry} snapshots. Entries whose compared fields are
+        equal are skipped; only the others get a field-level diff.
+        """
         changes = []
+        compare_key = self.compare_key
 
         # Check for modified or new entries
         for id, new_entry in new_map.items():
-            if id not in old_map:
+            old_entry = old_map.get(id)
+            if old_entry is None:
                 changes.append({"type": "added", "entry": new_entry})
-            else:
-                old_entry = old_map[id]
-                # Compare relevant fields
-                diffs = []
-                if old_entry.get("title") != new_entry.get("title"):
-                    diffs.append(
-                        f"Title: {old_entry.get('title')} -> {new_entry.get('title')}"
-                    )
-                if old_entry.get("startDateFull") != new_entry.get("startDateFull"):
-                    diffs.append(
-                        f"Start: {old_entry.get('formattedStartDate')} {old_entry.get('startTime')} -> {new_entry.get('formattedStartDate')} {new_entry.get('startTime')}"
-                    )
-                if old_entry.get("endDateFull") != new_entry.get("endDateFull"):
-                    diffs.append(
-                        f"End: {old_entry.get('formattedEndDate')} {old_entry.get('endTime')} -> {new_entry.get('formattedEndDate')} {new_entry.get('endTime')}"
-                    )
-                if old_entry.get("description") != new_entry.get("description"):
-                    diffs.append("Description changed")
-
+            elif compare_key(old_entry) != compare_key(new_entry):
+                diffs = self.diff_fields_of(old_entry, new_entry)
                 if diffs:
                     changes.append(
                         {"type": "modified", "entry": new_entry, "diffs": diffs}
                     )
 
         # Check for removed entries
-        for id, old_entry in old_map.items():
-            if id not in new_map:
-                changes.append({"type": "removed", "entry": old_entry})
+        if len(old_map) + sum(change["type"] == "added" for change in changes) != len(new_map):
+            for id, old_entry in old_map.items():
+                if id not in new_map:
+                    changes.append({"type": "removed", "entry": old_entry})
 
         return changes
+
+    def diff_fields_of(self, old_entry, new_entry):
+        """Human-readable differences in the compared fields"""
+        diffs = []
+        for field in self.diff_fields:
+            old_value = getattr(old_entry, field)
+            new_value = getattr(new_entry, field)
+            if old_value == new_value:
+                continue
+            if field == "title":
+                diffs.append(f"Title: {old_value} -> {new_value}")
+            elif field == "start":
+                diffs.append(
+                    f"Start: {old_entry.start_date} {old_entry.start_time} -> {new_entry.start_date} {new_entry.start_time}"
+                )
+            elif field == "end":
+                diffs.append(
+                    f"End: {old_entry.end_date} {old_entry.end_time} -> {new_entry.end_date} {new_entry.end_time}"
+                )
+            elif field == "description":
+                diffs.append("Description changed")
+            else:
+                diffs.append(f"{field.replace('_', ' ').capitalize()}: {old_value} -> {new_value}")
+        return diffs
@@ -0,0 +1,5 @@
+from .hub_server import HubStandIn  # noqa: F401
+from .llm_server import LLMStandIn  # noqa: F401
+from .webhook_server import WebhookStandIn  # noqa: F401
+
+__all__ = ['HubStandIn', 'LLMStandIn', 'WebhookStandIn']
@@ -0,0 +1,435 @@
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SESSION_COOKIE = "standin_session"
+PUPIL_COOKIE = "standin_pupil"
+
+_FIRST_NAMES = ["Alva", "Elsa", "Maja", "Astrid", "Vera", "Hugo", "Liam", "Noah", "Oscar", "William"]
+_SUBJECTS = ["Matematik", "Svenska", "Engelska", "Idrott", "Bild", "Musik", "NO", "SO", "Slöjd"]
+_NEWS_TOPICS = [
+    ("Utflykt", "Vi åker till skogen på fredag den {day}/{month} kl 8:30-14:00. Ta med matsäck och oömma kläder."),
+    ("Föräldramöte", "Välkomna på föräldramöte v. {week} på tisdag kl. 18.00-19.30 i matsalen."),
+    ("Studiedag", "Skolan är stängd för studiedag {day}/{month}. Fritids har öppet för anmälda barn."),
+    ("Veckobrev", "Denna vecka har vi arbetat med bråk i matematiken och läst högt i svenskan."),
+]
+_REGISTRATION_TYPES = ["Närvarande", "Sjukanmäld", "Sen ankomst", "Ledig"]
+
+
+class HubStandIn:
+    """
+    Local HTTP server implementing the InfoMentor hub and API endpoints the
+    fetchers use, serving seeded synthetic data for a configurable number of
+    pupils and items, with injectable latency and failures. Serves the API
+    (SSO, token refresh) and the hub from the same origin.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        pupils=2,
+        news_per_pupil=20,
+        notifications_per_pupil=20,
+        attendance_per_pupil=50,
+        entries_per_day=6,
+        shared_news=0,
+        content_chars=1500,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        seed=0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.entries_per_day = entries_per_day
+        self.content_chars = content_chars
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sessions = set()
+        self.stats = {}
+
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+        self._next_id = 1000
+        self.pupils = [
+            {"id": str(100 + i), "name": f"{_FIRST_NAMES[i % len(_FIRST_NAMES)]} {i + 1}"}
+            for i in range(pupils)
+        ]
+        self.news = {p["id"]: [] for p in self.pupils}
+        self.notifications = {p["id"]: [] for p in self.pupils}
+        self.messages = {}
+        self.attendance = {p["id"]: [] for p in self.pupils}
+
+        for pupil in self.pupils:
+            self.add_news(pupil["id"], news_per_pupil)
+            self.add_notifications(pupil["id"], notifications_per_pupil, backdate=True)
+            self.add_attendance(pupil["id"], attendance_per_pupil)
+        if shared_news:
+            self.add_shared_news(shared_news)
+
+    # --- Server lifecycle ---
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve in a background thread and return the base URL"""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def serve_forever(self):
+        print(f"Hub stand-in listening on {self.base_url}")
+        print(f"  → {len(self.pupils)} pupils: " + ", ".join(p["name"] for p in self.pupils))
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+
+    def write_token_file(self, path):
+        """Write a token file that authenticates against this stand-in"""
+        data = {
+            "tokens": {
+                "access_token": uuid.uuid4().hex,
+                "refresh_token": uuid.uuid4().hex,
+                "expires_in": 3600,
+                "token_type": "Bearer",
+            },
+            "saved_at": time.time(),
+            "auth_base_url": self.base_url,
+            "api_base_url": self.base_url,
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, indent=4)
+        return path
+
+    # --- Synthetic data ---
+
+    def new_id(self):
+        with self.lock:
+            self._next_id += 1
+            return self._next_id
+
+    def _content(self, template):
+        today = date.today() + timedelta(days=self.random.randint(1, 20))
+        text = template.format(day=today.day, month=today.month, week=today.isocalendar()[1])
+        paragraphs = [f'<p style="font-family: Arial"><span>{text}</span></p>']
+        filler = "Vi fortsätter arbeta med läsförståelse och samarbete i klassen. "
+        while sum(len(p) for p in paragraphs) < self.content_chars:
+            paragraphs.append(f"<p>{filler * self.random.randint(1, 4)}</p>")
+        paragraphs.append("<p>Med vänliga hälsningar<br>Klassläraren</p>")
+        return "".join(paragraphs)
+
+    def _news_item(self, published=None):
+        news_id = self.new_id()
+        title, template = self.random.choice(_NEWS_TOPICS)
+        published = published or datetime.now() - timedelta(days=self.random.randint(0, 60))
+        attachments = []
+        if self.random.random() < 0.3:
+            attachments.append({"url": f"Resources/Resource/Download/{news_id}", "title": f"bilaga_{news_id}.pdf"})
+        return {
+            "id": news_id,
+            "title": f"{title} {news_id}",
+            "content": self._content(template),
+            "publishedDateString": published.strftime("%Y-%m-%d"),
+            "publishedBy": "Klassläraren",
+            "attachments": attachments,
+        }
+
+    def add_news(self, pupil_id, count=1):
+        """Publish `count` new news items for a pupil; returns them"""
+        items = [self._news_item(datetime.now()) for _ in range(count)]
+        with self.lock:
+            self.news[pupil_id] = items + self.news[pupil_id]
+        return items
+
+    def add_shared_news(self, count=1):
+        """Publish school-wide items that every pupil sees (same id and content)"""
+        items = [self._news_item(datetime.now()) for _ in range(count)]
+        with self.lock:
+            for pupil in self.pupils:
+                self.news[pupil["id"]] = items + self.news[pupil["id"]]
+        return items
+
+    def add_notifications(self, pupil_id, count=1, backdate=False):
+        """Publish `count` notifications sent now (or, for seeding, over the past month)"""
+        created = []
+        for i in range(count):
+            notif_id = self.new_id()
+            sent = datetime.now()
+            if backdate:
+                sent -= timedelta(minutes=self.random.randint(0, 60 * 24 * 30))
+            if i % 2 == 0 and self.news[pupil_id]:
+                target = self.random.choice(self.news[pupil_id])
+                url = f"/Communication/News/{target['id']}"
+                title = "Ny nyhet"
+            else:
+                message_id = self.new_id()
+                self.messages[message_id] = {
+                    "id": message_id,
+                    "title": f"Meddelande {message_id}",
+                    "body": self._content("Hej! Kom ihåg att lämna in blanketten senast fredag den {day}/{month}."),
+                    "publishedDateString": sent.strftime("%Y-%m-%d"),
+                    "publishedBy": "Mentor",
+                }
+                url = f"/Message/Show/{message_id}"
+                title = "Nytt meddelande"
+            created.append(
+                {
+                    "id": notif_id,
+                    "title": title,
+                    "subTitle": f"Notis {notif_id}",
+                    "dateSent": sent.strftime("%Y-%m-%d %H:%M"),
+                    "url": url,
+                    "pupilSourceId": None,
+                    "pupilIM2Id": int(pupil_id),
+                }
+            )
+        with self.lock:
+            self.notifications[pupil_id] = created + self.notifications[pupil_id]
+        return created
+
+    def add_attendance(self, pupil_id, count=1):
+        created = []
+        for _ in range(count):
+            day = date.today() - timedelta(days=self.random.randint(0, 180))
+            hour = self.random.randint(8, 14)
+            created.append(
+                {
+                    "dateString": day.strftime("%Y-%m-%d"),
+                    "lessonName": self.random.choice(_SUBJECTS),
+                    "registrationTypeName": self.random.choice(_REGISTRATION_TYPES),
+                    "startTime": f"{hour:02d}:00",
+                    "comment": "",
+                }
+            )
+        with self.lock:
+            self.attendance[pupil_id] = created + self.attendance[pupil_id]
+        return created
+
+    def schedule_entries(self, pupil_id, start, end):
+        """Deterministic lessons for every weekday in [start, end]"""
+        entries = []
+        day = start
+        while day <= end:
+            if day.weekday() < 5:
+                for slot in range(self.entries_per_day):
+                    hour = 8 + slot
+                    begin = datetime.combine(day, datetime.min.time()).replace(hour=hour)
+                    finish = begin + timedelta(minutes=50)
+                    entries.append(
+                        {
+                            "id": int(f"{pupil_id}{day.strftime('%Y%m%d')}{slot:02d}"),
+                            "title": _SUBJECTS[(day.toordinal() + slot) % len(_SUBJECTS)],
+                            "startDateFull": begin.strftime("%Y-%m-%dT%H:%M:%S"),
+                            "endDateFull": finish.strftime("%Y-%m-%dT%H:%M:%S"),
+                            "formattedStartDate": day.strftime("%a %d %b"),
+                            "formattedEndDate": day.strftime("%a %d %b"),
+                            "startTime": begin.strftime("%H:%M"),
+                            "endTime": finish.strftime("%H:%M"),
+                            "description": "",
+                        }
+                    )
+            day += timedelta(days=1)
+        return entries
+
+    def root_page(self):
+        pupils = [
+            {
+                "id": p["id"],
+                "name": p["name"],
+                "switchPupilUrl": f"{self.base_url}/Account/PupilSwitcher/SwitchPupil/{p['id']}",
+            }
+            for p in self.pupils
+        ]
+        filler = "<div class='tile'>" + "Lorem ipsum dolor sit amet. " * 20 + "</div>\n"
+        return (
+            "<!DOCTYPE html><html><head><title>InfoMentor Hub</title>"
+            "<script src='/static/app.js'></script></head><body>\n"
+            + filler * 50
+            + "<script>\nvar IMHome = {\"culture\": \"sv-SE\", \"pupils\": "
+            + json.dumps(pupils, ensure_ascii=False)
+            + ", \"version\": \"standin\"};\n</script>\n"
+            + filler * 50
+            + "</body></html>"
+        )
+
+    # --- Request handling ---
+
+    def _record(self, endpoint):
+        with self.lock:
+            self.stats[endpoint] = self.stats.get(endpoint, 0) + 1
+            roll = self.random.random()
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+        return roll < self.error_rate
+
+    def _make_handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def cookies(self):
+                cookie = SimpleCookie(self.headers.get("Cookie", ""))
+                return {key: morsel.value for key, morsel in cookie.items()}
+
+            def send_body(self, status, body, content_type="application/json", headers=None):
+                data = body if isinstance(body, bytes) else body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in headers or []:
+                    self.send_header(key, value)
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(data)
+
+            def send_json(self, body, status=200):
+                self.send_body(status, json.dumps(body, ensure_ascii=False))
+
+            def redirect(self, location, cookies=()):
+                headers = [("Location", location)] + [("Set-Cookie", c) for c in cookies]
+                self.send_body(302, b"", "text/html", headers)
+
+            def read_json(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    return json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    return {}
+
+            def route(self):
+                parsed = urlparse(self.path)
+                path = parsed.path.rstrip("/") or "/"
+                query = parse_qs(parsed.query)
+
+                if standin._record(path.rsplit("/", 1)[0] if path.rsplit("/", 1)[-1].isdigit() else path):
+                    self.send_body(500, "injected failure", "text/plain")
+                    return
+
+                # --- API: token refresh and SSO ---
+                if path == "/Authentication/OAuth2/Token":
+                    self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                    self.send_json(
+                        {
+                            "access_token": uuid.uuid4().hex,
+                            "refresh_token": uuid.uuid4().hex,
+                            "expires_in": 3600,
+                            "token_type": "Bearer",
+                        }
+                    )
+                    return
+                if path == "/NA1/Authentication/sso":
+                    if not self.headers.get("Authorization", "").startswith("Bearer "):
+                        self.send_body(401, "Unauthorized", "text/plain")
+                        return
+                    ticket = uuid.uuid4().hex
+                    self.send_body(200, json.dumps(f"{standin.base_url}/Authentication/Login/SsoLanding?ticket={ticket}"))
+                    return
+                if path == "/Authentication/Login/SsoLanding":
+                    ticket = query.get("ticket", [""])[0]
+                    page = (
+                        "<html><body onload='document.forms[0].submit()'>"
+                        f"<form method='post' action='/Authentication/Login/Complete'>"
+                        f"<input type='hidden' name='ticket' value='{ticket}'/></form></body></html>"
+                    )
+                    self.send_body(200, page, "text/html")
+                    return
+                if path == "/Authentication/Login/Complete":
+                    self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                    session_id = uuid.uuid4().hex
+                    with standin.lock:
+                        standin.sessions.add(session_id)
+                    first = standin.pupils[0]["id"] if standin.pupils else ""
+                    self.redirect(
+                        "/",
+                        [f"{SESSION_COOKIE}={session_id}; Path=/; HttpOnly", f"{PUPIL_COOKIE}={first}; Path=/"],
+                    )
+                    return
+                if path == "/Authentication/Login":
+                    self.send_body(200, "<html><body>Login</body></html>", "text/html")
+                    return
+
+                # --- Hub: everything below requires a session ---
+                cookies = self.cookies()
+                if cookies.get(SESSION_COOKIE) not in standin.sessions:
+                    self.redirect("/Authentication/Login")
+                    return
+                pupil_id = cookies.get(PUPIL_COOKIE) or (standin.pupils[0]["id"] if standin.pupils else "")
+
+                if path == "/":
+                    self.send_body(200, standin.root_page(), "text/html; charset=utf-8")
+                elif path.startswith("/Account/PupilSwitcher/SwitchPupil/"):
+                    target = path.rsplit("/", 1)[-1]
+                    if target not in standin.news:
+                        self.send_body(404, "Unknown pupil", "text/plain")
+                        return
+                    self.redirect("/", [f"{PUPIL_COOKIE}={target}; Path=/"])
+                elif path == "/Communication/News/GetNewsList":
+                    self.send_json({"items": standin.news.get(pupil_id, [])})
+                elif path == "/Communication/News/GetNewsItem":
+                    news_id = int(query.get("id", ["0"])[0])
+                    item = next((n for n in standin.news.get(pupil_id, []) if n["id"] == news_id), None)
+                    if item is None:
+                        self.send_body(404, "Not found", "text/plain")
+                    else:
+                        self.send_json(item)
+                elif path == "/calendarv2/calendarv2/getentries":
+                    body = self.read_json()
+                    try:
+                        start = datetime.strptime(body.get("startDate", ""), "%Y/%m/%d").date()
+                        end = datetime.strptime(body.get("endDate", ""), "%Y/%m/%d").date()
+                    except ValueError:
+                        self.send_body(400, "Bad date range", "text/plain")
+                        return
+                    self.send_json(standin.schedule_entries(pupil_id, start, end))
+                elif path == "/Attendance/attendance/GetAttendanceList":
+                    body = self.read_json()
+                    records = standin.attendance.get(pupil_id, [])
+                    if body.get("startDate"):
+                        # Honors the optional date range (YYYY/MM/DD, inclusive)
+                        start = body["startDate"].replace("/", "-")
+                        end = (body.get("endDate") or "9999/12/31").replace("/", "-")
+                        records = [r for r in records if start <= r["dateString"] <= end]
+                    self.send_json(records)
+                elif path == "/NotificationApp/NotificationApp/appData":
+                    self.read_json()
+                    self.send_json({"notifications": standin.notifications.get(pupil_id, [])})
+                elif path == "/Message/Message/GetMessages":
+                    self.read_json()
+                    self.send_json({"messages": [{"id": m["id"], "title": m["title"]} for m in standin.messages.values()]})
+                elif path == "/Message/Message/GetMessage":
+                    message = standin.messages.get(int(query.get("id", ["0"])[0]))
+                    if message is None:
+                        self.send_body(404, "Not found", "text/plain")
+                    else:
+                        self.send_json(message)
+                elif path.startswith("/Resources/Resource/Download/"):
+                    self.send_body(200, b"%PDF-1.4\n" + b"0" * 4096, "application/pdf")
+                else:
+                    self.send_body(404, f"Unknown endpoint {path}", "text/plain")
+
+            do_GET = route
+            do_POST = route
+            do_HEAD = route
+
+        return Handler
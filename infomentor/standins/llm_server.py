@@ -0,0 +1,199 @@
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .. import local_extractor
+from ..text_normalizer import estimate_tokens
+
+_BATCH_ITEM_RE = re.compile(
+    r"### ITEM id=(?P<id>\S+) \(published on: (?P<date>[^)]*)\)\s*(?P<text>.*?)\s*### END ITEM id=(?P=id)",
+    re.DOTALL,
+)
+_PUBLISHED_RE = re.compile(r"published on: (?P<date>[^.\n]*)")
+
+
+def fake_analysis(text, published_date):
+    """Deterministic analysis in the shape the prompt asks for"""
+    analysis, _ = local_extractor.extract(text, published_date)
+    return analysis
+
+
+def fake_completion(prompt):
+    """Answer a single or batched analysis prompt with JSON text"""
+    items = list(_BATCH_ITEM_RE.finditer(prompt))
+    if items:
+        result = {
+            "items": [
+                {"id": m.group("id"), **fake_analysis(m.group("text"), m.group("date"))}
+                for m in items
+            ]
+        }
+    else:
+        text = prompt.split("Text to analyze:", 1)[-1].strip()
+        published = _PUBLISHED_RE.search(prompt)
+        result = fake_analysis(text, published.group("date") if published else "")
+    return json.dumps(result, ensure_ascii=False)
+
+
+class LLMStandIn:
+    """
+    Local HTTP server speaking the Perplexity chat-completions and Gemini
+    generateContent response shapes, with configurable latency and 429/503
+    error injection. Point LLMClient's base URLs at `base_url` to use it.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        jitter=0.0,
+        error_429_rate=0.0,
+        error_503_rate=0.0,
+        retry_after=1,
+        seed=None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_429_rate = error_429_rate
+        self.error_503_rate = error_503_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "429": 0, "503": 0, "perplexity": 0, "gemini": 0}
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve in a background thread and return the base URL"""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def serve_forever(self):
+        print(f"LLM stand-in listening on {self.base_url}")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+
+    def _pick_error(self):
+        with self.lock:
+            self.stats["requests"] += 1
+            roll = self.random.random()
+        if roll < self.error_429_rate:
+            return 429
+        if roll < self.error_429_rate + self.error_503_rate:
+            return 503
+        return None
+
+    def _delay(self):
+        with self.lock:
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _make_handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, body, headers=None):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    self.send_json(400, {"error": "invalid JSON"})
+                    return
+
+                if self.path.rstrip("/").endswith("/chat/completions"):
+                    provider = "perplexity"
+                elif ":generateContent" in self.path:
+                    provider = "gemini"
+                else:
+                    self.send_json(404, {"error": f"unknown endpoint {self.path}"})
+                    return
+
+                standin._delay()
+                error = standin._pick_error()
+                if error:
+                    with standin.lock:
+                        standin.stats[str(error)] += 1
+                    headers = {"Retry-After": str(standin.retry_after)} if error == 429 else None
+                    self.send_json(error, {"error": {"code": error, "message": "injected by stand-in"}}, headers)
+                    return
+
+                with standin.lock:
+                    standin.stats[provider] += 1
+
+                try:
+                    if provider == "perplexity":
+                        prompt = payload["messages"][-1]["content"]
+                    else:
+                        prompt = payload["contents"][0]["parts"][0]["text"]
+                except (KeyError, IndexError, TypeError):
+                    self.send_json(400, {"error": "unexpected request shape"})
+                    return
+
+                text = fake_completion(prompt)
+                prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(text)
+
+                if provider == "perplexity":
+                    body = {
+                        "id": "standin",
+                        "model": payload.get("model", "sonar-pro"),
+                        "choices": [
+                            {
+                                "index": 0,
+                                "finish_reason": "stop",
+                                "message": {"role": "assistant", "content": f"```json\n{text}\n```"},
+                            }
+                        ],
+                        "usage": {
+                            "prompt_tokens": prompt_tokens,
+                            "completion_tokens": completion_tokens,
+                            "total_tokens": prompt_tokens + completion_tokens,
+                        },
+                    }
+                else:
+                    body = {
+                        "candidates": [
+                            {
+                                "content": {"role": "model", "parts": [{"text": text}]},
+                                "finishReason": "STOP",
+                            }
+                        ],
+                        "usageMetadata": {
+                            "promptTokenCount": prompt_tokens,
+                            "candidatesTokenCount": completion_tokens,
+                            "totalTokenCount": prompt_tokens + completion_tokens,
+                        },
+                    }
+                self.send_json(200, body)
+
+        return Handler
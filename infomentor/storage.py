@@ -1,51 +1,177 @@
 import json
+import os
+import re
+import time
 from pathlib import Path
 
+from .archive import PackArchive
+from .models import AttendanceRecord, NewsItem, Notification, Pupil, ScheduleEntry
+
+# Directory name used for files that are not tied to a pupil
+NO_PUPIL = "_"
+# Consecutive entity IDs per shard directory: news/<type>/<pupil>/<id // SHARD_SIZE>/<id>.json
+SHARD_SIZE = 1000
+# Per-pupil directory holding the compressed packs of archived items
+PACK_DIR = "packs"
+# Flat files written before the sharded layout, mapped to their new location by migrate_layout
+_LEGACY_STATE_RE = re.compile(r"^(schedule|notification|attendance)_state(?:_(?P<pupil>.+))?\.json$")
+_LEGACY_ENTITY_RE = re.compile(r"^(news|notification)_(?:(?P<pupil>.+)_)?(?P<id>[^_]+)\.json$")
+_LEGACY_SCHEDULE_RE = re.compile(r"^schedule_(?:(?P<pupil>.+)_)?(?P<week>\d{4}-\d{2}-\d{2})\.json$")
+_LEGACY_ATTENDANCE_RE = re.compile(r"^attendance(?:_(?P<pupil>.+?))?\.jsonl?$")
+
+
+def shard_of(entity_id):
+    """Shard directory for an entity ID; consecutive numeric IDs share one"""
+    text = str(entity_id)
+    if text.isdigit():
+        return str(int(text) // SHARD_SIZE)
+    return text[:2] or NO_PUPIL
+
+
+def _subdirs(path):
+    try:
+        return [entry.path for entry in os.scandir(path) if entry.is_dir()]
+    except OSError:
+        return []
+
 
 class StorageManager:
+    """
+    File-based state under `output_dir`, sharded by type and pupil:
+
+        <type>/<pupil>/<shard>/<id>.json    news and notification items
+        schedule/<pupil>/<year>/<week>.json  weekly schedule snapshots
+        attendance/<pupil>/attendance.jsonl  append-only attendance log
+        <type>/<pupil>/state.json            per-pupil fetcher state
+        <type>/<pupil>/packs/                items archived by `compact`
+        pupils.json, shared_state.json, outbox.json
+
+    Files from the old flat layout (news_<pupil>_<id>.json, ...) are still
+    read until `migrate_layout` (`cli.py migrate-storage`) moves them.
+    """
 
     def __init__(self, output_dir: Path, files_dir: Path):
         self.output_dir = output_dir
         self.files_dir = files_dir
         self.output_dir.mkdir(exist_ok=True)
         self.files_dir.mkdir(exist_ok=True)
+        # Only scan the top-level directory for flat files while some are left
+        self.legacy = self.has_legacy_files()
+        # (kind, pupil dir) -> PackArchive, keeping each pack index in memory
+        self.archives = {}
 
-    def get_existing_ids(self, pupil_id=None):
-        """Get set of existing news item IDs for a specific pupil (or all if None)"""
+    def has_legacy_files(self):
+        """Whether any files of the flat layout remain in the top-level directory"""
+        with os.scandir(self.output_dir) as entries:
+            for entry in entries:
+                if entry.name not in ("pupils.json", "shared_state.json", "outbox.json") and entry.name.endswith((".json", ".jsonl")):
+                    return True
+        return False
+
+    def pupil_dir(self, kind, pupil_id=None):
+        return self.output_dir / kind / (str(pupil_id) if pupil_id else NO_PUPIL)
+
+    def entity_path(self, kind, entity_id, pupil_id=None):
+        return self.pupil_dir(kind, pupil_id) / shard_of(entity_id) / f"{entity_id}.json"
+
+    def schedule_path(self, week_str, pupil_id=None):
+        return self.pupil_dir("schedule", pupil_id) / week_str[:4] / f"{week_str}.json"
+
+    def state_path(self, kind, pupil_id=None):
+        return self.pupil_dir(kind, pupil_id) / "state.json"
+
+    def legacy_path(self, prefix, pupil_id=None, suffix=None, ext=".json"):
+        """Flat-layout file name, e.g. news_<pupil>_<id>.json"""
+        parts = [prefix] + [str(part) for part in (pupil_id, suffix) if part]
+        return self.output_dir / ("_".join(parts) + ext)
+
+    def readable(self, path, legacy):
+        """The sharded path, or the flat-layout file while it has not been migrated"""
+        if self.legacy and not path.exists() and legacy.exists():
+            return legacy
+        return path
+
+    def writable(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def scan_ids(self, kind, pupil_id=None):
+        """IDs of stored items of one type, for one pupil (or all if None)"""
         existing_ids = set()
-        pattern = f"news_{pupil_id}_*.json" if pupil_id else "news_*.json"
-        for file in self.output_dir.glob(pattern):
-            try:
-                # Filename format: news_{pupil_id}_{news_id}.json or news_{news_id}.json
-                parts = file.stem.split("_")
-                if len(parts) >= 3:
-                    news_id = int(parts[2])
-                else:
-                    news_id = int(parts[1])
-                existing_ids.add(news_id)
-            except (ValueError, IndexError):
-                pass
+        pupil_dirs = [self.pupil_dir(kind, pupil_id)] if pupil_id else _subdirs(self.output_dir / kind)
+        for pupil_dir in pupil_dirs:
+            for shard in _subdirs(pupil_dir):
+                if os.path.basename(shard) == PACK_DIR:
+                    existing_ids |= self.archive(kind, pupil_dir).ids()
+                    continue
+                with os.scandir(shard) as entries:
+                    for entry in entries:
+                        if not entry.name.endswith(".json"):
+                            continue
+                        try:
+                            existing_ids.add(int(entry.name[:-5]))
+                        except ValueError:
+                            pass
+
+        if self.legacy:
+            pattern = f"{kind}_{pupil_id}_*.json" if pupil_id else f"{kind}_*.json"
+            for file in self.output_dir.glob(pattern):
+                if _LEGACY_STATE_RE.match(file.name):
+                    continue
+                match = _LEGACY_ENTITY_RE.match(file.name)
+                try:
+                    existing_ids.add(int(match.group("id")))
+                except (AttributeError, ValueError):
+                    pass
         return existing_ids
 
+    def archive(self, kind, pupil_dir):
+        key = (kind, str(pupil_dir))
+        if key not in self.archives:
+            self.archives[key] = PackArchive(Path(pupil_dir) / PACK_DIR)
+        return self.archives[key]
+
+    def load_item(self, kind, entity_id, pupil_id=None):
+        """Stored payload of a news item or notification: loose file first, then the packs"""
+        filename = self.readable(
+            self.entity_path(kind, entity_id, pupil_id), self.legacy_path(kind, pupil_id, entity_id)
+        )
+        try:
+            if filename.exists():
+                with open(filename, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            return self.archive(kind, self.pupil_dir(kind, pupil_id)).read(entity_id)
+        except Exception as e:
+            print(f"    ✗ ERROR: Failed to load {kind} {entity_id}: {e}")
+            return None
+
+    def load_news_item(self, news_id, pupil_id=None):
+        data = self.load_item("news", news_id, pupil_id)
+        return NewsItem.from_json(data) if data else None
+
+    def load_notification(self, notif_id, pupil_id=None):
+        data = self.load_item("notification", notif_id, pupil_id)
+        return Notification.from_json(data) if data else None
+
+    def get_existing_ids(self, pupil_id=None):
+        """Get set of existing news item IDs for a specific pupil (or all if None)"""
+        return self.scan_ids("news", pupil_id)
+
     def get_existing_attachments(self):
         """Get set of existing attachment filenames"""
         return {f.name for f in self.files_dir.iterdir() if f.is_file()}
 
     def save_news_item(self, item, pupil_id=None):
         """Save a single news item to JSON file"""
-        news_id = item.get("id")
+        news_id = item.id
         if not news_id:
             print("    ✗ ERROR: News item missing ID, cannot save")
             return None
 
-        if pupil_id:
-            filename = self.output_dir / f"news_{pupil_id}_{news_id}.json"
-        else:
-            filename = self.output_dir / f"news_{news_id}.json"
-
         try:
+            filename = self.writable(self.entity_path("news", news_id, pupil_id))
             with open(filename, "w", encoding="utf-8") as f:
-                json.dump(item, f, ensure_ascii=False, indent=2)
+                json.dump(item.raw, f, ensure_ascii=False, indent=2)
             return filename
         except Exception as e:
             print(f"    ✗ ERROR: Failed to save news item {news_id}: {e}")
@@ -53,14 +179,15 @@ class StorageManager:
 
     def save_schedule(self, week_str, schedule_data, pupil_id=None):
         """Save schedule for a specific week and pupil"""
-        if pupil_id:
-            filename = self.output_dir / f"schedule_{pupil_id}_{week_str}.json"
-        else:
-            filename = self.output_dir / f"schedule_{week_str}.json"
-            
         try:
+            filename = self.writable(self.schedule_path(week_str, pupil_id))
             with open(filename, "w", encoding="utf-8") as f:
-                json.dump(schedule_data, f, ensure_ascii=False, indent=2)
+                json.dump(
+                    [entry.raw for entry in schedule_data],
+                    f,
+                    ensure_ascii=False,
+                    indent=2,
+                )
             return True
         except Exception as e:
             print(f"    ✗ ERROR: Failed to save schedule: {e}")
@@ -68,28 +195,30 @@ class StorageManager:
 
     def load_schedule(self, week_str, pupil_id=None):
         """Load schedule for a specific week and pupil"""
-        if pupil_id:
-            filename = self.output_dir / f"schedule_{pupil_id}_{week_str}.json"
-        else:
-            filename = self.output_dir / f"schedule_{week_str}.json"
-            
+        filename = self.readable(
+            self.schedule_path(week_str, pupil_id), self.legacy_path("schedule", pupil_id, week_str)
+        )
         if not filename.exists():
             return None
 
         try:
+            # Kept whole: unchanged entries are written back with the next snapshot
             with open(filename, "r", encoding="utf-8") as f:
-                return json.load(f)
+                entries = json.load(f)
+            # Snapshots written by older versions carry a stored fingerprint
+            for entry in entries:
+                if isinstance(entry, dict):
+                    entry.pop("_fingerprint", None)
+            return ScheduleEntry.parse_list(entries, keep_raw=True)
         except Exception as e:
             print(f"    ✗ ERROR: Failed to load schedule: {e}")
             return None
 
     def get_last_sunday_post(self, pupil_id=None):
         """Get the date of the last Sunday schedule post for a pupil"""
-        if pupil_id:
-            state_file = self.output_dir / f"schedule_state_{pupil_id}.json"
-        else:
-            state_file = self.output_dir / "schedule_state.json"
-            
+        state_file = self.readable(
+            self.state_path("schedule", pupil_id), self.legacy_path("schedule_state", pupil_id)
+        )
         if not state_file.exists():
             return None
         try:
@@ -101,11 +230,9 @@ class StorageManager:
 
     def set_last_sunday_post(self, date_str, pupil_id=None):
         """Set the date of the last Sunday schedule post for a pupil"""
-        if pupil_id:
-            state_file = self.output_dir / f"schedule_state_{pupil_id}.json"
-        else:
-            state_file = self.output_dir / "schedule_state.json"
-            
+        state_file = self.readable(
+            self.state_path("schedule", pupil_id), self.legacy_path("schedule_state", pupil_id)
+        )
         data = {}
         if state_file.exists():
             try:
@@ -116,56 +243,146 @@ class StorageManager:
 
         data["last_sunday_post"] = date_str
         try:
-            with open(state_file, "w") as f:
+            with open(self.writable(self.state_path("schedule", pupil_id)), "w") as f:
                 json.dump(data, f)
         except:
             pass
 
     def get_existing_notification_ids(self, pupil_id=None):
         """Get set of existing notification IDs for a pupil"""
-        existing_ids = set()
-        pattern = f"notification_{pupil_id}_*.json" if pupil_id else "notification_*.json"
-        for file in self.output_dir.glob(pattern):
-            try:
-                parts = file.stem.split("_")
-                if len(parts) >= 3:
-                    notif_id = int(parts[2])
-                else:
-                    notif_id = int(parts[1])
-                existing_ids.add(notif_id)
-            except (ValueError, IndexError):
-                pass
-        return existing_ids
+        return self.scan_ids("notification", pupil_id)
+
+    def get_notification_cursor(self, pupil_id=None):
+        """Stored notification feed cursor for a pupil, or None"""
+        state_file = self.readable(
+            self.state_path("notification", pupil_id), self.legacy_path("notification_state", pupil_id)
+        )
+        if not state_file.exists():
+            return None
+        try:
+            with open(state_file, "r") as f:
+                return json.load(f)
+        except:
+            return None
+
+    def set_notification_cursor(self, cursor, pupil_id=None):
+        try:
+            with open(self.writable(self.state_path("notification", pupil_id)), "w") as f:
+                json.dump(cursor, f)
+        except:
+            pass
+
+    def get_shared_claims(self):
+        """Cross-pupil dedup keys: {key: [claimed at, canonical key, pupil IDs]}"""
+        state_file = self.output_dir / "shared_state.json"
+        if not state_file.exists():
+            return None
+        try:
+            with open(state_file, "r") as f:
+                return json.load(f).get("claims")
+        except:
+            return None
+
+    def get_outbox(self):
+        """Claimed items whose notification has not been sent yet"""
+        state_file = self.output_dir / "outbox.json"
+        if not state_file.exists():
+            return None
+        try:
+            with open(state_file, "r") as f:
+                return json.load(f)
+        except:
+            return None
+
+    def set_outbox(self, entries):
+        state_file = self.output_dir / "outbox.json"
+        try:
+            tmp = state_file.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp, state_file)
+        except:
+            pass
+
+    def set_shared_claims(self, claims):
+        state_file = self.output_dir / "shared_state.json"
+        try:
+            with open(state_file, "w") as f:
+                json.dump({"claims": claims}, f)
+        except:
+            pass
 
     def save_notification(self, notification, pupil_id=None):
         """Save a single notification to JSON file"""
-        notif_id = notification.get("id")
+        notif_id = notification.id
         if not notif_id:
             return None
 
-        if pupil_id:
-            filename = self.output_dir / f"notification_{pupil_id}_{notif_id}.json"
-        else:
-            filename = self.output_dir / f"notification_{notif_id}.json"
-
         try:
+            filename = self.writable(self.entity_path("notification", notif_id, pupil_id))
             with open(filename, "w", encoding="utf-8") as f:
-                json.dump(notification, f, ensure_ascii=False, indent=2)
+                json.dump(notification.raw, f, ensure_ascii=False, indent=2)
             return filename
         except Exception as e:
             print(f"    ✗ ERROR: Failed to save notification {notif_id}: {e}")
             return None
 
-    def save_attendance(self, attendance_data, pupil_id=None):
-        """Save attendance data for a pupil"""
-        if pupil_id:
-            filename = self.output_dir / f"attendance_{pupil_id}.json"
-        else:
-            filename = self.output_dir / "attendance.json"
-            
+    def attendance_log_path(self, pupil_id=None):
+        """Append-only attendance log, one JSON record per line"""
+        return self.pupil_dir("attendance", pupil_id) / "attendance.jsonl"
+
+    def migrate_attendance(self, pupil_id=None):
+        """Move a flat-layout attendance log, or convert a legacy JSON array, into the sharded log"""
+        log = self.attendance_log_path(pupil_id)
+        if not self.legacy or log.exists():
+            return
+        flat_log = self.legacy_path("attendance", pupil_id, ext=".jsonl")
+        legacy = self.legacy_path("attendance", pupil_id)
+        if not flat_log.exists() and not legacy.exists():
+            return
         try:
-            with open(filename, "w", encoding="utf-8") as f:
-                json.dump(attendance_data, f, ensure_ascii=False, indent=2)
+            self.writable(log)
+            if flat_log.exists():
+                os.replace(flat_log, log)
+                return
+            with open(legacy, "r", encoding="utf-8") as f:
+                records = json.load(f)
+            with open(log, "w", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            legacy.unlink()
+            print(f"    ✓ Migrated {len(records)} attendance records to {log.name}")
+        except Exception as e:
+            print(f"    ✗ ERROR: Failed to migrate attendance: {e}")
+
+    def has_attendance(self, pupil_id=None):
+        """Whether an attendance baseline exists for a pupil"""
+        self.migrate_attendance(pupil_id)
+        return self.attendance_log_path(pupil_id).exists()
+
+    def iter_attendance(self, pupil_id=None):
+        """Stream stored attendance records for a pupil"""
+        self.migrate_attendance(pupil_id)
+        filename = self.attendance_log_path(pupil_id)
+        if not filename.exists():
+            return
+        with open(filename, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield AttendanceRecord.from_json(json.loads(line))
+                except (json.JSONDecodeError, AttributeError):
+                    # A line cut short by a crash mid-append
+                    continue
+
+    def append_attendance(self, records, pupil_id=None):
+        """Append attendance records to a pupil's log (creating it if needed)"""
+        try:
+            with open(self.writable(self.attendance_log_path(pupil_id)), "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record.raw, ensure_ascii=False) + "\n")
             return True
         except Exception as e:
             print(f"    ✗ ERROR: Failed to save attendance: {e}")
@@ -173,19 +390,51 @@ class StorageManager:
 
     def load_attendance(self, pupil_id=None):
         """Load attendance data for a pupil"""
-        if pupil_id:
-            filename = self.output_dir / f"attendance_{pupil_id}.json"
-        else:
-            filename = self.output_dir / "attendance.json"
-            
-        if not filename.exists():
+        if not self.has_attendance(pupil_id):
+            return None
+        try:
+            return list(self.iter_attendance(pupil_id))
+        except Exception as e:
+            print(f"    ✗ ERROR: Failed to load attendance: {e}")
             return None
 
+    def get_attendance_watermark(self, pupil_id=None):
+        """Date (YYYY-MM-DD) before which attendance is no longer compared"""
+        state_file = self.readable(
+            self.state_path("attendance", pupil_id), self.legacy_path("attendance_state", pupil_id)
+        )
+        if not state_file.exists():
+            return None
+        try:
+            with open(state_file, "r") as f:
+                return json.load(f).get("watermark")
+        except:
+            return None
+
+    def set_attendance_watermark(self, date_str, pupil_id=None):
+        try:
+            with open(self.writable(self.state_path("attendance", pupil_id)), "w") as f:
+                json.dump({"watermark": date_str}, f)
+        except:
+            pass
+
+    def load_pupils(self):
+        """Load the stored pupil list, or None"""
+        filename = self.output_dir / "pupils.json"
+        if not filename.exists():
+            return None
         try:
             with open(filename, "r", encoding="utf-8") as f:
-                return json.load(f)
+                return Pupil.parse_list(json.load(f))
         except Exception as e:
-            print(f"    ✗ ERROR: Failed to load attendance: {e}")
+            print(f"    ✗ ERROR: Failed to load pupils: {e}")
+            return None
+
+    def get_pupils_saved_at(self):
+        """Modification time of the stored pupil list, or None"""
+        try:
+            return (self.output_dir / "pupils.json").stat().st_mtime
+        except OSError:
             return None
 
     def save_pupils(self, pupils_data):
@@ -193,8 +442,128 @@ class StorageManager:
         filename = self.output_dir / "pupils.json"
         try:
             with open(filename, "w", encoding="utf-8") as f:
-                json.dump(pupils_data, f, ensure_ascii=False, indent=2)
+                json.dump([pupil.raw for pupil in pupils_data], f, ensure_ascii=False, indent=2)
             return True
         except Exception as e:
             print(f"    ✗ ERROR: Failed to save pupils: {e}")
             return False
+
+    def migrate_layout(self, dry_run=False):
+        """
+        Move flat-layout files into the sharded layout. Safe while the
+        fetcher runs: every file is moved atomically and readers fall back to
+        the flat name until it is gone. Where both copies exist, the sharded
+        one is newer and the flat one is removed. Returns the number of files moved.
+        """
+        moved = removed = 0
+        with os.scandir(self.output_dir) as entries:
+            names = [entry.name for entry in entries if entry.is_file()]
+
+        for name in names:
+            source = self.output_dir / name
+            if name.endswith(".json") and _LEGACY_ATTENDANCE_RE.match(name) and not _LEGACY_STATE_RE.match(name):
+                # Legacy JSON arrays are converted, not moved
+                if not dry_run:
+                    self.migrate_attendance(_LEGACY_ATTENDANCE_RE.match(name).group("pupil"))
+                moved += 1
+                continue
+
+            target = self.layout_path(name)
+            if target is None:
+                continue
+            if target.exists():
+                if not dry_run:
+                    source.unlink()
+                removed += 1
+                continue
+            if not dry_run:
+                os.replace(source, self.writable(target))
+            moved += 1
+
+        if not dry_run:
+            self.legacy = self.has_legacy_files()
+        verb = "Would move" if dry_run else "Moved"
+        print(f"✓ {verb} {moved} file(s) into the sharded layout, {removed} superseded flat file(s)")
+        return moved
+
+    def layout_path(self, name):
+        """Sharded location of a flat-layout file name, or None if it is not one"""
+        match = _LEGACY_STATE_RE.match(name)
+        if match:
+            return self.state_path(match.group(1), match.group("pupil"))
+        match = _LEGACY_SCHEDULE_RE.match(name)
+        if match:
+            return self.schedule_path(match.group("week"), match.group("pupil"))
+        match = _LEGACY_ENTITY_RE.match(name)
+        if match:
+            return self.entity_path(match.group(1), match.group("id"), match.group("pupil"))
+        match = _LEGACY_ATTENDANCE_RE.match(name)
+        if match and name.endswith(".jsonl"):
+            return self.attendance_log_path(match.group("pupil"))
+        return None
+
+    def compact(self, older_than_days=90, dry_run=False):
+        """
+        Roll news items and notifications saved more than `older_than_days`
+        ago into each pupil's compressed packs and remove the loose files.
+        Items are published in the pack index before their files are deleted,
+        so seen-ID checks never miss one, even while the fetcher runs.
+        """
+        if self.legacy:
+            print("  ⚠ Flat-layout files are not archived; run migrate-storage first")
+        cutoff = time.time() - older_than_days * 24 * 3600
+        files = loose_bytes = packed_bytes = 0
+
+        for kind in ("news", "notification"):
+            for pupil_dir in _subdirs(self.output_dir / kind):
+                old = []
+                for shard in _subdirs(pupil_dir):
+                    if os.path.basename(shard) == PACK_DIR:
+                        continue
+                    with os.scandir(shard) as entries:
+                        for entry in entries:
+                            if not entry.name.endswith(".json"):
+                                continue
+                            stat = entry.stat()
+                            if stat.st_mtime < cutoff:
+                                old.append((entry.path, entry.name[:-5], stat.st_size))
+                if not old:
+                    continue
+
+                files += len(old)
+                loose_bytes += sum(size for _, _, size in old)
+                if dry_run:
+                    continue
+
+                records = []
+                for path, entity_id, _ in old:
+                    try:
+                        with open(path, "r", encoding="utf-8") as f:
+                            records.append((entity_id, json.load(f)))
+                    except (OSError, ValueError) as e:
+                        print(f"    ✗ ERROR: Skipping unreadable {path}: {e}")
+                try:
+                    packed_bytes += self.archive(kind, pupil_dir).append(records)
+                except OSError as e:
+                    print(f"    ✗ ERROR: Failed to archive {pupil_dir}: {e}")
+                    continue
+
+                archived = {entity_id for entity_id, _ in records}
+                for path, entity_id, _ in old:
+                    if entity_id in archived:
+                        os.unlink(path)
+                for shard in _subdirs(pupil_dir):
+                    try:
+                        # Only succeeds for shards that are now empty
+                        os.rmdir(shard)
+                    except OSError:
+                        pass
+
+        if dry_run:
+            print(f"✓ Would archive {files} file(s) ({loose_bytes / 1024:.0f} KiB)")
+        else:
+            print(
+                f"✓ Archived {files} file(s): {loose_bytes / 1024:.0f} KiB of JSON "
+                f"into {packed_bytes / 1024:.0f} KiB of packs"
+            )
+        return files
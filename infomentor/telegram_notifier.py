@@ -2,6 +2,8 @@ import re
 
 import requests
 
+from .tracing import tracer
+
 
 class TelegramNotifier:
     def __init__(self, bot_token, chat_id):
@@ -22,9 +24,11 @@ class TelegramNotifier:
 
             response = requests.post(f"{self.api_url}/sendMessage", json=data, timeout=30)
             response.raise_for_status()
+            tracer.add("messages")
             return True
         except Exception as e:
             print(f"    ✗ Error sending Telegram message: {e}")
+            tracer.fail(e)
             if "response" in locals() and hasattr(response, "text"):
                 print(f"    Response: {response.text[:200]}")
             return False
@@ -42,9 +46,11 @@ class TelegramNotifier:
                     f"{self.api_url}/sendDocument", data=data, files=files, timeout=60
                 )
                 response.raise_for_status()
+            tracer.add("messages")
             return True
         except Exception as e:
             print(f"    ✗ Error sending Telegram document {file_path}: {e}")
+            tracer.fail(e)
             return False
 
     def escape_markdown(self, text):
@@ -93,10 +99,10 @@ class TelegramNotifier:
         # 2. Prepare Full Content Part
         content_part = ""
         if full_item:
-            title = full_item.get("title", "No Title")
-            date = full_item.get("publishedDateString", "Unknown Date")
-            author = full_item.get("publishedBy", "Unknown Author")
-            raw_content = full_item.get("content", "")
+            title = full_item.title or "No Title"
+            date = full_item.published_date or "Unknown Date"
+            author = full_item.published_by or "Unknown Author"
+            raw_content = full_item.content or ""
 
             # Basic HTML to text conversion
             markdown_content = raw_content
@@ -192,7 +198,7 @@ class TelegramNotifier:
             for change in changes:
                 entry = change["entry"]
                 ctype = change["type"]
-                entry_str = f"{entry['formattedStartDate']} {entry['startTime'] or ''} - {entry['title']}"
+                entry_str = f"{entry.start_date} {entry.start_time or ''} - {entry.title}"
                 if ctype == "added":
                     text += f"➕ {self.escape_markdown(entry_str)}\n"
                 elif ctype == "removed":
@@ -204,9 +210,9 @@ class TelegramNotifier:
 
         # Construct schedule text (simplified for Telegram)
         days = {}
-        sorted_schedule = sorted(schedule, key=lambda x: x.get("startDateFull", ""))
+        sorted_schedule = sorted(schedule, key=lambda x: x.start or "")
         for entry in sorted_schedule:
-            day = entry.get("formattedStartDate", "Unknown")
+            day = entry.start_date or "Unknown"
             if day not in days:
                 days[day] = []
             days[day].append(entry)
@@ -215,11 +221,11 @@ class TelegramNotifier:
             text += f"*{self.escape_markdown(day)}*\n"
             for entry in entries:
                 time_str = (
-                    f"{entry['startTime']}-{entry['endTime']}"
-                    if entry["startTime"]
+                    f"{entry.start_time}-{entry.end_time}"
+                    if entry.start_time
                     else "All Day"
                 )
-                text += f"• {self.escape_markdown(time_str)}: {self.escape_markdown(entry['title'])}\n"
+                text += f"• {self.escape_markdown(time_str)}: {self.escape_markdown(entry.title)}\n"
             text += "\n"
 
         if len(text) > 4000:
@@ -229,9 +235,9 @@ class TelegramNotifier:
         self.send_message(text, parse_mode="MarkdownV2")
 
     def send_notification(self, notification, pupil_name=None):
-        title = notification.get("title", "New Notification")
-        subtitle = notification.get("subTitle", "")
-        url = notification.get("url", "")
+        title = notification.title or "New Notification"
+        subtitle = notification.subtitle or ""
+        url = notification.url or ""
 
         display_title = f"🔔 {title}"
         if pupil_name:
@@ -262,10 +268,10 @@ class TelegramNotifier:
         text += f"Found {len(new_records)} new attendance records\\.\n\n"
 
         for record in new_records:
-            date = self.escape_markdown(record.get("dateString", "Unknown Date"))
-            lesson = self.escape_markdown(record.get("lessonName", "Unknown Lesson"))
-            status = self.escape_markdown(record.get("registrationTypeName", "Unknown Status"))
-            comment = self.escape_markdown(record.get("comment", ""))
+            date = self.escape_markdown(record.date or "Unknown Date")
+            lesson = self.escape_markdown(record.lesson or "Unknown Lesson")
+            status = self.escape_markdown(record.status or "Unknown Status")
+            comment = self.escape_markdown(record.comment or "")
             
             text += f"📅 *{date}*\n"
             text += f"• *Status:* {status}\n"
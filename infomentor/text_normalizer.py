@@ -0,0 +1,118 @@
+import html
+import re
+
+# Tags whose contents never carry readable text
+_INVISIBLE_RE = re.compile(r"<(script|style|head)\b[^>]*>.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+_BREAK_RE = re.compile(r"<br\s*/?>", re.IGNORECASE)
+_BLOCK_END_RE = re.compile(r"</(p|div|h[1-6]|tr|table|ul|ol|blockquote)\s*>", re.IGNORECASE)
+_LIST_ITEM_RE = re.compile(r"<li\b[^>]*>", re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACES_RE = re.compile(r"[ \t\r\f\v\u00a0\u200b]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+# Greetings that start a signature block in Swedish school posts
+_SIGNATURE_RE = re.compile(
+    r"^\s*(med\s+vänlig(a)?\s+hälsning(ar)?|vänliga\s+hälsningar|vänlig\s+hälsning|hälsningar|mvh|kind\s+regards|best\s+regards)\b",
+    re.IGNORECASE,
+)
+# Lines that are pure boilerplate and never matter for a summary
+_BOILERPLATE_RE = re.compile(
+    r"^\s*(detta\s+(meddelande|mejl|mail)\s+(går\s+inte\s+att|kan\s+inte)\s+besvaras.*|"
+    r"svara\s+inte\s+på\s+detta\s+(meddelande|mejl|mail).*|"
+    r"skickat\s+från\s+min\s+\w+.*|sent\s+from\s+my\s+\w+.*)$",
+    re.IGNORECASE,
+)
+
+# Signature blocks are only cut when they are this short (in lines)
+MAX_SIGNATURE_LINES = 8
+TRUNCATION_MARKER = "[…]"
+
+
+def estimate_tokens(text):
+    """Rough token estimate (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def html_to_text(content):
+    """Convert hub HTML to plain text, keeping paragraph and list structure"""
+    text = _INVISIBLE_RE.sub("", content)
+    text = _COMMENT_RE.sub("", text)
+    text = _BREAK_RE.sub("\n", text)
+    text = _BLOCK_END_RE.sub("\n\n", text)
+    text = _LIST_ITEM_RE.sub("\n- ", text)
+    text = _TAG_RE.sub("", text)
+    return html.unescape(text)
+
+
+def collapse_whitespace(text):
+    lines = [_SPACES_RE.sub(" ", line).strip() for line in text.split("\n")]
+    return _BLANK_LINES_RE.sub("\n\n", "\n".join(lines)).strip()
+
+
+def strip_boilerplate(text):
+    """Drop boilerplate lines, repeated paragraphs and a trailing signature block"""
+    paragraphs = []
+    seen = set()
+    for paragraph in text.split("\n\n"):
+        lines = [line for line in paragraph.split("\n") if not _BOILERPLATE_RE.match(line)]
+        paragraph = "\n".join(lines).strip()
+        key = paragraph.lower()
+        # Posts are often pasted twice or repeat the same signature per section
+        if not paragraph or key in seen:
+            continue
+        seen.add(key)
+        paragraphs.append(paragraph)
+
+    lines = "\n\n".join(paragraphs).split("\n")
+    for i in range(len(lines) - 1, max(-1, len(lines) - 1 - MAX_SIGNATURE_LINES), -1):
+        if _SIGNATURE_RE.match(lines[i]):
+            # Only cut when there is real content before the greeting
+            if i > 0:
+                lines = lines[:i]
+            break
+
+    return "\n".join(lines).strip()
+
+
+def truncate_to_budget(text, max_tokens):
+    """
+    Truncate to roughly `max_tokens`, keeping whole paragraphs from the start
+    (where school posts put the important information) and cutting the last
+    paragraph that does not fit at a sentence boundary.
+    """
+    if not max_tokens or estimate_tokens(text) <= max_tokens:
+        return text
+
+    budget = max_tokens * 4 - len(TRUNCATION_MARKER) - 2
+    kept = []
+    used = 0
+    for paragraph in text.split("\n\n"):
+        if used + len(paragraph) + 2 <= budget:
+            kept.append(paragraph)
+            used += len(paragraph) + 2
+            continue
+
+        remaining = budget - used
+        if remaining > 200:
+            cut = paragraph[:remaining]
+            sentence_end = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "), cut.rfind("\n"))
+            kept.append(cut[: sentence_end + 1] if sentence_end > remaining // 2 else cut)
+        break
+
+    return "\n\n".join(kept + [TRUNCATION_MARKER])
+
+
+def normalize_for_llm(content, max_tokens=None):
+    """
+    Turn raw hub HTML into compact prompt text.
+    Returns (text, tokens_before, tokens_after).
+    """
+    if not content:
+        return "", 0, 0
+
+    tokens_before = estimate_tokens(content)
+    text = collapse_whitespace(html_to_text(content))
+    text = strip_boilerplate(text)
+    text = truncate_to_budget(text, max_tokens)
+    return text, tokens_before, estimate_tokens(text)
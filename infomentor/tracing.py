@@ -0,0 +1,178 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class Span:
+    """One timed stage of a fetch cycle with counters and an outcome"""
+
+    def __init__(self, name, parent=None, cycle=None, **attrs):
+        self.name = name
+        self.parent = parent
+        self.cycle = cycle
+        self.attrs = attrs
+        self.counters = {}
+        self.outcome = "ok"
+        self.error = None
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key, amount=1):
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def fail(self, error=None):
+        self.outcome = "error"
+        if error is not None:
+            self.error = str(error)[:200]
+
+    def to_dict(self):
+        record = {
+            "ts": datetime.fromtimestamp(self.started_at).isoformat(timespec="milliseconds"),
+            "cycle": self.cycle,
+            "span": self.name,
+            "parent": self.parent,
+            "duration_ms": round((self.duration or 0) * 1000, 2),
+            "outcome": self.outcome,
+        }
+        if self.error:
+            record["error"] = self.error
+        record.update(self.counters)
+        record.update(self.attrs)
+        return record
+
+
+class Tracer:
+    """
+    Lightweight span recorder. Spans nest per thread, are written as JSON
+    lines to `log_file` when set, and are aggregated into a summary table at
+    the end of each cycle.
+    """
+
+    def __init__(self, log_file=None, summary=True, top=12):
+        self.log_file = log_file
+        self.summary = summary
+        self.top = top
+        self.cycle = 0
+        self.finished = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # Called with every finished span, e.g. to feed metrics
+        self.listeners = []
+
+    def configure(self, log_file=None, summary=True):
+        self.log_file = log_file
+        self.summary = summary
+
+    def add_listener(self, listener):
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def _stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def current(self):
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, **attrs):
+        stack = self._stack()
+        span = Span(name, parent=stack[-1].name if stack else None, cycle=self.cycle, **attrs)
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+            stack.pop()
+            self._finish(span)
+
+    def add(self, key, amount=1):
+        """Add to a counter on the innermost open span, if any"""
+        span = self.current()
+        if span is not None:
+            span.add(key, amount)
+
+    def fail(self, error=None):
+        """Mark the innermost open span as failed, if any"""
+        span = self.current()
+        if span is not None:
+            span.fail(error)
+
+    def response_hook(self, response, *args, **kwargs):
+        """requests response hook counting requests, status codes and bytes"""
+        span = self.current()
+        if span is not None:
+            span.add("requests")
+            span.add(f"http_{response.status_code}")
+            length = response.headers.get("Content-Length")
+            if length and length.isdigit():
+                span.add("bytes", int(length))
+        return response
+
+    def _finish(self, span):
+        with self.lock:
+            self.finished.append(span)
+        for listener in self.listeners:
+            try:
+                listener(span)
+            except Exception as e:
+                print(f"  ⚠ Span listener failed: {e}")
+        if self.log_file:
+            try:
+                with open(self.log_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+            except Exception as e:
+                print(f"  ⚠ Could not write trace log: {e}")
+
+    def start_cycle(self):
+        with self.lock:
+            self.cycle += 1
+            self.finished = []
+
+    def end_cycle(self):
+        """Print the slowest stages of the cycle and return its spans"""
+        with self.lock:
+            spans = list(self.finished)
+        if self.summary and spans:
+            self.print_summary(spans)
+        return spans
+
+    def aggregate(self, spans):
+        stages = {}
+        for span in spans:
+            stage = stages.setdefault(
+                span.name, {"calls": 0, "total": 0.0, "max": 0.0, "errors": 0, "items": 0, "bytes": 0}
+            )
+            stage["calls"] += 1
+            stage["total"] += span.duration or 0
+            stage["max"] = max(stage["max"], span.duration or 0)
+            stage["errors"] += span.outcome != "ok"
+            stage["items"] += span.counters.get("items", 0)
+            stage["bytes"] += span.counters.get("bytes", 0)
+        return stages
+
+    def print_summary(self, spans):
+        stages = self.aggregate(spans)
+        slowest = sorted(stages.items(), key=lambda kv: kv[1]["total"], reverse=True)[: self.top]
+        print(f"\nSlowest stages (cycle {self.cycle}):")
+        print(f"  {'Stage':<28} {'Calls':>5} {'Total':>9} {'Max':>9} {'Errors':>6} {'Items':>6} {'KB':>8}")
+        for name, stage in slowest:
+            print(
+                f"  {name:<28} {stage['calls']:>5} {stage['total']:>8.2f}s {stage['max']:>8.2f}s "
+                f"{stage['errors']:>6} {stage['items']:>6} {stage['bytes'] / 1024:>8.1f}"
+            )
+
+
+# Shared by the runner, fetchers, LLM client and notifiers
+tracer = Tracer()